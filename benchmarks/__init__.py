@@ -0,0 +1 @@
+# Benchmarks of the workflow with a deterministic stand-in LLM
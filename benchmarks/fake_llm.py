@@ -0,0 +1,126 @@
+# Deterministic stand-in chat model for benchmarks
+import json
+import time
+import asyncio
+from typing import Callable, List, Optional, Union
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model answering from `responder(messages, tools)` without any network
+    call. Every call waits `latency` seconds (time to first token) and then
+    produces tokens at `tokens_per_second`, in chunks when streamed.
+
+    Calls bound to tools answer with a tool call of the first tool, the
+    responder returns its arguments as a dict, or a text used as the
+    `markdown` argument (the SummarizeTool format).
+    """
+
+    responder: Callable[[List[BaseMessage], list], Union[str, dict]]
+    model_name: str = "fake"
+    latency: float = 0.0
+    tokens_per_second: float = 0.0
+    chunk_tokens: int = 16
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def _identifying_params(self):
+        return {"model_name": self.model_name}
+
+    def bind_tools(self, tools, *, tool_choice: Optional[str] = None, **kwargs):
+        return self.bind(
+            tools=[convert_to_openai_tool(tool) for tool in tools],
+            tool_choice=tool_choice,
+            **kwargs,
+        )
+
+    def _generation_time(self, text: str) -> float:
+        if not self.tokens_per_second:
+            return 0.0
+        return estimate_tokens(text) / self.tokens_per_second
+
+    def _message(self, messages, tools, message_class=AIMessage):
+        self.calls += 1
+        answer = self.responder(messages, tools or [])
+        args = answer if isinstance(answer, dict) else {"markdown": answer}
+        text = answer if isinstance(answer, str) else json.dumps(answer)
+        input_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+        usage = {
+            "input_tokens": input_tokens,
+            "output_tokens": estimate_tokens(text),
+            "total_tokens": input_tokens + estimate_tokens(text),
+        }
+        if tools:
+            name = tools[0]["function"]["name"]
+            if message_class is AIMessageChunk:
+                return text, AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[
+                        {
+                            "name": name,
+                            "args": json.dumps(args),
+                            "id": f"call_{name}",
+                            "index": 0,
+                        }
+                    ],
+                    usage_metadata=usage,
+                )
+            return text, AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": name, "args": args, "id": f"call_{name}"}
+                ],
+                usage_metadata=usage,
+            )
+        return text, message_class(content=text, usage_metadata=usage)
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        text, message = self._message(messages, tools)
+        time.sleep(self.latency + self._generation_time(text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self, messages, stop=None, run_manager=None, tools=None, **kwargs
+    ):
+        text, message = self._message(messages, tools)
+        await asyncio.sleep(self.latency + self._generation_time(text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(
+        self, messages, stop=None, run_manager=None, tools=None, **kwargs
+    ):
+        await asyncio.sleep(self.latency)
+        if tools:
+            text, chunk = self._message(messages, tools, AIMessageChunk)
+            await asyncio.sleep(self._generation_time(text))
+            yield ChatGenerationChunk(message=chunk)
+            return
+
+        text, message = self._message(messages, tools)
+        step = max(1, self.chunk_tokens * 4)
+        for start in range(0, len(text), step):
+            piece = text[start : start + step]
+            await asyncio.sleep(self._generation_time(piece))
+            chunk = AIMessageChunk(content=piece)
+            if start + step >= len(text):
+                # Usage is reported once, with the last chunk
+                chunk = AIMessageChunk(
+                    content=piece, usage_metadata=message.usage_metadata
+                )
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield ChatGenerationChunk(message=chunk)
+
@@ -0,0 +1,113 @@
+"""
+Micro-benchmark of the markdown fence parser against the previous regex.
+
+    python -m sub_graphs.swe.benchmarks.fence_parser --sizes 1,4,16
+
+Parses generated responses of the given sizes (in MB) in one call and fed
+in small chunks the way streamed tokens arrive, and reports the time and
+the number of files found. The regex is only run up to --regex-max-mb,
+it is quadratic on numbered bold headings that are not file headings.
+"""
+import re
+import time
+import argparse
+
+from sub_graphs.swe.benchmarks.responses import CannedResponder
+from sub_graphs.swe.tools.markdown_stream import FenceParser, parse_code_blocks
+
+LEGACY_PATTERN = re.compile(r"###\s*\d+\.\s*\*\*(.*?)\*\*\n```.*?\n(.*?)```", re.DOTALL)
+
+
+def files_response(size: int) -> str:
+    """Well formed response, 40 line files under ### N. **/path** headings."""
+    responder = CannedResponder(1, 1, 40)
+    block = responder.file_response(["/module_1/file_1.py"])
+    return block * max(1, size // len(block))
+
+
+def prose_response(size: int) -> str:
+    """Numbered bold headings without files, e.g. setup instructions."""
+    step = "### {i}. **Step {i}**: configure part {i}\n" + "Explanation line.\n" * 20
+    count = max(1, size // len(step.format(i=0)))
+    return "".join(step.format(i=i) for i in range(count))
+
+
+def unbalanced_response(size: int) -> str:
+    """File headings and README blocks with nested fences of the same length."""
+    block = (
+        "### 1. **/docs/README.md**\n```markdown\n# Usage\n"
+        "```bash\nmake run\n```\nMore text\n```\n\n"
+        "## File: `src/app.py`\n~~~python\nx = '```'\n~~~\n"
+    )
+    return block * max(1, size // len(block))
+
+
+CASES = {
+    "files": files_response,
+    "prose": prose_response,
+    "unbalanced": unbalanced_response,
+}
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def parse_streamed(content: str, chunk_size: int):
+    parser = FenceParser()
+    for i in range(0, len(content), chunk_size):
+        parser.feed(content[i : i + chunk_size])
+    parser.finish()
+    return parser.blocks
+
+
+def run(sizes, chunk_size: int, regex_max_mb: float):
+    results = []
+    for case, build in CASES.items():
+        for size in sizes:
+            content = build(int(size * 1024 * 1024))
+            full, blocks = timed(parse_code_blocks, content)
+            streamed, _ = timed(parse_streamed, content, chunk_size)
+            result = {
+                "case": case,
+                "mb": round(len(content) / 1024 / 1024, 2),
+                "parser": round(full, 4),
+                "streamed": round(streamed, 4),
+                "files": sum(1 for block in blocks if block.path),
+                "regex": None,
+                "regex_files": None,
+            }
+            if size <= regex_max_mb:
+                regex, matches = timed(LEGACY_PATTERN.findall, content)
+                result["regex"] = round(regex, 4)
+                result["regex_files"] = len(matches)
+            results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="1,4")
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--regex-max-mb", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    sizes = [float(size) for size in args.sizes.split(",") if size.strip()]
+    for result in run(sizes, args.chunk_size, args.regex_max_mb):
+        regex = (
+            "skipped"
+            if result["regex"] is None
+            else f"{result['regex']:.4f}s ({result['regex_files']} files)"
+        )
+        print(
+            f"{result['case']:<11} {result['mb']:>6} MB"
+            f" | parser {result['parser']:.4f}s"
+            f" | streamed {result['streamed']:.4f}s ({result['files']} files)"
+            f" | regex {regex}"
+        )
+
+
+if __name__ == "__main__":
+    main()
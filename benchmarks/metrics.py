@@ -0,0 +1,134 @@
+# Process and checkpointer measurements for benchmark runs
+import os
+import time
+import resource
+import threading
+from typing import Dict, Set
+
+
+def current_rss() -> int:
+    """Resident set size of the process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # No procfs, fall back to the peak RSS (kilobytes on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class RSSSampler:
+    """
+    Samples the RSS every `interval` seconds in a background thread and keeps
+    the peak of the whole run and of every node running at sample time.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.active: Set[str] = set()
+        self.peak = 0
+        self.node_peak: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+    def start_node(self, name: str):
+        with self._lock:
+            self.active.add(name)
+        self.sample()
+
+    def end_node(self, name: str):
+        self.sample()
+        with self._lock:
+            self.active.discard(name)
+
+    def sample(self):
+        rss = current_rss()
+        with self._lock:
+            self.peak = max(self.peak, rss)
+            for name in self.active:
+                self.node_peak[name] = max(self.node_peak.get(name, 0), rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+
+def _typed_size(value) -> int:
+    """Size of the bytes held by a serialized (type, bytes) value or a tuple of them."""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(_typed_size(item) for item in value)
+    return 0
+
+
+class CheckpointMeter:
+    """
+    Counts the checkpoints and bytes written to an in-memory checkpointer
+    (MemorySaver or a subclass) by wrapping its put and put_writes methods.
+    """
+
+    def __init__(self, saver):
+        self.saver = saver
+        self.checkpoints = 0
+        self.checkpoint_bytes = 0
+        self.write_bytes = 0
+        self._put = saver.put
+        self._put_writes = saver.put_writes
+
+    def __enter__(self):
+        self.saver.put = self.put
+        self.saver.put_writes = self.put_writes
+        return self
+
+    def __exit__(self, *exc):
+        del self.saver.put
+        del self.saver.put_writes
+
+    @property
+    def total_bytes(self) -> int:
+        return self.checkpoint_bytes + self.write_bytes
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = self._put(config, checkpoint, metadata, new_versions)
+        configurable = result["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        saved = self.saver.storage[thread_id][checkpoint_ns].get(
+            configurable["checkpoint_id"]
+        )
+        self.checkpoints += 1
+        self.checkpoint_bytes += _typed_size(saved)
+        blobs = getattr(self.saver, "blobs", {})
+        for channel, version in new_versions.items():
+            self.checkpoint_bytes += _typed_size(
+                blobs.get((thread_id, checkpoint_ns, channel, version))
+            )
+        return result
+
+    def put_writes(self, config, writes, task_id, *args, **kwargs):
+        for _, value in writes:
+            self.write_bytes += _typed_size(self.saver.serde.dumps_typed(value))
+        return self._put_writes(config, writes, task_id, *args, **kwargs)
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
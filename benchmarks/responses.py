@@ -0,0 +1,129 @@
+# Canned responses in the formats the node parsers expect
+import re
+from typing import List, Union
+
+from langchain_core.messages import BaseMessage
+
+# modules in the plan, files per module, lines per file
+SIZES = {
+    "small": (3, 3, 40),
+    "medium": (8, 6, 120),
+    "huge": (24, 12, 400),
+}
+
+
+def message_content(messages: List[BaseMessage]) -> str:
+    return "\n".join(str(message.content) for message in messages)
+
+
+class CannedResponder:
+    """
+    Answers the prompts of the workflow nodes with generated documents of a
+    fixed size: an analysis, a plan of `modules` modules (module i depends on
+    module i-3, giving three independent chains), module specifications and
+    `files` files of `lines` lines per module.
+    """
+
+    def __init__(self, modules: int, files: int, lines: int):
+        self.modules = modules
+        self.files = files
+        self.lines = lines
+
+    @classmethod
+    def for_size(cls, size: str) -> "CannedResponder":
+        return cls(*SIZES[size])
+
+    def __call__(self, messages: List[BaseMessage], tools: list) -> Union[str, dict]:
+        content = message_content(messages)
+        file_match = re.search(r"for this file only:\s*(\S+)", content)
+        if file_match:
+            return self.file_response([file_match.group(1)])
+        if "Module Specification:" in content and "for each file" in content:
+            return self.file_response(self.module_files(self._module_index(content)))
+        if "Module to Create:" in content:
+            return self.module_spec(self._module_index(content))
+        if tools and "Create a comprehensive project plan" in content:
+            return self.plan()
+        if tools:
+            return self.analysis()
+        return "The project is on track, every planned module has been generated."
+
+    def _module_index(self, content: str) -> int:
+        match = re.search(r"(\d+)\.\s+Module \d+", content)
+        return int(match.group(1)) if match else 1
+
+    def analysis(self) -> str:
+        features = "\n".join(
+            f"- Feature {i}: handles part {i} of the workflow" for i in range(1, 11)
+        )
+        return (
+            "# Requirements Analysis\n"
+            "Project Name: Bench App\n"
+            "## Features\n"
+            f"{features}\n"
+            "## Constraints\n"
+            "- Runs on a single machine\n"
+        )
+
+    def plan(self) -> dict:
+        """ProjectPlanTool arguments."""
+        modules = []
+        for i in range(1, self.modules + 1):
+            modules.append(
+                {
+                    "name": f"Module {i}",
+                    "description": f"Module {i} of the benchmark project.",
+                    "technologies": "Python",
+                    "dependencies": [f"Module {i - 3}"] if i > 3 else [],
+                    "sections": [
+                        {
+                            "name": "Core",
+                            "tasks": [f"Implement the core of module {i}."],
+                            "technologies": "Python",
+                        },
+                        {
+                            "name": "Interface",
+                            "tasks": [f"Expose module {i} to the other modules."],
+                        },
+                    ],
+                }
+            )
+        return {
+            "overview": "# Project Plan\n## Overview\nBenchmark project plan.",
+            "modules": modules,
+            "conclusion": "The plan covers every module.",
+        }
+
+    def module_files(self, index: int) -> List[str]:
+        return [f"/module_{index}/file_{j}.py" for j in range(1, self.files + 1)]
+
+    def module_spec(self, index: int) -> str:
+        entries = "\n".join(
+            f"{j}. **{path}**\n"
+            f"   - **Key Functions:**\n"
+            f"    `run_{j}`: runs part {j} of module {index}\n"
+            for j, path in enumerate(self.module_files(index), start=1)
+        )
+        return (
+            f"# Module Specification: Module {index}\n"
+            "## 1. Module Description\n"
+            f"**Purpose and Functionality:**\nModule {index} of the benchmark.\n"
+            "## 2. Files and Key Functions\n"
+            "### Detailed Key Functions of Each File\n"
+            f"{entries}"
+            "## 3. Module Setup, Configuration, and Environment Variables\n"
+            "### Module Setup\nNone\n"
+        )
+
+    def file_body(self, path: str) -> str:
+        lines = [f"# {path}", ""]
+        for i in range(max(0, self.lines - 2)):
+            lines.append(f"VALUE_{i} = {i}  # generated line {i} of {path}")
+        return "\n".join(lines) + "\n"
+
+    def file_response(self, paths: List[str]) -> str:
+        blocks = "\n".join(
+            f"### {j}. **{path}**\n```python\n{self.file_body(path)}```\n"
+            for j, path in enumerate(paths, start=1)
+        )
+        return f"Below is the implementation of each file.\n\n{blocks}"
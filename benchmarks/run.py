@@ -0,0 +1,277 @@
+"""
+End-to-end benchmark of the compiled graph with a deterministic fake LLM.
+
+    python -m sub_graphs.swe.benchmarks.run --sizes small,medium,huge \\
+        --latency 0.5 --tokens-per-second 80 --output results.json
+
+Runs the whole workflow (analysis, plan, modules, code) for each plan size,
+answering every HITL interrupt automatically, and reports wall time,
+supersteps, checkpoint bytes, emitted bytes and peak RSS per node, along
+with the version of every prompt template.
+With --baseline, exits with status 1 when a run regressed by more than
+--tolerance against a previous --output file.
+"""
+import os
+import sys
+import json
+import uuid
+import asyncio
+import argparse
+import tempfile
+from collections import defaultdict
+
+from langgraph.types import Command
+
+from sub_graphs.swe.benchmarks.fake_llm import FakeChatModel
+from sub_graphs.swe.benchmarks.metrics import CheckpointMeter, RSSSampler, Timer
+from sub_graphs.swe.benchmarks.responses import SIZES, CannedResponder
+
+# Compared against the baseline, lower is better
+REGRESSION_METRICS = ["wall_time", "supersteps", "checkpoint_bytes", "emitted_bytes"]
+
+
+def answer_hitl(hitl: dict) -> dict:
+    """Answer an interrupt the way a user accepting every proposal would."""
+    name = hitl.get("name", "")
+    if name == "planner":
+        return {"name": name, "selected_sections": hitl.get("pending_sections", [])}
+    return {"name": name, "remarks": ""}
+
+
+def setup_environment(workdir: str):
+    """
+    Run from a scratch directory (generated projects, blobs and checkpoints
+    land there) without response cache, and make sure the real clients can
+    be constructed without credentials.
+    """
+    os.chdir(workdir)
+    os.environ["SWE_LLM_CACHE"] = "false"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+
+
+def install_fake_models(latency: float, tokens_per_second: float):
+    """
+    Replace the llm/llm_mini clients with fake models and return them with
+    the compiled graph.
+    """
+    from sub_graphs.swe import config as swe_config
+
+    models = {
+        "llm": FakeChatModel(
+            responder=CannedResponder.for_size("small"),
+            model_name="fake-large",
+            latency=latency,
+            tokens_per_second=tokens_per_second,
+        ),
+        "llm_mini": FakeChatModel(
+            responder=CannedResponder.for_size("small"),
+            model_name="fake-mini",
+            latency=latency,
+            tokens_per_second=tokens_per_second,
+        ),
+    }
+    for name, model in models.items():
+        swe_config.set_model(name, model)
+    # The fake provider is not throttled, and emitted frames are only counted
+    swe_config.rate_limiters.limits["FakeChatModel"] = {"rpm": 1e9, "tpm": 1e12}
+
+    async def discard(config, state):
+        return None
+
+    swe_config.state_emitter._emit = discard
+
+    from sub_graphs.swe.graph import graph
+
+    return models, graph, swe_config.state_emitter
+
+
+def prompt_versions():
+    from sub_graphs.swe.config import prompt_registry
+
+    return prompt_registry.versions()
+
+
+async def run_workflow(graph, emitter, models, size: str, max_interrupts: int):
+    responder = CannedResponder.for_size(size)
+    for model in models.values():
+        model.responder = responder
+        model.calls = 0
+
+    config = {
+        "configurable": {"thread_id": f"bench-{size}-{uuid.uuid4().hex[:8]}"},
+        "recursion_limit": 1000,
+    }
+    payload = {
+        "messages": [("human", "Build the benchmark project")],
+        "next_node": "analyze",
+        "project_name": "",
+        "generated_files": [],
+        "pending_sections": [],
+    }
+    emitted_before = dict(emitter.stats)
+    node_seconds = defaultdict(float)
+    node_calls = defaultdict(int)
+    task_started = {}
+    supersteps = 0
+    interrupts = []
+    errors = []
+
+    with RSSSampler() as rss, CheckpointMeter(graph.checkpointer) as meter:
+        with Timer() as timer:
+            while True:
+                steps = set()
+                async for event in graph.astream(payload, config, stream_mode="debug"):
+                    task = event["payload"]
+                    if event["type"] == "task":
+                        steps.add(event["step"])
+                        task_started[task["id"]] = asyncio.get_running_loop().time()
+                        rss.start_node(task["name"])
+                    elif event["type"] == "task_result":
+                        started = task_started.pop(task["id"], None)
+                        if started is not None:
+                            node_seconds[task["name"]] += (
+                                asyncio.get_running_loop().time() - started
+                            )
+                        node_calls[task["name"]] += 1
+                        rss.end_node(task["name"])
+                supersteps += len(steps)
+
+                snapshot = await graph.aget_state(config)
+                pending = [i.value for t in snapshot.tasks for i in t.interrupts]
+                if not pending:
+                    break
+                hitl = pending[0] or {}
+                interrupts.append(hitl.get("name", ""))
+                if hitl.get("name") == "error":
+                    errors.append(hitl.get("description", ""))
+                if len(interrupts) >= max_interrupts:
+                    errors.append(f"Stopped after {max_interrupts} interrupts")
+                    break
+                payload = Command(resume=answer_hitl(hitl))
+
+    return {
+        "size": size,
+        "modules": responder.modules,
+        "files_per_module": responder.files,
+        "wall_time": round(timer.elapsed, 3),
+        "supersteps": supersteps,
+        "llm_calls": sum(model.calls for model in models.values()),
+        "checkpoints": meter.checkpoints,
+        "checkpoint_bytes": meter.total_bytes,
+        "emitted_frames": emitter.stats["frames"] - emitted_before["frames"],
+        "emitted_bytes": emitter.stats["bytes"] - emitted_before["bytes"],
+        "peak_rss": rss.peak,
+        "interrupts": interrupts,
+        "errors": errors,
+        "nodes": {
+            name: {
+                "calls": node_calls[name],
+                "seconds": round(node_seconds[name], 3),
+                "peak_rss": rss.node_peak.get(name, 0),
+            }
+            for name in sorted(node_calls)
+        },
+    }
+
+
+def compare(results, baseline, tolerance: float):
+    """Return the metrics of `results` worse than `baseline` by more than `tolerance`."""
+    previous = {run["size"]: run for run in baseline}
+    regressions = []
+    for run in results:
+        base = previous.get(run["size"])
+        if not base:
+            continue
+        for metric in REGRESSION_METRICS:
+            if base.get(metric) and run[metric] > base[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{run['size']}: {metric} {base[metric]} -> {run[metric]}"
+                )
+    return regressions
+
+
+def changed_prompts(results, baseline):
+    """Names of the prompt templates whose version differs from the baseline run."""
+    current = results[0].get("prompt_versions", {}) if results else {}
+    previous = baseline[0].get("prompt_versions", {}) if baseline else {}
+    return sorted(
+        name
+        for name in set(current) | set(previous)
+        if current.get(name) != previous.get(name)
+    )
+
+
+def print_report(results):
+    mb = 1024 * 1024
+    for run in results:
+        print(
+            f"\n[{run['size']}] {run['modules']} modules x {run['files_per_module']} files"
+            f" | wall {run['wall_time']}s | supersteps {run['supersteps']}"
+            f" | llm calls {run['llm_calls']} | checkpoints {run['checkpoints']}"
+            f" ({run['checkpoint_bytes'] / mb:.2f} MB)"
+            f" | emitted {run['emitted_frames']} frames ({run['emitted_bytes'] / mb:.2f} MB)"
+            f" | peak RSS {run['peak_rss'] / mb:.1f} MB"
+        )
+        for name, node in run["nodes"].items():
+            print(
+                f"  {name:<28} calls {node['calls']:>4}  {node['seconds']:>8.3f}s"
+                f"  peak RSS {node['peak_rss'] / mb:.1f} MB"
+            )
+        for error in run["errors"]:
+            print(f"  error: {error[:200]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="small,medium,huge")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--max-interrupts", type=int, default=200)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="results JSON of a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes {unknown}, choose from {list(SIZES)}")
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    setup_environment(tempfile.mkdtemp(prefix="swe-bench-"))
+    models, graph, emitter = install_fake_models(args.latency, args.tokens_per_second)
+
+    async def run_all():
+        return [
+            await run_workflow(graph, emitter, models, size, args.max_interrupts)
+            for size in sizes
+        ]
+
+    results = asyncio.run(run_all())
+    versions = prompt_versions()
+    for run in results:
+        run["prompt_versions"] = versions
+    print_report(results)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if baseline is not None:
+        changed = changed_prompts(results, baseline)
+        if changed:
+            print(f"Prompt templates changed since the baseline: {', '.join(changed)}")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
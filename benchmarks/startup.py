@@ -0,0 +1,148 @@
+"""
+Cold start benchmark: time to import the compiled graph in a fresh process.
+
+    python -m sub_graphs.swe.benchmarks.startup --runs 3 --budget 4 --top 25
+
+Imports the graph module with `python -X importtime` and reports the wall
+time and a per-module breakdown (self and cumulative import time, grouped
+by top-level package). Exits with status 1 when the median import time is
+over --budget seconds, or when a module of --forbid (imported lazily on
+first use) was imported at startup.
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+GRAPH_MODULE = "sub_graphs.swe.graph"
+# Provider SDKs, created on first model call, the sandbox runtime and the
+# CopilotKit LangChain helpers (first emit). The copilotkit package itself is
+# imported at startup: FileState, the graph's state schema, subclasses its
+# CopilotKitState and the package __init__ loads its SDK and AG-UI agent.
+LAZY_MODULES = (
+    "langchain_openai,langchain_anthropic,openai,anthropic,tiktoken,swerex,"
+    "copilotkit.langchain"
+)
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_graph(module: str):
+    """Import `module` in a fresh interpreter, return (seconds, importtime lines)."""
+    code = (
+        "import time, importlib\n"
+        "start = time.perf_counter()\n"
+        f"importlib.import_module({module!r})\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr.splitlines()
+
+
+def parse_importtime(lines):
+    """Return {module: (self_us, cumulative_us)} from `-X importtime` output."""
+    modules = {}
+    for line in lines:
+        match = IMPORT_LINE.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return modules
+
+
+def breakdown(modules):
+    """Self import time grouped by top-level package, in seconds."""
+    packages = defaultdict(int)
+    for name, (self_us, _) in modules.items():
+        packages[name.split(".")[0]] += self_us
+    return {
+        name: round(us / 1e6, 4)
+        for name, us in sorted(packages.items(), key=lambda item: -item[1])
+    }
+
+
+def run(module: str, runs: int, forbid):
+    timings, modules = [], {}
+    for _ in range(runs):
+        seconds, lines = import_graph(module)
+        timings.append(seconds)
+        modules = parse_importtime(lines)
+    slowest = sorted(modules.items(), key=lambda item: -item[1][1])
+    return {
+        "module": module,
+        "runs": [round(seconds, 4) for seconds in timings],
+        "median": round(statistics.median(timings), 4),
+        "modules": len(modules),
+        "packages": breakdown(modules),
+        "slowest": [
+            {"module": name, "self": self_us / 1e6, "cumulative": cumulative / 1e6}
+            for name, (self_us, cumulative) in slowest
+        ],
+        "eager": sorted(
+            name
+            for name in modules
+            if name.split(".")[0] in forbid or name in forbid
+        ),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default=GRAPH_MODULE)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--budget", type=float, help="maximum median import time")
+    parser.add_argument(
+        "--forbid",
+        default=LAZY_MODULES,
+        help="comma separated modules that must not be imported at startup",
+    )
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    forbid = {name.strip() for name in args.forbid.split(",") if name.strip()}
+    report = run(args.module, max(1, args.runs), forbid)
+
+    print(
+        f"import {report['module']}: median {report['median']}s"
+        f" over {len(report['runs'])} runs {report['runs']}, {report['modules']} modules"
+    )
+    print("\nby package (self time):")
+    for name, seconds in list(report["packages"].items())[: args.top]:
+        print(f"  {name:<40} {seconds:>8.4f}s")
+    print("\nslowest modules (cumulative time):")
+    for entry in report["slowest"][: args.top]:
+        print(
+            f"  {entry['module']:<60} {entry['cumulative']:>8.4f}s"
+            f"  self {entry['self']:.4f}s"
+        )
+
+    if args.output:
+        report["slowest"] = report["slowest"][: args.top]
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    if report["eager"]:
+        print(f"\nFAIL imported at startup: {', '.join(report['eager'])}")
+        failed = True
+    if args.budget is not None and report["median"] > args.budget:
+        print(f"\nFAIL median import time {report['median']}s > {args.budget}s")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,525 @@
+import os
+import threading
 from sub_graphs.swe.project_data_state import FileState
-from utils.logger import BRDLogger, LogLevel
-from langchain_openai import ChatOpenAI
+from utils.logger import LogLevel
 from langchain_core.runnables import RunnableConfig
-from copilotkit.langchain import copilotkit_customize_config
 from dotenv import load_dotenv
 
-# from langchain_deepseek import ChatDeepSeek
-from langchain_anthropic import ChatAnthropic
+from sub_graphs.swe.tools.llm_cache import (
+    LLMCache,
+    MemoryCache,
+    SQLiteCache,
+    request_cache_key,
+    resolve_chat_model,
+    model_id,
+)
+from sub_graphs.swe.tools.rate_limiter import RateLimiterRegistry
+from sub_graphs.swe.tools.blob_store import BlobStore
+from sub_graphs.swe.tools.workspace_writer import WorkspaceWriter
+from sub_graphs.swe.tools.state_emitter import StateEmitter
+from sub_graphs.swe.tools.log_stream import LogStream, StreamLogger
+from sub_graphs.swe.tools.context_assembler import ContextAssembler
+from sub_graphs.swe.prompts.registry import PromptRegistry
+from sub_graphs.swe.tools.model_clients import ModelClientRegistry
+from sub_graphs.swe.tools.sandbox_pool import SandboxLimits, SandboxPool
+from sub_graphs.swe.tools.dependency_cache import DependencyCache
+from sub_graphs.swe.tools.tracing import JSONLSink, OTelSink, Tracer, thread_id_of
 
 
 # Initialize components
 load_dotenv(".env")
-logger = BRDLogger()
 
-llm = ChatAnthropic(
-    model="claude-3-7-sonnet-20250219", max_tokens=5000, temperature=0.5
+
+# Model clients are created on first use from the shared model_clients
+# registry, the provider SDKs are only imported then. `config.llm` and
+# `config.llm_mini` still work.
+def create_llm():
+    # Retries are handled by the shared rate limiter in ainvoke_with_limits
+    return model_clients.chat_model(
+        "anthropic",
+        "claude-3-7-sonnet-20250219",
+        max_tokens=5000,
+        temperature=0.5,
+        max_retries=0,
+    )
+    # from langchain_deepseek import ChatDeepSeek
+    # return ChatDeepSeek(temperature=0.5, model="deepseek-reasoner")
+
+
+def create_llm_mini():
+    return model_clients.chat_model(
+        "openai", "gpt-4o-mini", temperature=0.5, max_retries=0
+    )
+
+
+MODEL_FACTORIES = {"llm": create_llm, "llm_mini": create_llm_mini}
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(name: str):
+    """The model client `name` of MODEL_FACTORIES, created once."""
+    model = _models.get(name)
+    if model is None:
+        with _models_lock:
+            model = _models.get(name)
+            if model is None:
+                model = _models[name] = MODEL_FACTORIES[name]()
+    return model
+
+
+def set_model(name: str, model):
+    """Replace a model client, e.g. with a fake model in benchmarks."""
+    with _models_lock:
+        _models[name] = model
+
+
+def __getattr__(name):
+    if name in MODEL_FACTORIES:
+        return get_model(name)
+    if name == "dependency_cache":
+        return get_dependency_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Model used by each node: "cascade" tries llm_mini first and escalates to llm
+# when the output fails validation, "mini" and "strong" always use one model.
+# Override per node with SWE_MODEL_POLICY_<NODE>, e.g. SWE_MODEL_POLICY_CODE=strong
+MODEL_POLICY_DEFAULT = os.getenv("SWE_MODEL_POLICY", "cascade")
+MODEL_POLICY = {
+    node: os.getenv(f"SWE_MODEL_POLICY_{node.upper()}", default).lower()
+    for node, default in {
+        "analyze": MODEL_POLICY_DEFAULT,
+        "planner": MODEL_POLICY_DEFAULT,
+        "module_spec": MODEL_POLICY_DEFAULT,
+        "code": MODEL_POLICY_DEFAULT,
+        "reflect": "mini",
+        "response": "mini",
+        "compact": "mini",
+    }.items()
+}
+
+# Token budget of the conversation history and project context put in the
+# prompt of each node, see tools/context_assembler.py. Override per node with
+# SWE_CONTEXT_BUDGET_<NODE>, e.g. SWE_CONTEXT_BUDGET_RESPONSE=4000
+CONTEXT_BUDGETS = {
+    node: int(os.getenv(f"SWE_CONTEXT_BUDGET_{node.upper()}", default))
+    for node, default in {
+        "analyze": "12000",
+        "planner": "12000",
+        "response": "6000",
+    }.items()
+}
+# Latest messages kept before the project context and older history
+CONTEXT_RECENT_TURNS = int(os.getenv("SWE_CONTEXT_RECENT_TURNS", "6"))
+
+# When the message history passes COMPACT_THRESHOLD tokens (0 disables it),
+# a new run first summarizes everything but the COMPACT_KEEP_MESSAGES latest
+# messages into history_summary and removes them from the state
+COMPACT_THRESHOLD = int(os.getenv("SWE_COMPACT_THRESHOLD", "24000"))
+COMPACT_KEEP_MESSAGES = int(os.getenv("SWE_COMPACT_KEEP_MESSAGES", "8"))
+
+# Maximum number of modules generated at the same time by code_module.
+# Set to 1 to keep the one-module-per-cycle flow with a HITL step per module.
+MODULE_CONCURRENCY = int(os.getenv("SWE_MODULE_CONCURRENCY", "4"))
+
+# Generate every file listed in a module specification with its own LLM call
+# instead of one response for the whole module.
+PER_FILE_GENERATION = os.getenv("SWE_PER_FILE_GENERATION", "false").lower() == "true"
+FILE_CONCURRENCY = int(os.getenv("SWE_FILE_CONCURRENCY", "8"))
+
+# Response cache used by call_ai, only responses accepted by the validator of
+# the caller are stored. Set SWE_LLM_CACHE_PATH to "" to keep the cache in
+# memory only.
+LLM_CACHE_ENABLED = os.getenv("SWE_LLM_CACHE", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("SWE_LLM_CACHE_PATH", ".cache/llm_cache.sqlite")
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("SWE_LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("SWE_LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+LLM_CACHE_TTL = float(os.getenv("SWE_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+
+llm_cache = LLMCache(
+    memory=MemoryCache(LLM_CACHE_MEMORY_ENTRIES, ttl=LLM_CACHE_TTL),
+    disk=(
+        SQLiteCache(LLM_CACHE_PATH, max_bytes=LLM_CACHE_MAX_BYTES, ttl=LLM_CACHE_TTL)
+        if LLM_CACHE_PATH
+        else None
+    ),
+)
+
+# Provider limits shared by every call to the same provider/model, keys are
+# "<ChatModelClass>" or "<ChatModelClass>:<model>"
+RATE_LIMITS = {
+    "ChatAnthropic": {
+        "rpm": float(os.getenv("SWE_ANTHROPIC_RPM", "50")),
+        "tpm": float(os.getenv("SWE_ANTHROPIC_TPM", "40000")),
+    },
+    "ChatOpenAI": {
+        "rpm": float(os.getenv("SWE_OPENAI_RPM", "500")),
+        "tpm": float(os.getenv("SWE_OPENAI_TPM", "200000")),
+    },
+}
+rate_limiters = RateLimiterRegistry(
+    RATE_LIMITS,
+    max_concurrency=int(os.getenv("SWE_LLM_MAX_CONCURRENCY", "8")),
+    max_retries=int(os.getenv("SWE_LLM_MAX_RETRIES", "5")),
+)
+
+# Checkpoint retention of the in-memory checkpointer, idle threads are moved
+# to CHECKPOINT_SPILL_DIR and loaded back when they are resumed
+CHECKPOINT_MAX_PER_THREAD = int(os.getenv("SWE_CHECKPOINT_MAX_PER_THREAD", "20"))
+CHECKPOINT_IDLE_TTL = float(os.getenv("SWE_CHECKPOINT_IDLE_TTL", "1800"))
+CHECKPOINT_SPILL_DIR = os.getenv("SWE_CHECKPOINT_SPILL_DIR", ".cache/checkpoints")
+
+# Generated file contents are kept here, state only references them by hash
+BLOB_STORE_DIR = os.getenv("SWE_BLOB_STORE_DIR", ".cache/blobs")
+blob_store = BlobStore(BLOB_STORE_DIR)
+
+# Generated projects are written in batches through a bounded thread pool,
+# unchanged files are skipped. SWE_WORKSPACE_FSYNC=true also syncs every file
+# to disk before it replaces the previous version.
+WORKSPACE_WRITE_CONCURRENCY = int(os.getenv("SWE_WORKSPACE_WRITE_CONCURRENCY", "8"))
+WORKSPACE_FSYNC = os.getenv("SWE_WORKSPACE_FSYNC", "false").lower() == "true"
+workspace_writer = WorkspaceWriter(
+    ".", max_workers=WORKSPACE_WRITE_CONCURRENCY, fsync=WORKSPACE_FSYNC
+)
+
+# State is emitted to the frontend as JSON-patch deltas, emits closer than
+# EMIT_WINDOW seconds are merged into one frame
+EMIT_WINDOW = float(os.getenv("SWE_EMIT_WINDOW", "0.05"))
+async def copilotkit_emit(config, state):
+    # copilotkit.langchain is imported on the first emit, not at startup
+    from copilotkit.langchain import copilotkit_emit_state
+
+    return await copilotkit_emit_state(config, state)
+
+
+state_emitter = StateEmitter(copilotkit_emit, window=EMIT_WINDOW)
+emit_state = state_emitter.emit
+
+# Workflow logs are kept in a bounded ring buffer per thread, state only
+# carries the cursor of the thread's log and the UI reads the entries from it
+LOG_BUFFER_SIZE = int(os.getenv("SWE_LOG_BUFFER_SIZE", "1000"))
+LOG_MAX_THREADS = int(os.getenv("SWE_LOG_MAX_THREADS", "256"))
+log_stream = LogStream(LOG_BUFFER_SIZE, LOG_MAX_THREADS)
+logger = StreamLogger(log_stream)
+
+# "direct": nodes hand over straight to their next_node,
+# "hub": every step goes through the generate_path node (previous behaviour)
+ROUTING_MODE = os.getenv("SWE_ROUTING_MODE", "direct").lower()
+
+# Templates of prompts/ are compiled once at startup and versioned by their
+# content hash. SWE_PROMPTS_HOT_RELOAD=true recompiles a template when its file
+# changes, for editing prompts without restarting.
+PROMPTS_HOT_RELOAD = os.getenv("SWE_PROMPTS_HOT_RELOAD", "false").lower() == "true"
+prompt_registry = PromptRegistry(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts"),
+    hot_reload=PROMPTS_HOT_RELOAD,
+)
+
+# Node and LLM call spans. Metrics are always aggregated (GET /metrics), spans
+# are also written to SWE_TRACE_JSONL and/or exported with OpenTelemetry
+# (SWE_TRACE_OTEL=true, needs opentelemetry-sdk and the OTLP exporter).
+TRACE_JSONL = os.getenv("SWE_TRACE_JSONL", "")
+TRACE_OTEL = os.getenv("SWE_TRACE_OTEL", "false").lower() == "true"
+trace_sinks = []
+if TRACE_JSONL:
+    trace_sinks.append(JSONLSink(TRACE_JSONL))
+if TRACE_OTEL:
+    try:
+        trace_sinks.append(OTelSink())
+    except ImportError as e:
+        print(f"OpenTelemetry export disabled: {e}")
+tracer = Tracer(trace_sinks)
+tracer.metrics.add_collector(llm_cache.collect)
+tracer.metrics.add_collector(rate_limiters.collect)
+
+# Keep-alive connection pool per provider, shared by all its models. Pool use
+# is reported on /metrics (swe_http_requests_total, swe_http_connections_*)
+HTTP_MAX_CONNECTIONS = int(os.getenv("SWE_HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("SWE_HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("SWE_HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_TIMEOUT = float(os.getenv("SWE_HTTP_TIMEOUT", "120"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("SWE_HTTP_CONNECT_TIMEOUT", "10"))
+model_clients = ModelClientRegistry(
+    max_connections=HTTP_MAX_CONNECTIONS,
+    max_keepalive=HTTP_MAX_KEEPALIVE,
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    timeout=HTTP_TIMEOUT,
+    connect_timeout=HTTP_CONNECT_TIMEOUT,
+    metrics=tracer.metrics,
 )
-# llm = ChatDeepSeek(temperature=0.5, model="deepseek-reasoner")
-llm_mini = ChatOpenAI(temperature=0.5, model="gpt-4o-mini")
 
+# Installed dependencies of generated projects keyed by their manifest and
+# lock files, with a local package mirror. SWE_DEPENDENCY_CACHE_OFFLINE only
+# installs from the mirror. Mounted at /deps in docker sandboxes.
+DEPENDENCY_CACHE_DIR = os.getenv("SWE_DEPENDENCY_CACHE_DIR", ".cache/dependencies")
+DEPENDENCY_CACHE_MAX_BYTES = int(
+    os.getenv("SWE_DEPENDENCY_CACHE_MAX_BYTES", str(10 * 1024**3))
+)
+DEPENDENCY_CACHE_OFFLINE = (
+    os.getenv("SWE_DEPENDENCY_CACHE_OFFLINE", "false").lower() == "true"
+)
+
+# Pre-started swe-rex sandboxes to build and run generated projects, "local"
+# runs them on this machine one command at a time, "docker" in SANDBOX_IMAGE
+# containers in parallel and with the memory limit. SANDBOX_TIMEOUT is the
+# wall time of one lease.
+SANDBOX_POOL_SIZE = int(os.getenv("SWE_SANDBOX_POOL_SIZE", "2"))
+SANDBOX_BACKEND = os.getenv("SWE_SANDBOX_BACKEND", "local").lower()
+SANDBOX_IMAGE = os.getenv("SWE_SANDBOX_IMAGE", "node:20")
+SANDBOX_MAX_USES = int(os.getenv("SWE_SANDBOX_MAX_USES", "20"))
+sandbox_pool = SandboxPool(
+    size=SANDBOX_POOL_SIZE,
+    backend=SANDBOX_BACKEND,
+    image=SANDBOX_IMAGE,
+    limits=SandboxLimits(
+        cpus=float(os.getenv("SWE_SANDBOX_CPUS", "1")),
+        memory_mb=int(os.getenv("SWE_SANDBOX_MEMORY_MB", "2048")),
+        timeout=float(os.getenv("SWE_SANDBOX_TIMEOUT", "300")),
+    ),
+    max_uses=SANDBOX_MAX_USES,
+    root=os.getenv("SWE_SANDBOX_ROOT", ".cache/sandboxes"),
+    volumes={DEPENDENCY_CACHE_DIR: "/deps"},
+    metrics=tracer.metrics,
+)
+_dependency_cache = None
+_dependency_cache_lock = threading.Lock()
+
+
+def get_dependency_cache() -> DependencyCache:
+    """
+    The dependency cache, created on first use so importing config does not
+    create its directory and SQLite index in every worker.
+    """
+    global _dependency_cache
+    if _dependency_cache is None:
+        with _dependency_cache_lock:
+            if _dependency_cache is None:
+                _dependency_cache = DependencyCache(
+                    DEPENDENCY_CACHE_DIR,
+                    max_bytes=DEPENDENCY_CACHE_MAX_BYTES,
+                    offline=DEPENDENCY_CACHE_OFFLINE,
+                    sandbox_root="/deps" if SANDBOX_BACKEND == "docker" else None,
+                    metrics=tracer.metrics,
+                )
+    return _dependency_cache
+
+
+async def ainvoke_with_limits(request, input_data, config):
+    """
+    Invoke a chain or bound model through the shared rate limiter of its
+    provider/model, retrying throttled and transient provider errors.
+    """
+    model, _ = resolve_chat_model(request)
+    with tracer.span(
+        "ainvoke",
+        "llm",
+        model=model_id(model) if model else type(request).__name__,
+        thread_id=thread_id_of(config),
+        cache_hit=False,
+    ) as span:
+        if model is None:
+            response = await request.ainvoke(input_data, config)
+            span.mark_first_token()
+            return response
+
+        limiter = rate_limiters.get(type(model).__name__, model_id(model))
+        # Rough estimate, the bucket is corrected with the real usage afterwards
+        estimated_tokens = len(str(input_data)) // 4 + (
+            getattr(model, "max_tokens", None) or 1024
+        )
+
+        def on_retry(attempt, e, delay):
+            span.set(retries=attempt)
+            logger.log(
+                f"AI call failed, retrying in {delay:.1f}s ({attempt}): {str(e)[:50]}",
+                level=LogLevel.WARNING,
+            )
+
+        response = await limiter.run(
+            lambda: request.ainvoke(input_data, config), estimated_tokens, on_retry
+        )
+        # Not streamed, the whole response is the first token
+        span.mark_first_token()
+        span.record_usage(response)
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            limiter.record_tokens(usage.get("total_tokens", 0) - estimated_tokens)
+        return response
+
+
+def accepts(validate, response) -> bool:
+    """Whether `validate` accepts `response`, a failing validator rejects it."""
+    if validate is None:
+        return True
+    try:
+        return bool(validate(response))
+    except Exception:
+        return False
+
+
+async def cached_response(request, cache_key, config, validate):
+    """The cached response of `cache_key` if `validate` accepts it, else None."""
+    cached = await llm_cache.aget_response(cache_key)
+    if cached is None or not accepts(validate, cached):
+        return None
+    record_cache_hit(request, cached, config)
+    return cached
+
+
+async def stream_ai(request, input_data, config, validate=None, use_cache=True):
+    """
+    Streaming variant of call_ai, yields message chunks as they arrive.
+    A cached response is yielded as a single chunk. `validate` gets the
+    whole response.
+    """
+    cache_key = request_cache_key(request, input_data) if LLM_CACHE_ENABLED else None
+    if cache_key and use_cache:
+        cached = await cached_response(request, cache_key, config, validate)
+        if cached is not None:
+            yield cached
+            return
+
+    config = customize_config(config)
+    model, _ = resolve_chat_model(request)
+    # Not made the current span, the generator is suspended between chunks
+    span = tracer.start_span(
+        "astream",
+        "llm",
+        model=model_id(model) if model else type(request).__name__,
+        thread_id=thread_id_of(config),
+        cache_hit=False,
+    )
+    if model is None:
+        chunks = request.astream(input_data, config)
+    else:
+        limiter = rate_limiters.get(type(model).__name__, model_id(model))
+        estimated_tokens = len(str(input_data)) // 4 + (
+            getattr(model, "max_tokens", None) or 1024
+        )
 
-logger = BRDLogger()
+        def on_retry(attempt, e, delay):
+            logger.log(
+                f"AI stream failed, retrying in {delay:.1f}s ({attempt}): {str(e)[:50]}",
+                level=LogLevel.WARNING,
+            )
 
+        chunks = limiter.stream(
+            lambda: request.astream(input_data, config), estimated_tokens, on_retry
+        )
 
-# Retry decorator for AI calls
-# @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-async def call_ai(request, input_data, config):
-    """Wrapper for AI calls with retry mechanism."""
+    response = None
     try:
-        return await request.ainvoke(input_data, customize_config(config))
+        async for chunk in chunks:
+            span.mark_first_token()
+            response = chunk if response is None else response + chunk
+            yield chunk
+    except BaseException as e:
+        tracer.end_span(span, e)
+        raise
+    span.record_usage(response)
+    tracer.end_span(span)
+
+    if cache_key and response is not None and accepts(validate, response):
+        await llm_cache.aset_response(cache_key, response)
+
+
+async def call_ai(request, input_data, config, validate=None, use_cache=True):
+    """
+    Wrapper for AI calls with retry mechanism and response cache.
+
+    A response is only cached once `validate(response)` accepts it, pass the
+    validator of the caller so a rejected answer is not replayed (a cached
+    response it rejects is a miss). `use_cache=False` skips the lookup, for
+    retries after an error that would get the same answer again.
+    """
+    cache_key = request_cache_key(request, input_data) if LLM_CACHE_ENABLED else None
+    if cache_key and use_cache:
+        cached = await cached_response(request, cache_key, config, validate)
+        if cached is not None:
+            return cached
+
+    try:
+        response = await ainvoke_with_limits(
+            request, input_data, customize_config(config)
+        )
     except Exception as e:
-        logger.log(f"AI call failed, retrying: {str(e)[:50]}", level=LogLevel.WARNING)
+        logger.log(f"AI call failed: {str(e)[:50]}", level=LogLevel.WARNING)
         raise
 
+    if cache_key and accepts(validate, response):
+        await llm_cache.aset_response(cache_key, response)
+    return response
+
+
+def cascade_models(node: str):
+    """Models tried in order for `node` according to MODEL_POLICY."""
+    policy = MODEL_POLICY.get(node, "mini")
+    if policy == "strong":
+        return [get_model("llm")]
+    if policy == "cascade":
+        return [get_model("llm_mini"), get_model("llm")]
+    return [get_model("llm_mini")]
+
+
+def context_assembler(node: str) -> ContextAssembler:
+    """Assembler filling the context budget of `node`."""
+    return ContextAssembler(CONTEXT_BUDGETS.get(node, 6000), CONTEXT_RECENT_TURNS)
+
+
+async def call_with_cascade(node: str, call, validate):
+    """
+    Run `call(model)` with the models of the cascade of `node` until
+    `validate(response)` returns a truthy result, a failed or rejected
+    response of a cheaper model escalates to the next one.
+
+    Returns (response, result). When the last model is rejected too, its
+    response is returned with the falsy result, its errors are raised.
+    """
+    models = cascade_models(node)
+    for index, model in enumerate(models):
+        last = index == len(models) - 1
+        try:
+            response = await call(model)
+            result = validate(response)
+        except Exception as e:
+            if last:
+                raise
+            reason = f"{type(e).__name__}: {str(e)[:50]}"
+        else:
+            if result or last:
+                return response, result
+            reason = "output failed validation"
+
+        tracer.metrics.inc(
+            "swe_model_escalations_total",
+            1,
+            {"node": node, "model": model_id(model)},
+            help="Cascade escalations to a stronger model",
+        )
+        logger.log(
+            f"{model_id(model)} rejected for {node} ({reason}), "
+            f"escalating to {model_id(models[index + 1])}",
+            level=LogLevel.WARNING,
+        )
+
+
+def record_cache_hit(request, response, config):
+    """Record an LLM call answered from the response cache."""
+    model, _ = resolve_chat_model(request)
+    with tracer.span(
+        "cache",
+        "llm",
+        model=model_id(model) if model else type(request).__name__,
+        thread_id=thread_id_of(config),
+        cache_hit=True,
+    ) as span:
+        span.record_usage(response)
+
 
 def customize_config(config: RunnableConfig) -> RunnableConfig:
     """Customize LangChain config for CopilotKit."""
+    from copilotkit.langchain import copilotkit_customize_config
+
     return copilotkit_customize_config(
         config,
         emit_messages=False,
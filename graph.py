@@ -1,38 +1,62 @@
 from sub_graphs.swe.nodes.analyse_module import analyze_request
 from sub_graphs.swe.nodes.code_module import code_module
+from sub_graphs.swe.nodes.compact_history_module import (
+    compact_history,
+    needs_compaction,
+)
 from sub_graphs.swe.nodes.create_module import create_module
 from sub_graphs.swe.nodes.general_response_module import generate_respond_to_query
-from sub_graphs.swe.nodes.generate_path_module import generate_path
+from sub_graphs.swe.nodes.generate_path_module import (
+    Route,
+    generate_path,
+    route,
+    route_from_state,
+)
 from sub_graphs.swe.nodes.planning_module import planner
 from sub_graphs.swe.nodes.reflect_module import reflect
-from langgraph.checkpoint.memory import MemorySaver
+from sub_graphs.swe.tools.checkpointer import BoundedMemorySaver
+from sub_graphs.swe.config import (
+    CHECKPOINT_MAX_PER_THREAD,
+    CHECKPOINT_IDLE_TTL,
+    CHECKPOINT_SPILL_DIR,
+    emit_state,
+    state_emitter,
+    logger,
+    tracer,
+    ROUTING_MODE,
+)
 from sub_graphs.swe.project_data_state import (
     FileState,
+    NextNode,
 )
-from typing import Literal
-from utils.logger import BRDLogger
 from langgraph.graph import StateGraph, END, START
-from langchain_core.runnables import RunnableConfig
-from copilotkit.langchain import copilotkit_emit_state
+from langchain_core.runnables import RunnableConfig, ensure_config
 from langchain_core.messages import SystemMessage
-from config import Config
-from dotenv import load_dotenv
 import json
+import functools
 from langgraph.types import Command, interrupt
 
 # Import nodes
 
 
-memory = MemorySaver()
-logger = BRDLogger()
+memory = BoundedMemorySaver(
+    max_checkpoints=CHECKPOINT_MAX_PER_THREAD,
+    idle_ttl=CHECKPOINT_IDLE_TTL,
+    spill_dir=CHECKPOINT_SPILL_DIR,
+)
 
 
-async def process_feedback_node(state: FileState) -> Command[Literal["generate_path"]]:
+async def process_feedback_node(state: FileState, config: RunnableConfig) -> Command[Route]:
     print("HITL:", state.get("hitl", {}))
+    # The node runs again from the top when the client resumes, the client
+    # gets the whole state in the next frame (flushed at the interrupt)
+    state_emitter.reset(config, state)
 
     response = interrupt(state.get("hitl", {}))
     print("INTERRUPTED HITL:\n", response)
 
+    # Only the keys changed by the feedback are written back
+    update = {"next_node": state.get("next_node"), "retry_after_error": False}
     try:
         if isinstance(response, str):
             hitl = json.loads(response)
@@ -42,36 +66,35 @@ async def process_feedback_node(state: FileState) -> Command[Literal["generate_p
         print("USER_HITL:\n", hitl)
         match hitl["name"]:
             case "documentation":
-                state["next_node"] = "planner"
-                # state["follow_up"] = hitl["remarks"]
-                state["hitl"] = {}
+                update["next_node"] = NextNode.PLANNER
+                # update["follow_up"] = hitl["remarks"]
+                update["hitl"] = {}
             case "planner":
                 print("selected_sections_pfn:\n", hitl["selected_sections"])
-                state["pending_sections"].clear()
-                state["pending_sections"] = hitl["selected_sections"]
-                state["next_node"] = "create_module"
-                # state["follow_up"] = hitl["remarks"]
-                state["hitl"] = {}
+                update["pending_sections"] = hitl["selected_sections"]
+                update["next_node"] = NextNode.CREATE_MODULE
+                # update["follow_up"] = hitl["remarks"]
+                update["hitl"] = {}
             case "create_module":
-                state["next_node"] = "code_module"
-                # state["follow_up"] = hitl["remarks"]
+                update["next_node"] = NextNode.CODE_MODULE
+                # update["follow_up"] = hitl["remarks"]
             case "success":
                 print("Generation completed")
-                state["next_node"] = "reflect"
-                # state["follow_up"] = hitl["remarks"]
+                update["next_node"] = NextNode.REFLECT
+                # update["follow_up"] = hitl["remarks"]
             case "error":
-                state["follow_up"] = ""
+                update["follow_up"] = ""
+                update["retry_after_error"] = True
     except Exception as e:
         print("Error processing feedback:\n", e)
-        # state["follow_up"] = str(e)
+        # update["follow_up"] = str(e)
 
-    state["messages"] = [
+    update["messages"] = [
         SystemMessage(
             content="User has reviewed the documents, please process their feedback and act accordingly."
         )
     ]
-    # print("STATE:\n", state)
-    return Command(goto="generate_path", update={**state})
+    return route(update)
 
 
 # Clear state node to reset temporary workflow state
@@ -81,17 +104,17 @@ async def clear_state(state: FileState, config: RunnableConfig):
     This prevents state accumulation and potential conflicts.
     """
     logger.log("Clearing temporary workflow state...", section="clear_state")
-    await copilotkit_emit_state(config, {"logs": logger._format_logs_for_state()})
+    await emit_state(config, logger.cursor_state())
 
     # List of temporary state variables to clear
-    temp_vars = ["follow_up", "response"]
+    temp_vars = ["follow_up", "response", "retry_after_error"]
 
     # Create an update dictionary to clear temporary variables
     update = {var: None for var in temp_vars if var in state}
 
     # Preserve essential project state variables
     logger.log("Temporary state cleared", section="clear_state")
-    await copilotkit_emit_state(config, {"logs": logger._format_logs_for_state()})
+    await emit_state(config, logger.cursor_state())
 
     # Return the update to apply to the state
     return update
@@ -99,21 +122,64 @@ async def clear_state(state: FileState, config: RunnableConfig):
 
 # Create workflow
 workflow = StateGraph(FileState)
-workflow.add_node("generate_path", generate_path)
-workflow.add_node("analyze_request", analyze_request)
 
-workflow.add_node("planner", planner)
-workflow.add_node("create_module", create_module)
-workflow.add_node("code_module", code_module)
-workflow.add_node("generate_respond_to_query", generate_respond_to_query)
+
+def flush_emits(node):
+    """Wrap a node so the state it emitted is sent before it returns or interrupts."""
+
+    @functools.wraps(node)
+    async def flushed(state, *args, **kwargs):
+        try:
+            return await node(state, *args, **kwargs)
+        finally:
+            config = kwargs.get("config") or (args[0] if args else ensure_config())
+            await state_emitter.flush(config)
+
+    return flushed
+
+
+def add_node(name, node):
+    """
+    Add a node, every run of it is recorded as a tracing span and its pending
+    state frames are flushed when it returns.
+    """
+    workflow.add_node(name, tracer.trace_node(name, flush_emits(node)))
+
+
+add_node("generate_path", generate_path)
+add_node("analyze_request", analyze_request)
+
+add_node("planner", planner)
+add_node("create_module", create_module)
+add_node("code_module", code_module)
+add_node("generate_respond_to_query", generate_respond_to_query)
 # workflow.add_node("follow_up_node", follow_up_node)
 
-workflow.add_node("reflect", reflect)
-workflow.add_node("clear_state", clear_state)
-workflow.add_node("process_feedback_node", process_feedback_node)
+add_node("reflect", reflect)
+add_node("clear_state", clear_state)
+add_node("compact_history", compact_history)
+add_node("process_feedback_node", process_feedback_node)
 
-# Set entry point to generate_path
-workflow.add_edge(START, "generate_path")
+def route_entry(state: FileState, config: RunnableConfig) -> str:
+    """
+    Entry point: a long history is compacted first. Then generate_path in hub
+    mode, in direct mode nodes hand over to each other directly and
+    generate_path is only kept for graphs resumed from a checkpoint taken in
+    hub mode. A new run starts with a full state frame.
+    """
+    state_emitter.reset(config, state)
+    if needs_compaction(state):
+        return "compact_history"
+    if ROUTING_MODE == "hub":
+        return "generate_path"
+    return route_from_state(state)
+
+
+workflow.add_conditional_edges(
+    START,
+    route_entry,
+    [node.value for node in NextNode] + ["generate_path", "compact_history"],
+)
 workflow.add_edge("clear_state", END)
 
 
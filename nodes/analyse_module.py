@@ -1,37 +1,41 @@
 # Analyse reuirements node
 
 from sub_graphs.swe.tools.core_tools import SummarizeTool
-from sub_graphs.swe.config import llm_mini, logger
-from sub_graphs.swe.prompts.swe_prompts import build_system_prompt
-from sub_graphs.configs.constants import (
-    create_file_structure as async_create_file_structure,
+from sub_graphs.swe.config import (
+    logger,
+    ainvoke_with_limits,
+    call_with_cascade,
+    context_assembler,
+    blob_store,
+    emit_state,
+    workspace_writer,
 )
+from sub_graphs.swe.prompts.swe_prompts import build_system_message
+from sub_graphs.swe.tools.workspace_writer import state_structure
 from sub_graphs.swe.project_data_state import (
     CurrentModule,
     FileInfo,
     FileState,
+    NextNode,
 )
 
 import re
-from typing import Literal
 from utils.logger import LogLevel
 from langchain_core.runnables import RunnableConfig
-from copilotkit.langchain import copilotkit_emit_state
-from langchain_core.messages import SystemMessage
 from langgraph.types import Command
+from sub_graphs.swe.nodes.generate_path_module import Route, route
 from datetime import datetime
 from langgraph.types import Command
 from langchain_core.runnables import RunnableConfig
 from copilotkit.langgraph import copilotkit_customize_config
 
 
-model = llm_mini
 tools = [SummarizeTool]
 
 
 async def analyze_request(
     state: FileState, config: RunnableConfig
-) -> Command[Literal["generate_path"]]:
+) -> Command[Route]:
     """
     Analyze the user's request to understand project requirements and scope.
 
@@ -53,22 +57,32 @@ async def analyze_request(
     generated_files = state.get("generated_files", [])
     analysis = {}
     logger.log("Analyzing user request...", section="analysis")
-    await copilotkit_emit_state(
+    await emit_state(
         config,
         {
             "stream": analysis,
             "generated_files": generated_files,
-            "logs": logger._format_logs_for_state(),
+            **logger.cursor_state(),
         },
     )
 
     try:
-        response = await model.bind_tools(tools, tool_choice="SummarizeTool").ainvoke(
-            [
-                SystemMessage(content=build_system_prompt(state, "analyze")),
-                *state["messages"],
-            ],
-            config,
+        history = (
+            context_assembler("analyze")
+            .assemble(state["messages"], summaries=[state.get("history_summary", "")])
+            .history()
+        )
+        response, _ = await call_with_cascade(
+            "analyze",
+            lambda model: ainvoke_with_limits(
+                model.bind_tools(tools, tool_choice="SummarizeTool"),
+                [
+                    build_system_message(state, "analyze", model),
+                    *history,
+                ],
+                config,
+            ),
+            validate_summary,
         )
         analysis = response.tool_calls[0]["args"]
         print(analysis["markdown"])
@@ -87,12 +101,14 @@ async def analyze_request(
         project_name = project_name.replace(" ", "_").lower()
         logger.log(f"Project identified as: {project_name}", section="analysis")
 
-        analysis_file = FileInfo(
-            path="/docs/analysis.md",
-            module="documentation",
-            description="analysis report",
-            content=analysis["markdown"],
-            complete=True,
+        analysis_file = blob_store.offload(
+            FileInfo(
+                path="/docs/analysis.md",
+                module="documentation",
+                description="analysis report",
+                content=analysis["markdown"],
+                complete=True,
+            )
         )
 
         docs_module = CurrentModule(
@@ -105,16 +121,15 @@ async def analyze_request(
             pending_files=[],
         )
         state["generated_files"] = [docs_module.dict()]
-        project_structure = state.get("project_structure", {})
-        await async_create_file_structure(
-            f"./{project_name}/docs/analysis.md",
-            analysis["markdown"],
+        project_structure = state_structure(state)
+        await workspace_writer.write_batch(
+            [(f"./{project_name}/docs/analysis.md", analysis["markdown"])],
             project_structure,
         )
         logger.log("Analysis completed successfully", section="analysis")
         logger.mark_all_done("analysis")
-        await copilotkit_emit_state(
-            config, {**state, "logs": logger._format_logs_for_state()}
+        await emit_state(
+            config, {**state, **logger.cursor_state()}
         )
 
         hitl = {
@@ -126,13 +141,12 @@ async def analyze_request(
             "timestamp": str(datetime.now()),
         }
 
-        next_node = "process_feedback_node"
+        next_node = NextNode.PROCESS_FEEDBACK
         # if state.get("follow_up", "") == "":
-        #     next_node = "planner"
+        #     next_node = NextNode.PLANNER
 
-        return Command(
-            goto="generate_path",
-            update={
+        return route(
+            {
                 **state,
                 "processed_files": state.get("processed_files", 0) + 1,
                 "hitl": hitl,
@@ -155,21 +169,31 @@ async def analyze_request(
             level=LogLevel.ERROR,
             section="analysis",
         )
-        await copilotkit_emit_state(config, {"logs": logger._format_logs_for_state()})
+        await emit_state(config, logger.cursor_state())
         hitl = {
             "name": "error",
             "title": "Analysis Agent",
             "description": f"An Error Occured: \n{str(e)[:500]}",
             "approved": False,
         }
-        return Command(
-            goto="generate_path",
-            update={
+        return route(
+            {
                 "hitl": hitl,
                 "stream": f"Error analyzing request  \n{str(e)[:500]} ",
                 "project_analyzed": False,
                 "error": str(e),
                 "last_action": "Created Analysis",
-                "next_node": "analyze",
+                "next_node": NextNode.ANALYZE_REQUEST,
             },
         )
+
+
+def validate_summary(response):
+    """Return the SummarizeTool arguments of a response if they hold a summary."""
+    if not getattr(response, "tool_calls", None):
+        return None
+    args = response.tool_calls[0].get("args") or {}
+    markdown = args.get("markdown")
+    if not isinstance(markdown, str) or not markdown.strip():
+        return None
+    return args
@@ -1,31 +1,52 @@
-import os
-from sub_graphs.configs.constants import (
-    create_file_structure as async_create_file_structure,
-)
+import json
+import asyncio
 from sub_graphs.swe.project_data_state import (
     CurrentModule,
-    FileInfo,
     FileState,
+    NextNode,
 )
 
-import re
-from typing import Literal
-from utils.logger import BRDLogger, LogLevel
+from utils.logger import LogLevel
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig
-from copilotkit.langchain import copilotkit_emit_state
 from langgraph.types import Command
-from sub_graphs.swe.config import llm_mini, call_ai
+from sub_graphs.swe.nodes.generate_path_module import Route, route
+from sub_graphs.swe.config import (
+    call_ai,
+    call_with_cascade,
+    cascade_models,
+    get_model,
+    stream_ai,
+    blob_store,
+    emit_state,
+    logger,
+    workspace_writer,
+    MODULE_CONCURRENCY,
+    PER_FILE_GENERATION,
+    FILE_CONCURRENCY,
+)
+from sub_graphs.swe.nodes.create_module import (
+    extract_file_data,
+    module_creation_prompt,
+)
+from sub_graphs.swe.tools.blob_store import content_hash
+from sub_graphs.swe.tools.llm_cache import model_id
+from sub_graphs.swe.tools.module_scheduler import run_in_waves
+from sub_graphs.swe.tools.workspace_writer import state_structure
+from sub_graphs.swe.prompts.swe_prompts import static_system_message
+from sub_graphs.swe.tools.markdown_stream import (
+    StreamingFileExtractor,
+    extract_files,
+    make_file_info,
+    message_text,
+    parse_code_blocks,
+)
 
 # from langchain_deepseek import ChatDeepSeek
 
 
-logger = BRDLogger()
 # Code module node to generate actual implementation
-code_generation_prompt = ChatPromptTemplate.from_messages(
-    [
-        "system",
-        """
+code_generation_instructions = """
         You are an expert software developer creating high-quality implementation code. 
         Create complete, production-ready code for the specified module. 
         
@@ -55,11 +76,11 @@ import store from './store';
 
 Vue.config.productionTip = false;
 
-new Vue({{
+new Vue({
   router,
   store,
   render: h => h(App)
-}}).$mount('#app');
+}).$mount('#app');
 
 ``` 
 
@@ -67,114 +88,139 @@ new Vue({{
 ```json 
 
 // /package.json
-{{
+{
   "name": "frontend",
   "version": "0.1.0",
   "private": true,
-  "scripts": {{
+  "scripts": {
     "serve": "vue-cli-service serve",
     "build": "vue-cli-service build",
     "lint": "vue-cli-service lint"
-  }},
-  "dependencies": {{
+  },
+  "dependencies": {
     "core-js": "^3.6.5",
     "vue": "^2.6.11",
     "vue-router": "^3.2.0",
     "vuex": "^3.4.0"
-  }},
-  "devDependencies": {{
+  },
+  "devDependencies": {
     "@vue/cli-plugin-babel": "~4.5.0",
     "@vue/cli-plugin-eslint": "~4.5.0",
     "@vue/cli-service": "~4.5.0",
     "babel-eslint": "^10.1.0"
-  }}
-}}
+  }
+}
 
 ```
 
 </Example_Response> 
-    """,
-        "system",
-        """
+    """
+
+
+# The instructions are sent verbatim as the first message so the provider can
+# cache them, the per-module variables come last. Prompts are built for the
+# model they are sent to since the cache marker is provider specific.
+def build_code_generation_prompt(model) -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages(
+        [
+            static_system_message(code_generation_instructions, model),
+            (
+                "human",
+                """
         Module Specification: {module_spec}
         Technologies: {technologies}
         If there are any missing files, please identify and include them.
         Generate complete, production-ready code for each file specified as part of the module, 
         ensuring best practices and proper documentation are followed.""",
-    ]
+            ),
+        ]
+    )
+
+
+# Prompt used to generate one file of a module at a time, every file of the
+# module gets the same module context
+def build_file_generation_prompt(model) -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages(
+        [
+            static_system_message(code_generation_instructions, model),
+            (
+                "system",
+                """
+        Module Specification: {module_spec}
+        Technologies: {technologies}
+        Files of this module:
+        {file_list}""",
+            ),
+            (
+                "human",
+                """
+        Generate complete, production-ready code for this file only: {file_path}
+        Key Functions: {file_description}
+        Use the same output format as the example with a single file entry.""",
+            ),
+        ]
+    )
+
+
+# Provider independent variants, the prompts are built per model when called
+code_generation_prompt = build_code_generation_prompt(None)
+file_generation_prompt = build_file_generation_prompt(None)
+
+
+def prompt_version(*prompts) -> str:
+    """Hash of prompt templates, changes whenever one of them is edited."""
+    return content_hash("\n".join(prompt.pretty_repr() for prompt in prompts))[:16]
+
+
+CODE_PROMPT_VERSION = prompt_version(
+    code_generation_prompt, file_generation_prompt, module_creation_prompt
 )
-code_generation_chain = code_generation_prompt | llm_mini
 
 
 async def code_module(
     state: FileState, config: RunnableConfig
-) -> Command[Literal["generate_path"]]:
+) -> Command[Route]:
     """
     Generate implementation code for the current module's files.
     This creates actual code files based on the module specification.
     """
 
+    module_batch = state.get("module_batch", [])
+    if module_batch:
+        return await code_module_batch(state, config, module_batch)
+
     current_module = state.get("current_module", {})
     if not current_module:
         print("************ No current module to code")
         logger.log("No current module to code", section="code", level=LogLevel.ERROR)
-        await copilotkit_emit_state(config, {"logs": logger._format_logs_for_state()})
-        Command(
-            goto="generate_path",
-            update={
+        await emit_state(config, logger.cursor_state())
+        return route(
+            {
                 "last_action": "Generated code for current module",
+                "next_node": NextNode.CREATE_MODULE,
             },
         )
 
     try:
-        logger.log(f"Generating code for {current_module['name']}...", section="code")
-        await copilotkit_emit_state(config, {"logs": logger._format_logs_for_state()})
-
-        response = await call_ai(
-            code_generation_chain,
-            {
-                # "project_summary": state.get("project_summary", ""),
-                "technologies": current_module["technologies"],
-                "module_spec": current_module["specification"],
-            },
-            config,
-        )
-        print(current_module["name"], response.content)
-        # Extract code from the response
-        files = extract_code_from_markdown(response.content, current_module["name"])
-        print("FILES", files)
-        # Save the file to the project structure
-        name = state["project_name"].replace(" ", "_").lower()
-        project_structure = state.get("project_structure_json", {})
-        mod = current_module["name"].replace(" ", "_").lower()
-
-        for file in files:
-            file_path = f"./{name}/{mod}/{file.path}"
-            await async_create_file_structure(
-                file_path, file.content, project_structure
-            )
-
-        # Create updated current module
-        updated_module = CurrentModule(
-            name=current_module["name"],
-            description=current_module["description"],
-            specification=current_module["specification"],
-            files=files,
-            sections=[s["name"].replace(" ", "_") for s in current_module["sections"]],
-            completed_files=files,
-            pending_files=[],
-        )
+        updated_module = await generate_module_code(state, config, current_module)
 
         generated_files = state.get("generated_files", []) + [updated_module.dict()]
+        # Modules without files are generated again on the next run
+        module_outputs = (
+            {updated_module.name: updated_module.dict()}
+            if updated_module.files
+            else {}
+        )
 
-        next_node = "create_module"
+        next_node = NextNode.CREATE_MODULE
         logger.mark_all_done("code")
-        await copilotkit_emit_state(config, {"logs": logger._format_logs_for_state()})
-        return Command(
-            goto="generate_path",
-            update={
+        await emit_state(config, logger.cursor_state())
+        return route(
+            {
                 "generated_files": generated_files,
                 "processed_files": state.get("processed_files", 0) + 1,
+                "project_structure_json": state_structure(state),
+                "module_outputs": module_outputs,
                 "last_action": f"Generated code for {current_module['name']}",
                 "next_node": next_node,
                 "current_module": {},
@@ -187,7 +233,7 @@ async def code_module(
             level=LogLevel.ERROR,
             section="code",
         )
-        await copilotkit_emit_state(config, {"logs": logger._format_logs_for_state()})
+        await emit_state(config, logger.cursor_state())
         hitl = {
             "name": "error",
             "title": "Coding Agent",
@@ -198,83 +244,382 @@ async def code_module(
             goto="process_feedback_node",
             update={
                 "hitl": hitl,
-                "pending_sections": state.get("pending_sections", []).append(
-                    current_module
-                ),
                 "completed_sections": [],
                 "error": str(e),
                 "last_action": f"Generated code for {current_module['name']}",
-                "next_node": "code_module",
+                "next_node": NextNode.CODE_MODULE,
+            },
+        )
+
+
+async def code_module_batch(
+    state: FileState, config: RunnableConfig, module_batch
+) -> Command[Route]:
+    """
+    Generate code for several modules at once.
+    Modules are generated in dependency waves, modules of the same wave run
+    concurrently up to MODULE_CONCURRENCY.
+    """
+    logger.log(
+        f"Generating code for {len(module_batch)} modules...", section="code"
+    )
+    await emit_state(config, logger.cursor_state())
+
+    in_progress = {}
+
+    async def worker(module):
+        return await generate_module_code(state, config, module, in_progress)
+
+    completed, failed, deferred = await run_in_waves(
+        module_batch, worker, MODULE_CONCURRENCY
+    )
+
+    generated_files = state.get("generated_files", []) + [
+        module.dict() for _, module in completed
+    ]
+    update = {
+        "generated_files": generated_files,
+        "processed_files": state.get("processed_files", 0) + len(completed),
+        "project_structure_json": state_structure(state),
+        "module_outputs": {
+            module.name: module.dict() for _, module in completed if module.files
+        },
+        "last_action": f"Generated code for {len(completed)} modules",
+        "module_batch": [],
+        "current_module": {},
+    }
+
+    if not failed:
+        logger.mark_all_done("code")
+        await emit_state(config, logger.cursor_state())
+        return route({**update, "next_node": NextNode.CREATE_MODULE})
+
+    for module, e in failed:
+        print("code_module Error:\n", module["name"], e)
+        logger.log(
+            f"Error generating code for {module['name']}: {str(e)[:50]}",
+            level=LogLevel.ERROR,
+            section="code",
+        )
+    await emit_state(config, logger.cursor_state())
+
+    errors = "\n".join(f"{module['name']}: {str(e)[:200]}" for module, e in failed)
+    hitl = {
+        "name": "error",
+        "title": "Coding Agent",
+        "description": f"An Error Occured in {len(failed)} modules: \n{errors[:500]}",
+        "approved": False,
+    }
+    # Failed modules and the modules waiting on them go back to the queue
+    retry = [module for module, _ in failed] + deferred
+    return Command(
+        goto="process_feedback_node",
+        update={
+            **update,
+            "hitl": hitl,
+            "pending_sections": state.get("pending_sections", []) + retry,
+            "completed_sections": [],
+            "error": errors,
+            "next_node": NextNode.CREATE_MODULE,
+        },
+    )
+
+
+async def generate_module_code(
+    state: FileState, config: RunnableConfig, current_module, in_progress=None
+) -> CurrentModule:
+    """
+    Generate the code of a single module and write its files to the project.
+    """
+    logger.log(f"Generating code for {current_module['name']}...", section="code")
+    await emit_state(config, logger.cursor_state())
+
+    in_progress = {} if in_progress is None else in_progress
+    input_hash = module_input_hash(state, current_module)
+    reused = await reuse_module_code(state, current_module, input_hash)
+    if reused is not None:
+        in_progress[current_module["name"]] = reused
+        return reused
+
+    file_specs = []
+    if PER_FILE_GENERATION:
+        module_spec, file_specs = await plan_module_files(state, config, current_module)
+    if file_specs:
+        files = await generate_files_concurrently(
+            config,
+            current_module,
+            module_spec,
+            file_specs,
+            use_cache=not state.get("retry_after_error"),
+        )
+        await write_module_files(state, current_module, files)
+    else:
+        # Escalated to the strong model when no file could be extracted
+        files, _ = await call_with_cascade(
+            "code",
+            lambda model: stream_module_code(
+                state, config, current_module, in_progress, model
+            ),
+            lambda files: files,
+        )
+    print("FILES", files)
+
+    # Create updated current module
+    return build_current_module(current_module, files, input_hash)
+
+
+def model_key(model) -> str:
+    temperature = getattr(model, "temperature", None)
+    return f"{type(model).__name__}:{model_id(model)}:{temperature}"
+
+
+def module_input_hash(state: FileState, current_module) -> str:
+    """
+    Hash of everything the code of a module is generated from: its plan
+    section, technologies, the prompt templates, the generation mode and the
+    models of the cascade.
+    """
+    nodes = ["module_spec", "code"] if PER_FILE_GENERATION else ["code"]
+    inputs = {
+        "project_name": state.get("project_name", ""),
+        "name": current_module["name"],
+        "description": current_module.get("description", ""),
+        "specification": current_module.get("specification", ""),
+        "sections": current_module.get("sections", []),
+        "technologies": current_module.get("technologies", ""),
+        "prompt_version": CODE_PROMPT_VERSION,
+        "per_file_generation": PER_FILE_GENERATION,
+        "models": [model_key(model) for node in nodes for model in cascade_models(node)],
+    }
+    return content_hash(json.dumps(inputs, sort_keys=True, default=str))
+
+
+async def reuse_module_code(state: FileState, current_module, input_hash):
+    """
+    Return the module generated earlier from the same inputs after writing its
+    files back to the project, or None when it has to be generated.
+    """
+    previous = (state.get("module_outputs") or {}).get(current_module["name"])
+    if (
+        not previous
+        or previous.get("input_hash") != input_hash
+        or not previous.get("files")
+    ):
+        return None
+    module = CurrentModule(**previous)
+    files = []
+    for file in module.files:
+        content = file.content
+        if not content and file.content_hash:
+            content = blob_store.get(file.content_hash)
+            if content is None:
+                # Evicted from the blob store, generate the module again
+                return None
+        files.append(file.copy(update={"content": content or ""}))
+
+    await write_module_files(state, current_module, files)
+    logger.log(
+        f"{current_module['name']} is unchanged, reusing {len(files)} generated files",
+        section="code",
+    )
+    return module
+
+
+def build_current_module(current_module, files, input_hash=None) -> CurrentModule:
+    # File bodies go to the blob store, the module only keeps references
+    files = [blob_store.offload(file) for file in files]
+    return CurrentModule(
+        name=current_module["name"],
+        description=current_module["description"],
+        specification=current_module["specification"],
+        files=files,
+        sections=[s["name"].replace(" ", "_") for s in current_module["sections"]],
+        completed_files=files,
+        pending_files=[],
+        input_hash=input_hash,
+    )
+
+
+def module_file_path(state: FileState, current_module, file) -> str:
+    name = state["project_name"].replace(" ", "_").lower()
+    mod = current_module["name"].replace(" ", "_").lower()
+    return f"./{name}/{mod}/{file.path}"
+
+
+async def write_module_files(state: FileState, current_module, files):
+    """Save a batch of generated files to the project and its structure."""
+    await workspace_writer.write_batch(
+        [
+            (module_file_path(state, current_module, file), file.content)
+            for file in files
+        ],
+        state_structure(state),
+    )
+
+
+async def discard_module_files(state: FileState, current_module, files):
+    """Delete files of a rejected generation from the project and its structure."""
+    await workspace_writer.remove_batch(
+        [module_file_path(state, current_module, file) for file in files],
+        state_structure(state),
+    )
+
+
+async def stream_module_code(
+    state: FileState, config: RunnableConfig, current_module, in_progress, model=None
+):
+    """
+    Stream the module code and handle every file as soon as its code block is
+    closed: it is written to disk and pushed to the UI right away.
+    `in_progress` maps the names of the modules being generated to their
+    partial CurrentModule, it is shared by modules generated concurrently.
+    When the stream fails, the files already written are deleted again so a
+    cascade retry starts from a clean module directory.
+    """
+    model = get_model("llm_mini") if model is None else model
+    chain = build_code_generation_prompt(model) | model
+    extractor = StreamingFileExtractor(current_module["name"])
+
+    async def publish(files):
+        await write_module_files(state, current_module, files)
+        in_progress[current_module["name"]] = build_current_module(
+            current_module, list(extractor.files)
+        )
+        logger.log(
+            f"Generated {len(extractor.files)} files for {current_module['name']}",
+            section="code",
+        )
+        await emit_state(
+            config,
+            {
+                "generated_files": state.get("generated_files", [])
+                + [module.dict() for module in in_progress.values()],
+                **logger.cursor_state(),
             },
         )
 
+    try:
+        async for chunk in stream_ai(
+            chain,
+            {
+                # "project_summary": state.get("project_summary", ""),
+                "technologies": current_module["technologies"],
+                "module_spec": current_module["specification"],
+            },
+            config,
+            # Cached once the whole response has files, as call_with_cascade checks
+            lambda response: extract_code_from_markdown(
+                message_text(response), current_module["name"]
+            ),
+            use_cache=not state.get("retry_after_error"),
+        ):
+            files = extractor.feed(message_text(chunk))
+            if files:
+                await publish(files)
+
+        files = extractor.finish()
+        if files:
+            await publish(files)
+    except Exception:
+        await discard_module_files(state, current_module, extractor.files)
+        in_progress.pop(current_module["name"], None)
+        raise
+    return extractor.files
+
+
+async def plan_module_files(state: FileState, config: RunnableConfig, current_module):
+    """
+    Return the module specification and its file list.
+    Plan sections do not list files, in that case a detailed module
+    specification is created first.
+    """
+    module_spec = current_module["specification"]
+    file_specs = extract_file_data(module_spec)
+    if not file_specs:
+
+        def validate(response):
+            return extract_file_data(response.content)
+
+        response, file_specs = await call_with_cascade(
+            "module_spec",
+            lambda model: call_ai(
+                module_creation_prompt | model,
+                {
+                    "project_name": state.get("project_name", ""),
+                    "module_name": current_module["name"],
+                    "module_description": module_spec,
+                },
+                config,
+                validate,
+                use_cache=not state.get("retry_after_error"),
+            ),
+            validate,
+        )
+        module_spec = response.content
+    return module_spec, file_specs
+
+
+async def generate_files_concurrently(
+    config: RunnableConfig, current_module, module_spec, file_specs, use_cache=True
+):
+    """
+    Generate every file of a module in its own LLM call.
+    Calls run concurrently up to FILE_CONCURRENCY and share the module context,
+    the files are returned in the order of the specification.
+    `use_cache=False` skips cached responses (retry after an error).
+    """
+    semaphore = asyncio.Semaphore(max(1, FILE_CONCURRENCY))
+    file_list = "\n".join(f"- {spec['path']}" for spec in file_specs)
+
+    def validate(response):
+        # A file heading or at least a code block
+        return parse_code_blocks(response.content)
+
+    async def generate_file(spec):
+        async with semaphore:
+            response, _ = await call_with_cascade(
+                "code",
+                lambda model: call_ai(
+                    build_file_generation_prompt(model) | model,
+                    {
+                        "technologies": current_module["technologies"],
+                        "module_spec": module_spec,
+                        "file_list": file_list,
+                        "file_path": spec["path"],
+                        "file_description": spec["description"],
+                    },
+                    config,
+                    validate,
+                    use_cache=use_cache,
+                ),
+                validate,
+            )
+        files = extract_code_from_markdown(response.content, current_module["name"])
+        if files:
+            return files[0]
+        # The model skipped the heading, keep the first code block as the file
+        blocks = parse_code_blocks(response.content)
+        return make_file_info(
+            spec["path"] if spec["path"].startswith("/") else f"/{spec['path']}",
+            blocks[0].code if blocks else response.content,
+            current_module["name"],
+        )
+
+    return list(await asyncio.gather(*(generate_file(spec) for spec in file_specs)))
+
 
 # Helper function to extract code content from AI response
 def extract_code_from_markdown(content, current_module):
     """
-    Extract code blocks from a markdown file and format as a list of FileInfo objects.
-    Specifically handles file paths in the format: ### 2. **/frontend/README.md**
+    Extract the code blocks named by a file heading and format them as a list
+    of FileInfo objects. Headings like ### 2. **/frontend/README.md**,
+    ## File: `src/app.py` or **/src/app.py** are recognized, see FenceParser.
 
     Args:
-        markdown_file_path: Path to the markdown file
+        content: Markdown response of the model
         current_module: Current module name to prefix paths
 
     Returns:
         List of FileInfo objects
     """
-    try:
-        # Pattern to match numbered file paths and code blocks
-        # Specifically targets: ### 2. **/frontend/README.md** format
-        pattern = r"###\s*\d+\.\s*\*\*(.*?)\*\*\n```.*?\n(.*?)```"
-        matches = re.findall(pattern, content, re.DOTALL)
-
-        results = []
-        for match in matches:
-            file_path = match[0].strip()
-            code_content = match[1]
-
-            # Make sure we get the actual path by removing any extra characters
-            # Path will be like /frontend/README.md
-            if file_path.startswith("/"):
-                clean_path = file_path
-            else:
-                # In case there are extra characters before the path
-                path_match = re.search(r"(/[\w/.-]+)", file_path)
-                if path_match:
-                    clean_path = path_match.group(1)
-                else:
-                    # Fallback if no path format is found
-                    clean_path = file_path
-
-            # Ensure the path isn't too long
-            if len(clean_path) > 100:
-                # Extract just the filename
-                filename = os.path.basename(clean_path)
-                directory = os.path.dirname(clean_path)
-
-                # If the directory path is too long, shorten it
-                if len(directory) > 50:
-                    shortened_dir = directory[:20] + "..." + directory[-20:]
-                    clean_path = os.path.join(shortened_dir, filename)
-
-            # Create the module-prefixed path but ensure it's not too long
-            module_path = f"{clean_path}"
-            if len(module_path) > 200:
-                # Keep the important parts - beginning of path and filename
-                module_path = f"/{os.path.basename(clean_path)}"
-
-            results.append(
-                FileInfo(
-                    path=module_path,
-                    module=current_module,
-                    description=f"{current_module} - {os.path.basename(clean_path)}",
-                    content=code_content,
-                    complete=True,
-                )
-            )
-
-        return results
-
-    except Exception as e:
-        print(f"Error processing markdown file: {e}")
-        return []
+    return extract_files(content, current_module)
@@ -0,0 +1,197 @@
+# Compact history node to summarize old messages into history_summary
+from sub_graphs.swe.project_data_state import FileState
+
+from utils.logger import LogLevel
+from langchain_core.messages import RemoveMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
+from langgraph.types import Command
+from sub_graphs.swe.nodes.generate_path_module import Route, route
+from sub_graphs.swe.config import (
+    call_ai,
+    call_with_cascade,
+    emit_state,
+    logger,
+    COMPACT_THRESHOLD,
+    COMPACT_KEEP_MESSAGES,
+)
+from sub_graphs.swe.tools.context_assembler import (
+    count_tokens,
+    history_tokens,
+    truncate_tokens,
+)
+from sub_graphs.swe.tools.markdown_stream import message_text
+
+# Input of a single summarization call, longer histories are summarized in
+# chunks of this size
+COMPACT_INPUT_TOKENS = 60000
+
+
+compact_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """
+            You maintain the running summary of a conversation between a user and a project generation assistant.
+            Merge the previous summary and the new messages into one concise summary. Keep:
+            - the project goals, requirements and constraints stated by the user and how they changed
+            - every review decision: approvals, rejections, selected modules and remarks
+            - the outcome of tool calls and generation steps (documents, plans, modules created)
+            - open questions and pending requests
+            Drop greetings, repetitions and content already captured in the previous summary.
+            """,
+        ),
+        (
+            "human",
+            """
+            Previous Summary:
+            {summary}
+
+            New Messages:
+            {messages}
+            """,
+        ),
+    ]
+)
+
+
+def needs_compaction(state: FileState) -> bool:
+    """
+    True when the message history is over the compaction threshold and has
+    older conversational turns to compact.
+    """
+    messages = state.get("messages", [])
+    return (
+        COMPACT_THRESHOLD > 0
+        and len(messages) > COMPACT_KEEP_MESSAGES
+        and history_tokens(messages) > COMPACT_THRESHOLD
+        and bool(split_history(messages, COMPACT_KEEP_MESSAGES)[0])
+    )
+
+
+def is_protected(message) -> bool:
+    """
+    Tool calls, tool results and system messages (the HITL feedback added by
+    process_feedback_node) are never compacted, they are kept verbatim.
+    """
+    return bool(getattr(message, "tool_calls", None)) or message.type in (
+        "tool",
+        "system",
+    )
+
+
+def split_history(messages, keep: int):
+    """
+    Split the history in (old, kept): old holds the conversational turns
+    before the `keep` latest messages, kept the latest messages and every
+    protected message (see is_protected).
+    """
+    cut = max(0, len(messages) - keep)
+    old = [message for message in messages[:cut] if not is_protected(message)]
+    kept = [message for message in messages[:cut] if is_protected(message)]
+    return old, kept + list(messages[cut:])
+
+
+def format_messages(messages) -> str:
+    lines = []
+    for message in messages:
+        text = message_text(message).strip()
+        for call in getattr(message, "tool_calls", None) or []:
+            text += f"\n[tool call {call['name']}: {str(call.get('args', ''))[:2000]}]"
+        if text:
+            lines.append(f"{message.type}: {text}")
+    return "\n\n".join(lines)
+
+
+def chunk_messages(messages, tokens: int):
+    """
+    Split messages in consecutive chunks of at most `tokens` formatted tokens.
+    A message longer than that is a chunk of its own, truncated when sent.
+    """
+    chunks, chunk, size = [], [], 0
+    for message in messages:
+        message_size = count_tokens(format_messages([message])) + 2
+        if chunk and size + message_size > tokens:
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(message)
+        size += message_size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+async def compact_history(state: FileState, config: RunnableConfig) -> Command[Route]:
+    """
+    Summarize the older conversational turns into history_summary and remove
+    them from the state, so checkpoints and prompts stop growing with the
+    session length. Tool calls and HITL decisions are kept intact. Runs
+    before the requested node, which it hands over to.
+    """
+    old, kept = split_history(state.get("messages", []), COMPACT_KEEP_MESSAGES)
+    update = {"next_node": state.get("next_node")}
+    if not old:
+        return route(update)
+
+    logger.log(f"Compacting {len(old)} messages...", section="compact")
+    await emit_state(config, logger.cursor_state())
+
+    def validate(response):
+        return response.content.strip()
+
+    # Chunks are folded into the summary one after the other, only the
+    # messages of the chunks summarized are removed
+    summary = state.get("history_summary") or ""
+    summarized = []
+    for chunk in chunk_messages(old, COMPACT_INPUT_TOKENS):
+        try:
+            _, chunk_summary = await call_with_cascade(
+                "compact",
+                lambda model: call_ai(
+                    compact_prompt | model,
+                    {
+                        "summary": summary or "None",
+                        "messages": truncate_tokens(
+                            format_messages(chunk), COMPACT_INPUT_TOKENS
+                        ),
+                    },
+                    config,
+                    validate,
+                    use_cache=not state.get("retry_after_error"),
+                ),
+                validate,
+            )
+        except Exception as e:
+            # The rest of the history is kept, compacted again on the next run
+            print("compact_history:\n", e)
+            logger.log(
+                f"Error compacting the history: {str(e)[:50]}",
+                level=LogLevel.WARNING,
+                section="compact",
+            )
+            await emit_state(config, logger.cursor_state())
+            break
+        if not chunk_summary:
+            break
+        summary = chunk_summary
+        summarized.extend(chunk)
+
+    if not summarized:
+        return route(update)
+
+    logger.log(
+        f"Compacted {len(summarized)} messages, "
+        f"{len(old) - len(summarized) + len(kept)} kept",
+        section="compact",
+    )
+    logger.mark_all_done("compact")
+    await emit_state(config, logger.cursor_state())
+    return route(
+        {
+            **update,
+            "history_summary": summary,
+            "messages": [
+                RemoveMessage(id=message.id) for message in summarized if message.id
+            ],
+        }
+    )
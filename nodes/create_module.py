@@ -5,28 +5,36 @@ from sub_graphs.swe.project_data_state import (
     CurrentModule,
     FileInfo,
     FileState,
+    NextNode,
 )
 
 import re
-from typing import Literal
-from utils.logger import BRDLogger, LogLevel
+from utils.logger import LogLevel
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig
-from copilotkit.langchain import copilotkit_emit_state
-from config import Config
 from langgraph.types import Command
+from sub_graphs.swe.nodes.generate_path_module import Route, route
 from datetime import datetime
-from sub_graphs.swe.config import llm_mini, call_ai
+from sub_graphs.swe.config import (
+    call_ai,
+    emit_state,
+    logger,
+    MODULE_CONCURRENCY,
+)
+from sub_graphs.swe.tools.module_scheduler import (
+    DuplicateModuleError,
+    topological_waves,
+)
 # from langchain_deepseek import ChatDeepSeek
 
 
-logger = BRDLogger()
 
 
 module_creation_prompt = ChatPromptTemplate.from_messages(
     [
-        "system",
-        """
+        (
+            "system",
+            """
 You are an expert software architect creating detailed module specifications. For each module, provide the following:
 1. A clear and concise description of the module's purpose and functionality.
 2. A list all the files needed for the module, specifying the full path and  detailed Key Functions of the file. 
@@ -61,20 +69,22 @@ __content_here__
 This module specification ...
    </Example_Response>
     """,
-        "human",
-        """Project Name: {project_name}\n
+        ),
+        (
+            "human",
+            """Project Name: {project_name}\n
      
         Module to Create: {module_name}\n
         Module Plan: {module_description}\n\n
         Create a comprehensive module specification for this module""",
+        ),
     ]
 )
-module_creation_chain = module_creation_prompt | llm_mini
 
 
 async def create_module(
     state: FileState, config: RunnableConfig
-) -> Command[Literal["generate_path"]]:
+) -> Command[Route]:
     """
     Create detailed specifications for the current module to be implemented.
     This prepares all details needed for code generation.
@@ -84,19 +94,55 @@ async def create_module(
     pending = state.get("pending_sections", [])
     if not pending:
         logger.log("No more modules to create", section="module")
-        await copilotkit_emit_state(config, {"logs": logger._format_logs_for_state()})
+        await emit_state(config, logger.cursor_state())
         hitl = {
             "name": "success",
             "title": "Coding Agent",
             "description": "Code generation completed succesfully",
             "approved": False,
         }
-        return Command(
-            goto="generate_path",
-            update={
+        return route(
+            {
                 "all_files_processed": True,
                 "last_action": "All modules created",
-                "next_node": "clear_state",
+                "next_node": NextNode.CLEAR_STATE,
+            },
+        )
+
+    waves = None
+    if MODULE_CONCURRENCY > 1 and len(pending) > 1:
+        try:
+            waves = topological_waves(pending)
+        except DuplicateModuleError as e:
+            # A batch is keyed by module name, these are created one at a time
+            logger.log(
+                f"{e}, creating the modules one at a time",
+                level=LogLevel.WARNING,
+                section="module",
+            )
+            await emit_state(config, logger.cursor_state())
+
+    if waves is not None:
+        # Hand every pending module to code_module at once, it generates
+        # independent modules concurrently in dependency order
+        hitl = {
+            "name": "create_module",
+            "title": f"{len(pending)} modules",
+            "description": "",
+            "modules": pending,
+            "waves": [[m["name"] for m in wave] for wave in waves],
+            "remarks": "",
+            "approved": False,
+            "timestamp": str(datetime.now()),
+        }
+        return route(
+            {
+                "hitl": hitl,
+                "current_module": {},
+                "module_batch": pending,
+                "pending_sections": [],
+                "next_node": NextNode.PROCESS_FEEDBACK,
+                "last_action": f"Scheduled {len(pending)} modules in {len(waves)} waves",
             },
         )
 
@@ -116,13 +162,12 @@ async def create_module(
         "timestamp": str(datetime.now()),
     }
 
-    return Command(
-        goto="generate_path",
-        update={
+    return route(
+        {
             "hitl": hitl,
             "current_module": current_module,
             "pending_sections": remaining_modules,
-            "next_node": "process_feedback_node",
+            "next_node": NextNode.PROCESS_FEEDBACK,
             "last_action": f"Created module specification for {current_module['name']}",
         },
     )
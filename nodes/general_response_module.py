@@ -1,21 +1,25 @@
 # Generate response to general queries node
 from sub_graphs.swe.project_data_state import (
     FileState,
+    NextNode,
 )
 
-from typing import Literal
-from utils.logger import BRDLogger, LogLevel
-from langchain_core.prompts import ChatPromptTemplate
+from utils.logger import LogLevel
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables import RunnableConfig
-from copilotkit.langchain import copilotkit_emit_state
-from config import Config
-import json
 from langgraph.types import Command
-from sub_graphs.swe.config import llm_mini, call_ai
+from sub_graphs.swe.nodes.generate_path_module import Route, route
+from sub_graphs.swe.config import (
+    call_ai,
+    call_with_cascade,
+    context_assembler,
+    emit_state,
+    logger,
+    tracer,
+)
 # from langchain_deepseek import ChatDeepSeek
 
 
-logger = BRDLogger()
 
 
 generate_response_prompt = ChatPromptTemplate.from_messages(
@@ -27,26 +31,29 @@ generate_response_prompt = ChatPromptTemplate.from_messages(
             """,
         ),
         (
-            "human",
+            "system",
             """
-    Project Context: {query}       
-    Previous Messages: {messages}""",
+    Project Context:
+    {project_context}
+
+    Earlier Conversation:
+    {summary}""",
         ),
+        MessagesPlaceholder("messages"),
     ]
 )
-generate_response_chain = generate_response_prompt | llm_mini
 
 
 async def generate_respond_to_query(
     state: FileState, config: RunnableConfig
-) -> Command[Literal["generate_path"]]:
+) -> Command[Route]:
     """
     Generate general responses to queries that don't require specific project actions.
     """
     logger.log("Generating response to query...", section="response")
-    await copilotkit_emit_state(config, {"logs": logger._format_logs_for_state()})
+    await emit_state(config, logger.cursor_state())
 
-    messages = state.get("messages", "")
+    messages = state.get("messages", [])
     project_context = {
         "project_name": state.get("project_name", ""),
         "project_summary": state.get("project_summary", ""),
@@ -56,21 +63,41 @@ async def generate_respond_to_query(
     }
 
     try:
-        formatted_query = f"Messages: {messages}\n\nProject Context: {json.dumps(project_context, indent=2)}"
-        response = await call_ai(
-            generate_response_chain,
-            {"messages": messages, "query": formatted_query},
-            config,
+        # The history is sent once, within the token budget of the node
+        context = context_assembler("response").assemble(
+            messages, project_context, [state.get("history_summary", "")]
+        )
+        tracer.annotate(
+            context_tokens=context.tokens,
+            context_dropped_messages=context.dropped_messages,
+        )
+
+        def validate(response):
+            return response.content.strip()
+
+        response, _ = await call_with_cascade(
+            "response",
+            lambda model: call_ai(
+                generate_response_prompt | model,
+                {
+                    "messages": context.messages,
+                    "project_context": context.project_context or "None",
+                    "summary": context.summary or "None",
+                },
+                config,
+                validate,
+                use_cache=not state.get("retry_after_error"),
+            ),
+            validate,
         )
 
         logger.log("Response generated successfully", section="response")
-        await copilotkit_emit_state(config, {"logs": logger._format_logs_for_state()})
+        await emit_state(config, logger.cursor_state())
 
-        return Command(
-            goto="generate_path",
-            update={
+        return route(
+            {
                 "last_action": f"general query",
-                "next_node": "clear_state",
+                "next_node": NextNode.CLEAR_STATE,
                 "messages": state.get("messages", []) + [response],
                 "response": response.content,
             },
@@ -82,19 +109,18 @@ async def generate_respond_to_query(
             level=LogLevel.ERROR,
             section="response",
         )
-        await copilotkit_emit_state(config, {"logs": logger._format_logs_for_state()})
+        await emit_state(config, logger.cursor_state())
         hitl = {
             "name": "error",
             "title": "General Queries Agent",
             "description": f"An Error Occured: \n{str(e)[:500]}",
             "approved": False,
         }
-        return Command(
-            goto="generate_path",
-            update={
+        return route(
+            {
                 "hitl": hitl,
                 "last_action": "general query",
-                "next_node": "process_feedback_node",
+                "next_node": NextNode.PROCESS_FEEDBACK,
                 "response": f"I encountered an error while processing your request. {str(e)}",
             },
         )
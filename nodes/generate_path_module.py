@@ -1,16 +1,28 @@
 # Generate path node to direct workflow based on input
 from sub_graphs.swe.project_data_state import (
     FileState,
+    NextNode,
 )
+from sub_graphs.swe.config import ROUTING_MODE
 
-from typing import Literal
-from utils.logger import BRDLogger
+from typing import Literal, Optional
 from langchain_core.runnables import RunnableConfig
 from langgraph.types import Command
 # from langchain_deepseek import ChatDeepSeek
 
 
-logger = BRDLogger()
+# Nodes a step can go to, used for the Command annotations of the nodes
+Route = Literal[
+    "generate_path",
+    "analyze_request",
+    "planner",
+    "generate_respond_to_query",
+    "create_module",
+    "code_module",
+    "reflect",
+    "clear_state",
+    "process_feedback_node",
+]
 
 
 # Map keywords to nodes
@@ -25,6 +37,41 @@ path_mapping = {
     "clear_state": "clear_state",
 }
 
+NODE_NAMES = {node.value for node in NextNode}
+
+
+def resolve_next_node(next_node: Optional[str]) -> str:
+    """
+    Return the node for a `next_node` value: exact node names are used as is,
+    other values (e.g. user input) fall back to the keyword scan of path_mapping.
+    """
+    next_node = getattr(next_node, "value", next_node) or ""
+    if next_node in NODE_NAMES:
+        return next_node
+
+    for keyword, node in path_mapping.items():
+        if keyword.lower() in next_node.lower():
+            return node
+    # Default to generate_respond_to_query if no specific path is determined
+    return NextNode.GENERATE_RESPONSE.value
+
+
+def route(update: dict) -> Command:
+    """
+    Command applying `update` and handing over to its next_node, directly or
+    through the generate_path hub depending on ROUTING_MODE.
+    """
+    if "next_node" in update:
+        update = {**update, "next_node": resolve_next_node(update["next_node"])}
+    if ROUTING_MODE == "hub" or "next_node" not in update:
+        return Command(goto="generate_path", update=update)
+    return Command(goto=update.get("next_node"), update=update)
+
+
+def route_from_state(state: FileState) -> str:
+    """Entry routing for the direct mode."""
+    return resolve_next_node(state.get("next_node"))
+
 
 async def generate_path(
     state: FileState, config: RunnableConfig
@@ -41,20 +88,8 @@ async def generate_path(
     ]
 ]:
     # Logic to determine which node to go to based on state information
-    user_input = state.get("next_node", "")
-    # print("state generate_respond_to_query:/n", state)
-    # Default to analyze_request if no specific path is determined
-    next_node = "generate_respond_to_query"
-
-    for keyword, node in path_mapping.items():
-        if keyword.lower() in user_input.lower():
-            next_node = node
-            break
+    next_node = resolve_next_node(state.get("next_node"))
     print(f"Navigating to {next_node}")
 
-    return Command(
-        # state update
-        update=state,
-        # control flow
-        goto=next_node,
-    )
+    # Pure control flow, the state was already written by the previous node
+    return Command(goto=next_node)
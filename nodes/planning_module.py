@@ -1,77 +1,114 @@
 # Planner node to create comprehensive project plans
-from sub_graphs.configs.constants import (
-    create_file_structure as async_create_file_structure,
-)
 from sub_graphs.swe.project_data_state import (
     FileInfo,
     FileState,
+    NextNode,
 )
 
 import re
-from typing import Literal
 from utils.logger import LogLevel
 from langchain_core.runnables import RunnableConfig
-from copilotkit.langchain import copilotkit_emit_state, copilotkit_customize_config
 from langgraph.types import Command
+from sub_graphs.swe.nodes.generate_path_module import Route, route
 from datetime import datetime
-from sub_graphs.swe.config import llm_mini, logger
-from sub_graphs.swe.tools.core_tools import SummarizeTool
-from sub_graphs.swe.prompts.swe_prompts import build_system_prompt
-from langchain_core.messages import SystemMessage, HumanMessage
+from sub_graphs.swe.config import (
+    logger,
+    ainvoke_with_limits,
+    call_with_cascade,
+    context_assembler,
+    blob_store,
+    emit_state,
+    workspace_writer,
+)
+from sub_graphs.swe.tools.core_tools import ProjectPlanInput, ProjectPlanTool
+from sub_graphs.swe.tools.workspace_writer import state_structure
+from sub_graphs.swe.prompts.swe_prompts import build_system_message
+from langchain_core.messages import HumanMessage
+from pydantic import ValidationError
 
 
 human_message = HumanMessage(
     content="Create a comprehensive project plan that covers all necessary components and provides clearimplementation instructions for each module"
 )
-model = llm_mini
-tools = [SummarizeTool]
+tools = [ProjectPlanTool]
 
 
 async def planner(
     state: FileState, config: RunnableConfig
-) -> Command[Literal["generate_path"]]:
+) -> Command[Route]:
     """
     Create a comprehensive project plan covering all aspects of the project.
     Determines what modules and components need to be built and in what order.
     """
     logger.log("Creating project plan...", section="planner")
-    await copilotkit_emit_state(config, {"logs": logger._format_logs_for_state()})
-    project_structure = state.get("project_structure_json", {})
+    await emit_state(config, logger.cursor_state())
+    project_structure = state_structure(state)
+
+    from copilotkit.langchain import copilotkit_customize_config
 
     config = copilotkit_customize_config(
         config,
         emit_intermediate_state=[
             {
                 "state_key": "stream",
-                "tool": "SummarizeTool",
+                "tool": "ProjectPlanTool",
             }
         ],
     )
 
     try:
-        response = await model.bind_tools(tools, tool_choice="SummarizeTool").ainvoke(
-            [
-                SystemMessage(content=build_system_prompt(state, "planner")),
-                human_message,
-                *state["messages"],
-            ],
-            config,
+        history = (
+            context_assembler("planner")
+            .assemble(state["messages"], summaries=[state.get("history_summary", "")])
+            .history()
         )
-        raw = response.tool_calls[0]["args"]
-        raw_plan = raw["markdown"]
-        # print("Plan:\n", raw["markdown"])
+        # The plan is returned as a ProjectPlanTool call, the markdown is
+        # rendered from it locally
+        response, parsed = await call_with_cascade(
+            "planner",
+            lambda model: ainvoke_with_limits(
+                model.bind_tools(tools, tool_choice="ProjectPlanTool"),
+                [
+                    build_system_message(state, "planner", model),
+                    human_message,
+                    *history,
+                ],
+                config,
+            ),
+            parse_plan,
+        )
+        raw_plan, modules = parsed or ("", [])
+        print("\n\n\nmodules:\n", modules)
+        if not modules:
+            hitl = {
+                "name": "error",
+                "title": "Planning Agent",
+                "description": "No modules extracted try again",
+                "approved": False,
+                "timestamp": str(datetime.now()),
+            }
+            return Command(
+                goto="process_feedback_node",
+                update={
+                    "hitl": hitl,
+                    "last_action": "Created project plan",
+                    "next_node": NextNode.PLANNER,
+                },
+            )
 
         name = state.get("project_name", "untitled_project")
-        await async_create_file_structure(
-            f"./{name}/docs/project_plan.md", raw_plan, project_structure
+        await workspace_writer.write_batch(
+            [(f"./{name}/docs/project_plan.md", raw_plan)], project_structure
         )
 
-        specs_file = FileInfo(
-            path="/docs/project_plan.md",
-            module="documentation",
-            description="project plan",
-            content=raw_plan,
-            complete=True,
+        specs_file = blob_store.offload(
+            FileInfo(
+                path="/docs/project_plan.md",
+                module="documentation",
+                description="project plan",
+                content=raw_plan,
+                complete=True,
+            )
         )
 
         doc_module = next(
@@ -88,31 +125,10 @@ async def planner(
 
         logger.log("System Design completed successfully", section="planner")
         logger.mark_all_done("planner")
-        await copilotkit_emit_state(
-            config, {**state, "logs": logger._format_logs_for_state()}
+        await emit_state(
+            config, {**state, **logger.cursor_state()}
         )
 
-        # Process the raw plan into structured modules and sections
-        # print("raw_plan:\n", raw_plan)
-        modules = extract_data_from_md(raw_plan)
-        print("\n\n\nmodules:\n", modules)
-        if not modules:
-            hitl = {
-                "name": "error",
-                "title": "Planning Agent",
-                "description": "No modules extracted try again",
-                "approved": False,
-                "timestamp": str(datetime.now()),
-            }
-            return Command(
-                goto="process_feedback_node",
-                update={
-                    "hitl": hitl,
-                    "last_action": "Created project plan",
-                    "next_node": "planner",
-                },
-            )
-
         hitl = {
             "name": "planner",
             "title": "Planning Agent",
@@ -123,17 +139,17 @@ async def planner(
             "approved": False,
             "timestamp": str(datetime.now()),
         }
-        next_node = "process_feedback_node"
+        next_node = NextNode.PROCESS_FEEDBACK
 
-        return Command(
-            goto="generate_path",
-            update={
+        return route(
+            {
                 "hitl": hitl,
                 "formatted_plan": raw_plan,
                 "base_plan": modules,
-                "stream": response.tool_calls[0]["args"],
+                "stream": {"markdown": raw_plan},
                 "pending_sections": modules,
                 "completed_sections": [],
+                "project_structure_json": project_structure,
                 "last_action": "Created project plan",
                 "next_node": next_node,
             },
@@ -145,7 +161,7 @@ async def planner(
             level=LogLevel.ERROR,
             section="planner",
         )
-        await copilotkit_emit_state(config, {"logs": logger._format_logs_for_state()})
+        await emit_state(config, logger.cursor_state())
 
         hitl = {
             "name": "error",
@@ -161,123 +177,124 @@ async def planner(
                 "pending_sections": [],
                 "error": str(e),
                 "last_action": "Created a planner",
-                "next_node": "planner",
+                "next_node": NextNode.PLANNER,
             },
         )
 
 
-import re
-
-
-def extract_data_from_md(file_content):
+def parse_plan(response):
     """
-    Extract structured module data from markdown content.
-    Returns a list of modules with their details.
+    Return the (markdown, modules) of a planner response, or None when it has
+    no valid ProjectPlanTool call or no modules.
     """
-    # Split content into module sections
-    sections = _split_into_sections(file_content)
-
-    # Process each section to extract module data
-    result = []
-    for section in sections:
-        module_data = _process_module_section(section)
-        if module_data:
-            result.append(module_data)
-
-    return result
-
-
-def _split_into_sections(file_content):
-    """Split the markdown content into module sections by '---' delimiter."""
-    sections = file_content.split("---")
-    # Remove first and last items if they're not module sections
-    if len(sections) > 3:
-        return sections[1:-2]
-    return sections
-
-
-def _process_module_section(section):
-    """Process a single module section to extract all relevant data."""
-    # Extract module header
-    module_match = re.search(r"## (\d+\.\s+.+)", section)
-    if not module_match:
+    if not getattr(response, "tool_calls", None):
         return None
-
-    module_name = module_match.group(1).strip()
-
-    # Extract module description
-    description = _extract_description(section)
-
-    # Extract module Technologies
-    technologies = _extract_technologies(section)
-
-    # Extract all sections within the module
-    sections_data = _extract_sections(section)
-
-    return {
-        "name": module_name,
-        "description": description,
-        "technologies": technologies,
-        "sections": sections_data,
-        "specification": section,
-        "approved": False,
-    }
-
-
-def _extract_description(section):
-    """Extract the module description from the section."""
-    desc_match = re.search(
-        r"- \*\*Description\*\*:\s*(.*?)(?=###|\Z)", section, re.DOTALL
-    )
-
-    if not desc_match:
-        return ""
-
-    # Extract and clean the description
-    raw_desc = desc_match.group(1).strip()
-    desc_lines = [line.strip() for line in raw_desc.split("\n") if line.strip()]
-    return " ".join(desc_lines)
+    try:
+        plan = ProjectPlanInput(**(response.tool_calls[0].get("args") or {}))
+    except ValidationError as e:
+        logger.log(
+            f"Invalid project plan: {str(e)[:200]}",
+            level=LogLevel.WARNING,
+            section="planner",
+        )
+        return None
+    if not plan.modules:
+        return None
+    return render_plan(plan), plan_to_modules(plan)
 
 
-def _extract_technologies(section):
-    """Extract the module Technologies from the section."""
-    desc_match = re.search(
-        r"- \*\*Technologies\*\*:\s*(.*?)(?=###|\Z)", section, re.DOTALL
-    )
+def _module_names(plan: ProjectPlanInput):
+    """Map the plain and numbered names of the plan modules to their numbered name."""
+    names = {}
+    for index, module in enumerate(plan.modules, start=1):
+        name = _strip_numbering(module.name)
+        names[name.lower()] = f"{index}. {name}"
+        names[f"{index}. {name}".lower()] = f"{index}. {name}"
+    return names
 
-    if not desc_match:
-        return ""
 
-    # Extract and clean the description
-    raw_desc = desc_match.group(1).strip()
-    desc_lines = [line.strip() for line in raw_desc.split("\n") if line.strip()]
-    return " ".join(desc_lines)
+def _strip_numbering(name: str) -> str:
+    return re.sub(r"^\s*\d+(\.\d+)*\.?\s+", "", name).strip()
 
 
-def _extract_sections(section):
-    """Extract all subsections within a module section."""
-    section_matches = re.finditer(
-        r"(### \d+\.\d+.+)(?:\n)([\s\S]*?)(?=###|\Z)", section
-    )
+def _one_line(text: str) -> str:
+    return " ".join(line.strip() for line in text.split("\n") if line.strip())
 
-    sections_data = []
-    for match in section_matches:
-        section_header = match.group(1).replace("###", "").strip()
-        section_content = _clean_section_content(match.group(2).strip())
 
-        sections_data.append(
-            {"name": section_header, "specifications": section_content}
+def _render_module(index, module, names) -> tuple[str, list]:
+    """Render a module as a plan section, returns (markdown, dependencies)."""
+    name = f"{index}. {_strip_numbering(module.name)}"
+    dependencies = []
+    for dependency in module.dependencies:
+        if dependency.strip().lower() in ("", "none", "n/a", "-"):
+            continue
+        dependency = names.get(
+            dependency.strip().lower(),
+            names.get(_strip_numbering(dependency).lower(), dependency.strip()),
         )
+        if dependency and dependency != name and dependency not in dependencies:
+            dependencies.append(dependency)
+
+    lines = [
+        f"## {name}",
+        f"- **Description**: {_one_line(module.description)}",
+        f"- **Dependencies**: {', '.join(dependencies) or 'None'}",
+    ]
+    if module.technologies:
+        lines.append(f"- **Technologies**: {module.technologies.strip()}")
+    for number, section in enumerate(module.sections, start=1):
+        lines.append(f"### {index}.{number} {_strip_numbering(section.name)}")
+        lines.append("- **Tasks**:")
+        lines.extend(f"  - {task.strip()}" for task in section.tasks)
+        if section.technologies:
+            lines.append(f"- **Technologies**: {section.technologies.strip()}")
+    return "\n".join(lines), dependencies
+
+
+def render_plan(plan: ProjectPlanInput) -> str:
+    """
+    Render the plan as markdown in the format of the planner prompt example,
+    shown to the user and kept as the project plan. The modules are built
+    from the plan itself, see plan_to_modules.
+    """
+    names = _module_names(plan)
+    modules = [
+        _render_module(index, module, names)[0]
+        for index, module in enumerate(plan.modules, start=1)
+    ]
+    conclusion = f"## Conclusion\n{plan.conclusion.strip()}"
+    return "\n---\n".join([plan.overview.strip(), *modules, conclusion, ""])
 
-    return sections_data
-
-
-def _clean_section_content(content):
-    """Clean markdown formatting from section content."""
-    # Remove Markdown formatting like "- **Tasks**:"
-    content = re.sub(r"- \*\*([^:]+)\*\*:", r"\1:", content)
-
-    # Remove other markdown formatting like bullet points
-    content = re.sub(r"^\s*-\s+", "", content, flags=re.MULTILINE)
 
-    return content
+def plan_to_modules(plan: ProjectPlanInput) -> list:
+    """
+    Convert the plan to the module dicts of pending_sections (name,
+    description, technologies, dependencies, sections and specification).
+    """
+    names = _module_names(plan)
+    result = []
+    for index, module in enumerate(plan.modules, start=1):
+        specification, dependencies = _render_module(index, module, names)
+        sections = []
+        for number, section in enumerate(module.sections, start=1):
+            specifications = "\n".join(["Tasks:", *section.tasks])
+            if section.technologies:
+                specifications += f"\nTechnologies: {section.technologies}"
+            sections.append(
+                {
+                    "name": f"{index}.{number} {_strip_numbering(section.name)}",
+                    "specifications": specifications,
+                }
+            )
+        result.append(
+            {
+                "name": f"{index}. {_strip_numbering(module.name)}",
+                "description": _one_line(module.description),
+                "technologies": module.technologies.strip(),
+                "dependencies": dependencies,
+                "sections": sections,
+                "specification": f"\n{specification}\n",
+                "approved": False,
+            }
+        )
+    return result
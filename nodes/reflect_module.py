@@ -6,20 +6,24 @@ from sub_graphs.configs.constants import (
 from sub_graphs.swe.project_data_state import (
     FileInfo,
     FileState,
+    NextNode,
 )
 
 import re
-from typing import Literal
-from utils.logger import BRDLogger, LogLevel
+from utils.logger import LogLevel
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig
-from copilotkit.langchain import copilotkit_emit_state
 from langgraph.types import Command
+from sub_graphs.swe.nodes.generate_path_module import Route, route
 from datetime import datetime
-from sub_graphs.swe.config import llm_mini, call_ai
+from sub_graphs.swe.config import (
+    call_ai,
+    call_with_cascade,
+    emit_state,
+    logger,
+)
 import json
 
-logger = BRDLogger()
 
 reflect_prompt = ChatPromptTemplate.from_messages(
     [
@@ -42,18 +46,17 @@ reflect_prompt = ChatPromptTemplate.from_messages(
         ),
     ]
 )
-reflect_chain = reflect_prompt | llm_mini
 
 
 async def reflect(
     state: FileState, config: RunnableConfig
-) -> Command[Literal["generate_path"]]:
+) -> Command[Route]:
     """
     Reflect on the current project state, identify gaps, and suggest improvements.
     This node helps ensure the project meets quality standards and requirements.
     """
     logger.log("Reflecting on project state...", section="reflect")
-    await copilotkit_emit_state(config, {"logs": logger._format_logs_for_state()})
+    await emit_state(config, logger.cursor_state())
 
     files_created = [f.name for f in state.get("files", [])]
 
@@ -64,24 +67,32 @@ async def reflect(
         "total_files": len(state.get("files", [])),
     }
 
+    def validate(response):
+        return response.content.strip()
+
     try:
-        response = await call_ai(
-            reflect_chain,
-            {
-                "project_name": state.get("project_name", ""),
-                "project_summary": state.get("project_summary", ""),
-                "progress": json.dumps(progress, indent=2),
-                "files_created": json.dumps(files_created, indent=2),
-            },
-            config,
+        response, _ = await call_with_cascade(
+            "reflect",
+            lambda model: call_ai(
+                reflect_prompt | model,
+                {
+                    "project_name": state.get("project_name", ""),
+                    "project_summary": state.get("project_summary", ""),
+                    "progress": json.dumps(progress, indent=2),
+                    "files_created": json.dumps(files_created, indent=2),
+                },
+                config,
+                validate,
+                use_cache=not state.get("retry_after_error"),
+            ),
+            validate,
         )
 
         logger.log("Reflection completed", section="reflect")
-        await copilotkit_emit_state(config, {"logs": logger._format_logs_for_state()})
+        await emit_state(config, logger.cursor_state())
 
-        return Command(
-            goto="generate_path",
-            update={"reflection": response.content, "next_node": "clear_state"},
+        return route(
+            {"reflection": response.content, "next_node": NextNode.CLEAR_STATE},
         )
     except Exception as e:
         logger.log(
@@ -89,18 +100,17 @@ async def reflect(
             level=LogLevel.ERROR,
             section="reflect",
         )
-        await copilotkit_emit_state(config, {"logs": logger._format_logs_for_state()})
+        await emit_state(config, logger.cursor_state())
         hitl = {
             "name": "error",
             "title": "Reflection Agent",
             "description": f"An Error Occured: \n{str(e)[:500]}",
             "approved": False,
         }
-        return Command(
-            goto="generate_path",
-            update={
+        return route(
+            {
                 "hitl": hitl,
                 "reflection": "I've completed the requested actions for your project.",
-                "next_node": "clear_state",
+                "next_node": NextNode.CLEAR_STATE,
             },
         )
@@ -1,10 +1,26 @@
+from enum import Enum
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional, Sequence, Annotated
 import operator
 from langchain.schema import BaseMessage
+# Imported at startup (the graph state schema derives from it), see
+# LAZY_MODULES in benchmarks/startup.py
 from copilotkit import CopilotKitState
 
 
+class NextNode(str, Enum):
+    """Nodes a step can hand over to, stored in `next_node`."""
+
+    ANALYZE_REQUEST = "analyze_request"
+    PROCESS_FEEDBACK = "process_feedback_node"
+    PLANNER = "planner"
+    CREATE_MODULE = "create_module"
+    CODE_MODULE = "code_module"
+    GENERATE_RESPONSE = "generate_respond_to_query"
+    REFLECT = "reflect"
+    CLEAR_STATE = "clear_state"
+
+
 # File information model
 class FileInfo(BaseModel):
     """Information about a file in the project."""
@@ -14,6 +30,9 @@ class FileInfo(BaseModel):
     description: str
     content: Optional[str] = ""
     complete: Optional[bool] = False
+    # Reference to the content in the blob store when it is not kept inline
+    content_hash: Optional[str] = None
+    size: int = 0
 
 
 # File model
@@ -74,6 +93,8 @@ class CurrentModule(BaseModel):
     sections: List[str]
     completed_files: List[FileInfo]
     pending_files: List[FileInfo]
+    # Hash of the inputs the code was generated from, see module_input_hash
+    input_hash: Optional[str] = None
 
 
 # Log entry model
@@ -100,6 +121,24 @@ class Artifact(BaseModel):
     contents: List[ArtifactContent]
 
 
+def merge_module_outputs(
+    left: Dict[str, Any], right: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Keep the latest output of every module: an output replaces the previous
+    one of the same module (also the entries keyed by input hash of older
+    checkpoints), so the outputs never outgrow the project's modules.
+    """
+    names = {value.get("name") for value in (right or {}).values()}
+    merged = {
+        key: value
+        for key, value in (left or {}).items()
+        if value.get("name") not in names
+    }
+    merged.update(right or {})
+    return merged
+
+
 # FileState model - application state
 class FileState(CopilotKitState):
     """State for the project generation workflow."""
@@ -123,6 +162,10 @@ class FileState(CopilotKitState):
 
     # Tracking
     logs: List[dict] = Field(default_factory=list)
+    # Sequence number of the last workflow log entry of the thread and the
+    # epoch of its log, see config.log_stream
+    log_cursor: int = 0
+    log_epoch: Optional[str] = None
     files: List[File] = Field(default_factory=list)
     selected_file: Dict = {}
     processed_files: int = 0
@@ -142,8 +185,15 @@ class FileState(CopilotKitState):
 
     # Current processing
     current_module: Optional[dict] = None
+    module_batch: List[dict] = Field(default_factory=list)
     current_section: Optional[BaseModule] = None
     generated_files: List[Any] = Field(default_factory=list)
+    # Last generated output (CurrentModule dict) of every module by module
+    # name, a module whose input hash did not change is reused instead of
+    # regenerated
+    module_outputs: Annotated[Dict[str, Any], merge_module_outputs] = Field(
+        default_factory=dict
+    )
 
     module_plans: Annotated[Dict[str, ModulePlan], operator.or_] = Field(
         default_factory=dict
@@ -156,4 +206,9 @@ class FileState(CopilotKitState):
     hitl: Optional[dict]
     response: Optional[str] = None
     follow_up: Optional[str] = None
+    # Set when the user resumes after an error, the node runs again without
+    # the response cache so it does not get the failed answer back
+    retry_after_error: bool = False
     reflection: Optional[str] = None
+    # Rolling summary of the messages removed by compact_history
+    history_summary: str = ""
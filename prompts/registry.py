@@ -0,0 +1,137 @@
+# Prompt templates compiled once and versioned by their content hash
+import os
+import re
+import hashlib
+import threading
+from string import Formatter
+from typing import Dict, List, Optional, Tuple
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+TEMPLATE_EXTENSION = ".md"
+
+
+def split_static_prefix(template: str) -> tuple[str, str]:
+    """
+    Split a template into the text before its variables and the rest.
+    The cut is made at the heading of the section holding the first variable.
+    """
+    match = re.search(r"\{\w+\}", template)
+    if not match:
+        return template, ""
+    cut = template.rfind("\n#", 0, match.start())
+    if cut == -1:
+        cut = template.rfind("\n", 0, match.start())
+    cut = max(cut, 0)
+    return template[:cut], template[cut:].lstrip("\n")
+
+
+def compile_format(template: str) -> Optional[List[Tuple[str, Optional[str]]]]:
+    """
+    Split a str.format template into (literal, variable) segments, or None
+    when it uses conversions, format specs or indexed fields.
+    """
+    segments = []
+    for literal, field, spec, conversion in Formatter().parse(template):
+        if field is not None and (spec or conversion or not field.isidentifier()):
+            return None
+        segments.append((literal, field))
+    return segments
+
+
+class CompiledPrompt:
+    """
+    A template of the prompts directory, rendered by Jinja once and split
+    into its static prefix and the segments of its dynamic part, so rendering
+    the variables is a single join. `version` is the hash of the file.
+    """
+
+    def __init__(self, name: str, source: str, text: str, mtime: float):
+        self.name = name
+        self.version = hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+        self.mtime = mtime
+        self.text = text
+        self.static, self.dynamic = split_static_prefix(text)
+        self._segments = compile_format(self.dynamic)
+
+    def render_dynamic(self, **variables) -> str:
+        """Render the variables of the dynamic part, like str.format."""
+        if self._segments is None:
+            return self.dynamic.format(**variables)
+        parts = []
+        for literal, field in self._segments:
+            parts.append(literal)
+            if field is not None:
+                parts.append(str(variables[field]))
+        return "".join(parts)
+
+
+class PromptRegistry:
+    """
+    Compiles every template of `directory` at startup. With `hot_reload`
+    (for editing prompts during development) templates are recompiled when
+    their file changes, otherwise the files are never read again.
+    """
+
+    def __init__(self, directory: str, hot_reload: bool = False):
+        self.directory = directory
+        self.hot_reload = hot_reload
+        self.env = Environment(
+            loader=FileSystemLoader(directory),
+            autoescape=select_autoescape(),
+            trim_blocks=True,
+            lstrip_blocks=True,
+            auto_reload=hot_reload,
+        )
+        self._prompts: Dict[str, CompiledPrompt] = {}
+        self._lock = threading.Lock()
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.endswith(TEMPLATE_EXTENSION):
+                self._load(file_name[: -len(TEMPLATE_EXTENSION)])
+
+    def get(self, name: str) -> CompiledPrompt:
+        prompt = self._prompts.get(name)
+        if self.hot_reload:
+            prompt = self._reload_if_changed(name, prompt)
+        if prompt is None:
+            raise ValueError(f"Unknown prompt template {name}")
+        return prompt
+
+    def version(self, name: str) -> str:
+        return self.get(name).version
+
+    def versions(self) -> Dict[str, str]:
+        """Version of every template, e.g. to record with benchmark results."""
+        if self.hot_reload:
+            for name in list(self._prompts):
+                self._reload_if_changed(name, self._prompts[name])
+        return {name: prompt.version for name, prompt in sorted(self._prompts.items())}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}{TEMPLATE_EXTENSION}")
+
+    def _reload_if_changed(self, name: str, prompt: Optional[CompiledPrompt]):
+        try:
+            mtime = os.stat(self._path(name)).st_mtime
+        except FileNotFoundError:
+            with self._lock:
+                self._prompts.pop(name, None)
+            return None
+        if prompt is not None and prompt.mtime == mtime:
+            return prompt
+        print(f"Reloading prompt template {name}")
+        return self._load(name)
+
+    def _load(self, name: str) -> CompiledPrompt:
+        path = self._path(name)
+        try:
+            mtime = os.stat(path).st_mtime
+            with open(path, "r", encoding="utf-8") as f:
+                source = f.read()
+            text = self.env.get_template(f"{name}{TEMPLATE_EXTENSION}").render()
+        except Exception as e:
+            raise ValueError(f"Error loading template {name}: {e}")
+        prompt = CompiledPrompt(name, source, text, mtime)
+        with self._lock:
+            self._prompts[name] = prompt
+        return prompt
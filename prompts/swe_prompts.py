@@ -192,81 +192,121 @@ NUXT_PROMPT = """
 """
 
 
-import os
 from datetime import datetime
 from state import FileState
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-
-
-env = Environment(
-    loader=FileSystemLoader(os.path.dirname(__file__)),
-    autoescape=select_autoescape(),
-    trim_blocks=True,
-    lstrip_blocks=True,
-)
+from langchain_core.messages import SystemMessage
+from sub_graphs.swe.config import prompt_registry, tracer
 
 
 def build_system_prompt(state: FileState, c_node) -> str:
     """
     Build the system prompt based on current state.
     """
+    static_part, dynamic_part = build_system_prompt_parts(state, c_node)
+    return "\n".join(part for part in (static_part, dynamic_part) if part)
+
+
+def build_system_message(state: FileState, c_node, model) -> SystemMessage:
+    """
+    Build the system message for `model` with the static instructions first so
+    providers can cache the prompt prefix across calls.
+    """
+    static_part, dynamic_part = build_system_prompt_parts(state, c_node)
+    if not is_anthropic(model) or not static_part:
+        # OpenAI caches the longest identical prefix automatically
+        return SystemMessage(
+            content="\n".join(part for part in (static_part, dynamic_part) if part)
+        )
+    return SystemMessage(
+        content=[
+            {
+                "type": "text",
+                "text": static_part,
+                "cache_control": {"type": "ephemeral"},
+            },
+            {"type": "text", "text": dynamic_part},
+        ]
+    )
+
+
+def build_system_prompt_parts(state: FileState, c_node) -> tuple[str, str]:
+    """
+    Build the system prompt as a (static, dynamic) pair. The static part only
+    depends on the template, everything that changes per project or per call
+    is in the dynamic part.
+    """
 
     # The LLM is only aware of what it is told. When we build the system prompt, we give
     # it context to the LangGraph state and various other pieces of information.
-    prompt_parts = [f"Today's date is {datetime.now().strftime('%d/%m/%Y')}."]
+    static_parts = []
+    dynamic_parts = []
 
     # This is an example of how you can use a case statement to format the prompt
     # based on the current node
     match c_node:
         case "analyze":
             if state.get("follow_up", "") == "":
-                prompt_parts.append(
-                    get_prompt_template("analysis").format(
-                        project_summary=state.get("project_summary", "")
-                    )
-                )
+                template_name = "analysis"
             else:
-                prompt_parts.append(
-                    get_prompt_template("re_analysis").format(
-                        project_summary=state.get("project_summary", ""),
-                        analysis=state.get("analysis", ""),
-                        user_request=state.get("follow_up", ""),
-                    )
-                )
+                template_name = "re_analysis"
+            variables = {
+                "project_summary": state.get("project_summary", ""),
+                "analysis": state.get("analysis", ""),
+                "user_request": state.get("follow_up", ""),
+            }
         case "planner":
-            if state.get("follow_up", "") == "":
-                prompt_parts.append(
-                    get_prompt_template("re_planner").format(
-                        project_name=state.get("project_name", ""),
-                        project_summary=state.get("project_summary", ""),
-                        analysis=state.get("analysis", ""),
-                    )
-                )
-            else:
-                prompt_parts.append(
-                    get_prompt_template("re_planner").format(
-                        project_summary=state.get("project_summary", ""),
-                        analysis=state.get("analysis", ""),
-                        user_request=state.get("follow_up", ""),
-                    )
-                )
+            template_name = "re_planner"
+            variables = {
+                "project_name": state.get("project_name", ""),
+                "project_summary": state.get("project_summary", ""),
+                "analysis": state.get("analysis", ""),
+                "user_request": state.get("follow_up", ""),
+            }
 
         case "code_module":
             # Add logic for "code_module" here
-            pass
+            template_name = None
+            variables = {}
         case _:
             raise ValueError(f"Unknown node: {c_node}")
-    prompt_parts.append(
+
+    if template_name:
+        prompt = prompt_registry.get(template_name)
+        tracer.annotate(prompt=template_name, prompt_version=prompt.version)
+        static_parts.append(prompt.static)
+        dynamic_parts.append(prompt.render_dynamic(**variables))
+
+    dynamic_parts.append(f"Today's date is {datetime.now().strftime('%d/%m/%Y')}.")
+    dynamic_parts.append(
         f"You are a software engineer. You are working on the following project: {state.get('project_name', '')}."
     )
 
-    # print("Prompt parts:\n", "\n".join(prompt_parts))
-    return "\n".join(prompt_parts)
+    # print("Prompt parts:\n", "\n".join(static_parts + dynamic_parts))
+    return "\n".join(static_parts), "\n".join(dynamic_parts)
+
+
+def is_anthropic(model) -> bool:
+    """Check whether a chat model talks to the Anthropic API."""
+    return type(model).__name__ == "ChatAnthropic"
+
+
+def static_system_message(text: str, model) -> SystemMessage:
+    """
+    Return a system message that is sent verbatim (it is not a template) and
+    marked for prompt caching when `model` is an Anthropic model.
+    """
+    if not is_anthropic(model):
+        return SystemMessage(content=text)
+    return SystemMessage(
+        content=[
+            {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+        ]
+    )
 
 
 def get_prompt_template(prompt_name: str) -> str:
     """
-    Load and return a prompt template using Jinja2.
+    Return a prompt template of the registry, rendered by Jinja2.
 
     Args:
         prompt_name: Name of the prompt template file (without .md extension)
@@ -274,8 +314,4 @@ def get_prompt_template(prompt_name: str) -> str:
     Returns:
         The template string with proper variable substitution syntax
     """
-    try:
-        template = env.get_template(f"{prompt_name}.md")
-        return template.render()
-    except Exception as e:
-        raise ValueError(f"Error loading template {prompt_name}: {e}")
+    return prompt_registry.get(prompt_name).text
@@ -4,11 +4,11 @@ from langchain_core.messages import AIMessage, ToolMessage
 from langchain_community.adapters.openai import convert_openai_messages
 from langchain_core.tools import tool, BaseTool
 from langchain_core.runnables import RunnableConfig
-from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 import random
 import string
 from copilotkit.langchain import copilotkit_customize_config, copilotkit_emit_state
+from sub_graphs.swe.config import ainvoke_with_limits, model_clients
 
 
 @tool
@@ -129,9 +129,12 @@ async def analysis_writer(user_query, path, idx, state):
         # Convert prompts for OpenAI API
         lc_messages = convert_openai_messages(prompt)
 
-        # Invoke OpenAI's model with tool
-        model = ChatOpenAI(model="gpt-4o-mini", max_retries=1)
-        response = await model.bind_tools([AnalyseSection]).ainvoke(lc_messages, config)
+        # Invoke OpenAI's model with tool, shared with the other tool calls and
+        # sent through their rate limiter and tracing, which also retries
+        model = model_clients.chat_model("openai", "gpt-4o-mini", max_retries=0)
+        response = await ainvoke_with_limits(
+            model.bind_tools([AnalyseSection]), lc_messages, config
+        )
 
         state["logs"][-1]["done"] = True
         await copilotkit_emit_state(config, state)
@@ -0,0 +1,67 @@
+# Content-addressed store for generated file contents
+import os
+import hashlib
+from typing import Optional, Union
+
+from sub_graphs.swe.project_data_state import FileInfo
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class BlobStore:
+    """
+    Local directory of file bodies keyed by their sha256, so graph state and
+    emitted state only carry a reference (path, hash and size) to each file.
+    The UI reads the bodies from GET /blobs/{content_hash} (webapp.py).
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def put(self, content: str) -> str:
+        """Store `content` and return its hash, identical contents are stored once."""
+        digest = content_hash(content)
+        path = self.path_for(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest: str) -> Optional[str]:
+        try:
+            with open(self.path_for(digest), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def offload(self, file: FileInfo) -> FileInfo:
+        """Return a copy of `file` with its content replaced by a blob reference."""
+        if file.content_hash and not file.content:
+            return file
+        content = file.content or ""
+        return file.copy(
+            update={
+                "content": "",
+                "content_hash": self.put(content),
+                "size": len(content.encode("utf-8")),
+            }
+        )
+
+    def load(self, file: Union[FileInfo, dict]) -> str:
+        """Return the content of a file, inline or from the store."""
+        if isinstance(file, FileInfo):
+            file = file.dict()
+        if file.get("content"):
+            return file["content"]
+        if file.get("content_hash"):
+            return self.get(file["content_hash"]) or ""
+        return ""
@@ -0,0 +1,177 @@
+# In-memory checkpointer with bounded history and idle thread spill to disk
+import os
+import time
+import pickle
+import hashlib
+import threading
+from typing import Any, Dict, Optional, Set
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import MemorySaver
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    MemorySaver that keeps only the last `max_checkpoints` checkpoints of every
+    thread and moves threads idle for more than `idle_ttl` seconds to
+    `spill_dir`. Spilled threads are loaded back on their next access, e.g.
+    when an interrupt is resumed.
+
+    Pruning drops the ancestors of the oldest kept checkpoint, so graphs using
+    delta channels (which replay writes from ancestors) are not supported.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_checkpoints: int = 20,
+        idle_ttl: float = 1800,
+        spill_dir: str = ".cache/checkpoints",
+        sweep_interval: float = 60,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.max_checkpoints = max(1, max_checkpoints)
+        self.idle_ttl = idle_ttl
+        self.spill_dir = spill_dir
+        self.sweep_interval = sweep_interval
+        self._last_access: Dict[str, float] = {}
+        # Threads moved to spill_dir by this process. `storage` is a
+        # defaultdict, an entry there does not mean the thread is loaded
+        self._spilled: Set[str] = set()
+        self._last_sweep = time.time()
+        self._lock = threading.RLock()
+        os.makedirs(spill_dir, exist_ok=True)
+
+    # Checkpointer interface, the async methods of MemorySaver call these.
+    # The lock is held from the restore to the end of the read or write, so a
+    # sweep of a concurrent put never spills a thread while it is used.
+
+    def get_tuple(self, config: RunnableConfig):
+        with self._lock:
+            self._touch(config)
+            return super().get_tuple(config)
+
+    def list(self, config: Optional[RunnableConfig], *args, **kwargs):
+        with self._lock:
+            if config:
+                self._touch(config)
+            checkpoints = list(super().list(config, *args, **kwargs))
+        yield from checkpoints
+
+    def put(self, config: RunnableConfig, *args, **kwargs) -> RunnableConfig:
+        with self._lock:
+            thread_id = self._touch(config)
+            result = super().put(config, *args, **kwargs)
+            self._prune(thread_id)
+            self._sweep()
+        return result
+
+    def put_writes(self, config: RunnableConfig, *args, **kwargs) -> None:
+        with self._lock:
+            self._touch(config)
+            return super().put_writes(config, *args, **kwargs)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._last_access.pop(thread_id, None)
+            self._spilled.discard(thread_id)
+            path = self._spill_path(thread_id)
+            if os.path.exists(path):
+                os.remove(path)
+        return super().delete_thread(thread_id)
+
+    # Retention
+
+    def _touch(self, config: RunnableConfig) -> str:
+        """
+        Record an access to the thread, loading it back first when it was
+        spilled (or when it is first seen, it may have been spilled by an
+        earlier process).
+        """
+        thread_id = str(config["configurable"]["thread_id"])
+        with self._lock:
+            if thread_id in self._spilled or thread_id not in self._last_access:
+                self._restore(thread_id)
+            self._last_access[thread_id] = time.time()
+        return thread_id
+
+    def _prune(self, thread_id: str):
+        """Drop all but the newest checkpoints of the thread and their writes and blobs."""
+        for checkpoint_ns, checkpoints in self.storage.get(thread_id, {}).items():
+            if len(checkpoints) <= self.max_checkpoints:
+                continue
+            # Checkpoint ids are time ordered
+            ordered = sorted(checkpoints)
+            for checkpoint_id in ordered[: -self.max_checkpoints]:
+                del checkpoints[checkpoint_id]
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self._prune_blobs(thread_id, checkpoint_ns, checkpoints)
+
+    def _prune_blobs(self, thread_id: str, checkpoint_ns: str, checkpoints: Dict[str, Any]):
+        blobs = getattr(self, "blobs", None)
+        if not blobs:
+            return
+        referenced = set()
+        for saved_checkpoint, *_ in checkpoints.values():
+            try:
+                checkpoint = self.serde.loads_typed(saved_checkpoint)
+            except Exception:
+                # Unknown layout, keep every blob of the thread
+                return
+            referenced.update(checkpoint.get("channel_versions", {}).items())
+        for key in [
+            key
+            for key in blobs
+            if key[0] == thread_id
+            and key[1] == checkpoint_ns
+            and (key[2], key[3]) not in referenced
+        ]:
+            del blobs[key]
+
+    # Idle thread spill
+
+    def _spill_path(self, thread_id: str) -> str:
+        name = hashlib.sha256(thread_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_dir, f"{name}.pkl")
+
+    def _sweep(self):
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        for thread_id, last_access in list(self._last_access.items()):
+            if now - last_access > self.idle_ttl:
+                self._spill(thread_id)
+
+    def _spill(self, thread_id: str):
+        data = {
+            "storage": dict(self.storage.pop(thread_id, {})),
+            "writes": {
+                key: self.writes.pop(key)
+                for key in [key for key in self.writes if key[0] == thread_id]
+            },
+            "blobs": {
+                key: self.blobs.pop(key)
+                for key in [key for key in getattr(self, "blobs", {}) if key[0] == thread_id]
+            },
+        }
+        self._last_access.pop(thread_id, None)
+        path = self._spill_path(thread_id)
+        with open(f"{path}.tmp", "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{path}.tmp", path)
+        self._spilled.add(thread_id)
+
+    def _restore(self, thread_id: str):
+        self._spilled.discard(thread_id)
+        path = self._spill_path(thread_id)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        self.storage[thread_id].update(data["storage"])
+        self.writes.update(data["writes"])
+        if data["blobs"]:
+            self.blobs.update(data["blobs"])
+        os.remove(path)
@@ -0,0 +1,196 @@
+# Token-budgeted prompt context built from the conversation and project state
+import json
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, SystemMessage
+
+from sub_graphs.swe.tools.markdown_stream import message_text
+
+_encoding = None
+_encoding_loaded = False
+
+# Per message overhead of the chat formats (role and separators)
+MESSAGE_OVERHEAD = 4
+
+
+def get_encoding():
+    """The tiktoken encoding, loaded on first use (it may have to be downloaded)."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # Optional, without it tokens are estimated from the text length
+            _encoding = None
+        _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def truncate_tokens(text: str, tokens: int) -> str:
+    """Keep the beginning of `text` up to `tokens` tokens."""
+    if tokens <= 0:
+        return ""
+    if count_tokens(text) <= tokens:
+        return text
+    encoding = get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:tokens])
+    return text[: max(0, (tokens - 1) * 4)]
+
+
+def message_tokens(message: BaseMessage) -> int:
+    return count_tokens(message_text(message)) + MESSAGE_OVERHEAD
+
+
+def history_tokens(messages: Sequence[BaseMessage]) -> int:
+    return sum(message_tokens(message) for message in messages)
+
+
+class Context(NamedTuple):
+    messages: List[BaseMessage]
+    project_context: str
+    summary: str
+    tokens: int
+    dropped_messages: int
+
+    def history(self) -> List[BaseMessage]:
+        """The messages, preceded by the summary of the older history if any."""
+        if not self.summary:
+            return list(self.messages)
+        return [
+            SystemMessage(content=f"Summary of the earlier conversation:\n{self.summary}"),
+            *self.messages,
+        ]
+
+
+class ContextAssembler:
+    """
+    Fills a token budget with the context of a prompt, by priority:
+
+    1. the `recent_turns` latest messages (the latest one is always kept);
+    2. the project context;
+    3. summaries of the older history;
+    4. older messages, newest first, with what is left.
+
+    Messages with the same role and text are only kept once (the latest),
+    the selected messages are returned in their original order.
+    """
+
+    def __init__(self, budget: int, recent_turns: int = 6):
+        self.budget = budget
+        self.recent_turns = recent_turns
+
+    def assemble(
+        self,
+        messages: Sequence[BaseMessage],
+        project_context: Optional[Dict] = None,
+        summaries: Sequence[str] = (),
+    ) -> Context:
+        remaining = self.budget
+        unique = deduplicate(messages)
+
+        selected = set()
+        recent = list(range(len(unique) - 1, -1, -1))
+        for position, index in enumerate(recent[: self.recent_turns]):
+            tokens = message_tokens(unique[index])
+            if tokens > remaining and position > 0:
+                break
+            selected.add(index)
+            remaining -= tokens
+
+        project_text = format_project_context(project_context)
+        project_text = truncate_tokens(project_text, remaining)
+        remaining -= count_tokens(project_text)
+
+        summary_parts = []
+        for summary in summaries:
+            summary = truncate_tokens(summary.strip(), remaining)
+            if summary:
+                summary_parts.append(summary)
+                remaining -= count_tokens(summary)
+
+        for index in recent[self.recent_turns :]:
+            tokens = message_tokens(unique[index])
+            if tokens > remaining:
+                break
+            selected.add(index)
+            remaining -= tokens
+
+        return Context(
+            messages=drop_orphan_tool_messages(
+                [unique[index] for index in sorted(selected)]
+            ),
+            project_context=project_text,
+            summary="\n\n".join(summary_parts),
+            tokens=self.budget - remaining,
+            dropped_messages=len(messages) - len(selected),
+        )
+
+
+def deduplicate(messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """Drop empty messages and earlier copies of repeated messages."""
+    seen = set()
+    unique = []
+    for message in reversed(messages):
+        text = message_text(message).strip()
+        calls = tuple(call["id"] for call in getattr(message, "tool_calls", None) or [])
+        key = (message.type, text, calls, getattr(message, "tool_call_id", None))
+        if (not text and not calls) or key in seen:
+            continue
+        seen.add(key)
+        unique.append(message)
+    unique.reverse()
+    return unique
+
+
+def drop_orphan_tool_messages(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """
+    Drop tool calls whose results were not selected and tool results whose
+    call was not, providers reject either.
+    """
+    result_ids = {
+        message.tool_call_id for message in messages if message.type == "tool"
+    }
+    messages = [
+        message
+        for message in messages
+        if all(
+            call["id"] in result_ids
+            for call in getattr(message, "tool_calls", None) or []
+        )
+    ]
+    call_ids = {
+        call["id"]
+        for message in messages
+        for call in getattr(message, "tool_calls", None) or []
+    }
+    return [
+        message
+        for message in messages
+        if message.type != "tool" or message.tool_call_id in call_ids
+    ]
+
+
+def format_project_context(project_context: Optional[Dict]) -> str:
+    """Render the non-empty values of the project context, one section per key."""
+    if not project_context:
+        return ""
+    sections = []
+    for key, value in project_context.items():
+        if value in (None, "", [], {}):
+            continue
+        if not isinstance(value, str):
+            value = json.dumps(value, indent=2, default=str)
+        sections.append(f"{key.replace('_', ' ').title()}: {value}")
+    return "\n".join(sections)
@@ -1,3 +1,4 @@
+from typing import List
 from pydantic import BaseModel, Field
 from langchain.tools import tool
 
@@ -19,3 +20,55 @@ def SummarizeTool(summary: str):  # pylint: disable=invalid-name,unused-argument
     Summarize the final result. Make sure that the summary is complete and
     includes all relevant information.
     """
+
+
+class PlanSection(BaseModel):
+    """A section of a plan module"""
+
+    name: str = Field(description="Section title, e.g. User Interface (UI) Components")
+    tasks: List[str] = Field(description="Components and tasks needed for this section")
+    technologies: str = Field(
+        default="", description="Technology, framework or tool used (just one)"
+    )
+
+
+class PlanModule(BaseModel):
+    """A module of the project plan"""
+
+    name: str = Field(description="Module name without numbering, e.g. Frontend Components")
+    description: str = Field(
+        description="Clear and detailed description of what the module does and how it works as a part of the system"
+    )
+    technologies: str = Field(
+        default="", description="Main technology, framework or tool of the module"
+    )
+    dependencies: List[str] = Field(
+        default_factory=list,
+        description="Names of the other modules this module depends on, empty if none",
+    )
+    sections: List[PlanSection] = Field(
+        description="All components and tasks necessary to create this module"
+    )
+
+
+class ProjectPlanInput(BaseModel):
+    """Input for the project plan tool"""
+
+    overview: str = Field(
+        description="""
+                          Markdown with the plan title (including the project name), the chosen
+                          system design and why, the project structure and the MermaidJS diagram.
+                          """
+    )
+    modules: List[PlanModule] = Field(description="The modules of the project")
+    conclusion: str = Field(default="", description="Short closing summary")
+
+
+@tool(args_schema=ProjectPlanInput)
+def ProjectPlanTool(
+    overview: str, modules: List[dict], conclusion: str = ""
+):  # pylint: disable=invalid-name,unused-argument
+    """
+    Submit the project plan. Every module needed by the project must be listed
+    with its sections.
+    """
@@ -0,0 +1,315 @@
+# Installed dependencies of generated projects cached by their manifest hash
+import os
+import time
+import shlex
+import asyncio
+import shutil
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+from sub_graphs.swe.tools.blob_store import content_hash
+
+
+class Stack(NamedTuple):
+    """
+    How the dependencies of a project type are installed. `output` is the
+    directory snapshotted after an install, None when the mirror alone is the
+    cache. `install` and `offline_install` are formatted with the mirror dir
+    and the npm command (`ci` when there is a lockfile).
+    """
+
+    name: str
+    manifests: List[str]
+    lockfiles: List[str]
+    output: Optional[str]
+    install: str
+    offline_install: str
+
+
+STACKS = [
+    Stack(
+        "node",
+        ["package.json"],
+        ["package-lock.json", "npm-shrinkwrap.json"],
+        "node_modules",
+        "npm {command} --prefer-offline --no-audit --no-fund --cache {mirror}",
+        "npm {command} --offline --no-audit --no-fund --cache {mirror}",
+    ),
+    # The venv is used through .venv/bin/python, its scripts keep the path
+    # it was created at
+    Stack(
+        "python",
+        ["requirements.txt"],
+        [],
+        ".venv",
+        "python3 -m venv .venv && .venv/bin/pip download -q -d {mirror} -r requirements.txt"
+        " && .venv/bin/pip install -q --no-index --find-links {mirror} -r requirements.txt",
+        "python3 -m venv .venv"
+        " && .venv/bin/pip install -q --no-index --find-links {mirror} -r requirements.txt",
+    ),
+    Stack(
+        "maven",
+        ["pom.xml"],
+        [],
+        None,
+        "mvn -B -q -Dmaven.repo.local={mirror} dependency:go-offline",
+        "mvn -B -q -o -Dmaven.repo.local={mirror} dependency:go-offline",
+    ),
+]
+
+
+def detect_stack(project_dir: str) -> Optional[Stack]:
+    for stack in STACKS:
+        if any(os.path.isfile(os.path.join(project_dir, name)) for name in stack.manifests):
+            return stack
+    return None
+
+
+def manifest_key(project_dir: str, stack: Stack) -> str:
+    """Hash of the stack and its manifest and lock files present in `project_dir`."""
+    parts = [stack.name]
+    for name in stack.manifests + stack.lockfiles:
+        path = os.path.join(project_dir, name)
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                parts.append(f"{name}\n{content_hash(f.read())}")
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:24]
+
+
+def tree_size(path: str) -> int:
+    """Disk size of a directory, hardlinked files are counted once."""
+    seen = set()
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.lstat(os.path.join(directory, name))
+            except OSError:
+                continue
+            if (stat.st_dev, stat.st_ino) in seen:
+                continue
+            seen.add((stat.st_dev, stat.st_ino))
+            total += stat.st_blocks * 512
+    return total
+
+
+def copy_tree(source: str, target: str) -> str:
+    """
+    Shell command copying `source` to `target` as a copy-on-write clone where
+    the filesystem supports it, with hardlinks otherwise and a full copy when
+    both are on different filesystems. Hardlinked files are shared with the
+    snapshot, installs replace files rather than writing them in place.
+    """
+    source, target = shlex.quote(source), shlex.quote(target)
+    return " || ".join(
+        f"(rm -rf {target}; cp -a {flag} {source} {target} 2>/dev/null)"
+        for flag in ("--reflink=always", "-l", "")
+    )
+
+
+class DependencyCache:
+    """
+    Snapshots of installed dependencies (node_modules, .venv) keyed by the
+    manifest and lock files of the project, with the package downloads kept
+    in a local mirror so installs after the first are offline. Snapshots are
+    evicted least recently used first once they take more than `max_bytes`.
+
+    `root` is the cache directory on this machine, `sandbox_root` the same
+    directory as seen from the sandboxes (where it is mounted). Hits, misses
+    and evictions are counted on `metrics` and the size of the cache is
+    reported on every render.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int = 10 * 1024**3,
+        offline: bool = False,
+        sandbox_root: Optional[str] = None,
+        metrics=None,
+    ):
+        self.root = os.path.abspath(root)
+        self.sandbox_root = sandbox_root or self.root
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(self.root, "snapshots"), exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(self.root, "index.sqlite"), check_same_thread=False
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS snapshots (
+                key TEXT PRIMARY KEY,
+                stack TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+        if metrics is not None:
+            metrics.add_collector(self.collect)
+
+    def _count(self, event: str, value: int = 1):
+        if self.metrics is not None and value:
+            self.metrics.inc(
+                f"swe_dependency_cache_{event}_total",
+                value,
+                help=f"Dependency cache {event}",
+            )
+
+    def snapshot_path(self, key: str, sandbox: bool = False) -> str:
+        root = self.sandbox_root if sandbox else self.root
+        return os.path.join(root, "snapshots", key)
+
+    def mirror_path(self, stack: Stack) -> str:
+        """Local package mirror of a stack, as seen from the sandboxes."""
+        return os.path.join(self.sandbox_root, "mirror", stack.name)
+
+    def lookup(self, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stack FROM snapshots WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return False
+            self._conn.execute(
+                "UPDATE snapshots SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            return True
+
+    def add(self, key: str, stack: Stack) -> int:
+        """Index the snapshot `key` once it is written, returns the evicted count."""
+        path = self.snapshot_path(key)
+        size = tree_size(path) if os.path.isdir(path) else 0
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)",
+                (key, stack.name, size, now, now),
+            )
+            evicted = self._evict()
+            self._conn.commit()
+        self.evictions += len(evicted)
+        self._count("evictions", len(evicted))
+        for key in evicted:
+            shutil.rmtree(self.snapshot_path(key), ignore_errors=True)
+        return len(evicted)
+
+    def _evict(self) -> List[str]:
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM snapshots"
+        ).fetchone()[0]
+        evicted = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM snapshots ORDER BY accessed"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM snapshots WHERE key = ?", (key,))
+            total -= size
+            evicted.append(key)
+        return evicted
+
+    def install_command(self, stack: Stack, project_dir: str) -> str:
+        template = stack.offline_install if self.offline else stack.install
+        command = "install"
+        if stack.name == "node" and any(
+            os.path.isfile(os.path.join(project_dir, name)) for name in stack.lockfiles
+        ):
+            command = "ci"
+        return template.format(
+            mirror=shlex.quote(self.mirror_path(stack)), command=command
+        )
+
+    async def install(self, sandbox, project_dir: str, path: str) -> Dict:
+        """
+        Install the dependencies of `project_dir` (uploaded to `path` in the
+        leased `sandbox`), restoring the snapshot of its manifest hash when
+        there is one. Returns the step with the command, exit code and output.
+        """
+        stack = detect_stack(project_dir)
+        if stack is None:
+            return {"command": "", "exit_code": 0, "output": "No dependencies", "cached": False}
+        key = f"{stack.name}-{manifest_key(project_dir, stack)}"
+        project = shlex.quote(path)
+
+        if self.lookup(key):
+            self.hits += 1
+            self._count("hits")
+            command = f"cd {project}"
+            if stack.output:
+                command += " && " + copy_tree(
+                    self.snapshot_path(key, sandbox=True), stack.output
+                )
+            observation = await sandbox.run(command)
+            if observation.exit_code == 0:
+                return _step(command, observation, cached=True)
+            # The snapshot is unusable, installed again below
+            print(f"Restoring dependency snapshot {key} failed: {observation.output[-500:]}")
+
+        self.misses += 1
+        self._count("misses")
+        command = f"cd {project} && {self.install_command(stack, project_dir)}"
+        observation = await sandbox.run(command)
+        if observation.exit_code != 0:
+            return _step(command, observation, cached=False)
+
+        if stack.output:
+            snapshot = self.snapshot_path(key, sandbox=True)
+            staging = shlex.quote(f"{snapshot}.{sandbox.id}.tmp")
+            # Projects without dependencies get an empty snapshot
+            saved = await sandbox.run(
+                f"mkdir -p {shlex.quote(os.path.join(path, stack.output))}"
+                f" {shlex.quote(os.path.dirname(snapshot))} && "
+                + copy_tree(os.path.join(path, stack.output), f"{snapshot}.{sandbox.id}.tmp")
+                + f" && (mv -T {staging} {shlex.quote(snapshot)} 2>/dev/null || rm -rf {staging})"
+            )
+            if saved.exit_code != 0:
+                print(f"Saving dependency snapshot {key} failed: {saved.output[-500:]}")
+                return _step(command, observation, cached=False)
+        await asyncio.to_thread(self.add, key, stack)
+        return _step(command, observation, cached=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM snapshots"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "snapshots": count,
+            "bytes": size,
+        }
+
+    def collect(self, metrics):
+        """Set the size gauges of the cache, called on each metrics render."""
+        stats = self.stats()
+        metrics.set(
+            "swe_dependency_cache_snapshots",
+            stats["snapshots"],
+            help="Dependency snapshots in the cache",
+        )
+        metrics.set(
+            "swe_dependency_cache_bytes",
+            stats["bytes"],
+            help="Disk size of the dependency snapshots",
+        )
+
+
+def _step(command: str, observation, cached: bool) -> Dict:
+    return {
+        "command": command,
+        "exit_code": observation.exit_code,
+        "output": observation.output,
+        "cached": cached,
+    }
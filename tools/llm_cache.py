@@ -0,0 +1,274 @@
+# Content-addressed cache for LLM responses
+import os
+import time
+import json
+import sqlite3
+import asyncio
+import inspect
+import hashlib
+import warnings
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from langchain_core.load import dumps, loads
+from langchain_core.language_models import BaseChatModel
+
+# Cached responses are messages, older langchain-core versions have no
+# allowed_objects and load everything
+LOADS_OPTIONS = (
+    {"allowed_objects": "messages"}
+    if "allowed_objects" in inspect.signature(loads).parameters
+    else {}
+)
+
+
+def make_cache_key(model: str, params: Any, prompt: str) -> str:
+    """Build the cache key from the model id, its parameters and the prompt."""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    params_text = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(f"{model}\n{params_text}\n{prompt_hash}".encode("utf-8")).hexdigest()
+
+
+def resolve_chat_model(request):
+    """
+    Return the (chat model, bound kwargs) pair a `prompt | model` chain or a
+    bound model ends with, or (None, {}) for other runnables.
+    """
+    steps = list(getattr(request, "steps", [request]))
+    model, kwargs = steps[-1], {}
+    # Unwrap bind_tools(...) and other RunnableBinding wrappers
+    while not isinstance(model, BaseChatModel) and hasattr(model, "bound"):
+        kwargs = {**getattr(model, "kwargs", {}), **kwargs}
+        model = model.bound
+    if not isinstance(model, BaseChatModel):
+        return None, {}
+    return model, kwargs
+
+
+def model_id(model) -> str:
+    return getattr(model, "model_name", None) or getattr(model, "model", "") or ""
+
+
+def request_cache_key(request, input_data) -> Optional[str]:
+    """
+    Return the cache key for a `prompt | model` chain or a bound model called
+    with `input_data`, or None when the request cannot be cached.
+    """
+    model, kwargs = resolve_chat_model(request)
+    if model is None:
+        return None
+
+    steps = list(getattr(request, "steps", [request]))
+    try:
+        prompt = input_data
+        for step in steps[:-1]:
+            prompt = step.invoke(prompt)
+        return make_cache_key(
+            f"{type(model).__name__}:{model_id(model)}",
+            model._get_llm_string(**kwargs),
+            dumps(prompt),
+        )
+    except Exception:
+        # Unserializable prompts are simply not cached
+        return None
+
+
+class CacheStats:
+    """Hit/miss counters of a cache."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(vars(self))
+
+
+class MemoryCache:
+    """In-process LRU tier."""
+
+    def __init__(self, max_entries: int = 256, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, value = entry
+            if self.ttl is not None and time.time() - created > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> int:
+        """Store a value and return the number of evicted entries."""
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache:
+    """On-disk tier with TTL and size based eviction (least recently used first)."""
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: Optional[float] = None,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            now = time.time()
+            if self.ttl is not None and now - created > self.ttl:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return value
+
+    def set(self, key: str, value: str) -> int:
+        """Store a value and return the number of evicted entries."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            evicted = self._evict(now)
+            self._conn.commit()
+            return evicted
+
+    def _evict(self, now: float) -> int:
+        evicted = 0
+        if self.ttl is not None:
+            evicted += self._conn.execute(
+                "DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,)
+            ).rowcount
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return evicted
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM llm_cache ORDER BY accessed"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+
+class LLMCache:
+    """
+    Two tier response cache: an in-process LRU in front of an optional SQLite
+    store. Disk hits are promoted to the memory tier.
+    """
+
+    def __init__(self, memory: Optional[MemoryCache] = None, disk: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.disk = disk
+        self.stats = CacheStats()
+        # dumps/loads are beta in langchain-core and warn on every call
+        warnings.filterwarnings(
+            "ignore", message=r"The function `(dumps|loads)` is in beta"
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key) if self.memory else None
+        if value is not None:
+            self.stats.hits += 1
+            self.stats.memory_hits += 1
+            return value
+        value = self.disk.get(key) if self.disk else None
+        if value is not None:
+            self.stats.hits += 1
+            self.stats.disk_hits += 1
+            if self.memory:
+                self.stats.evictions += self.memory.set(key, value)
+            return value
+        self.stats.misses += 1
+        return None
+
+    def set(self, key: str, value: str):
+        self.stats.writes += 1
+        if self.memory:
+            self.stats.evictions += self.memory.set(key, value)
+        if self.disk:
+            self.stats.evictions += self.disk.set(key, value)
+
+    async def aget_response(self, key: str):
+        """Return the cached response message for `key` or None."""
+        value = await asyncio.to_thread(self.get, key)
+        return loads(value, **LOADS_OPTIONS) if value is not None else None
+
+    async def aset_response(self, key: str, response):
+        await asyncio.to_thread(self.set, key, dumps(response))
+
+    def collect(self, metrics):
+        """Set the hit/miss counters of the cache, called on each metrics render."""
+        for name, value in self.stats.as_dict().items():
+            metrics.set(
+                f"swe_llm_cache_{name}",
+                value,
+                help=f"LLM response cache {name.replace('_', ' ')} since start",
+            )
+
+    def clear(self):
+        for tier in (self.memory, self.disk):
+            if tier:
+                tier.clear()
@@ -0,0 +1,147 @@
+# Ring-buffered log stream read by the UI from a cursor
+import uuid
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+std_logger = logging.getLogger("swe")
+
+
+def current_thread_id() -> str:
+    """Thread of the graph run the caller is part of, "default" outside a run."""
+    from langchain_core.runnables import ensure_config
+
+    return str(ensure_config().get("configurable", {}).get("thread_id", "default"))
+
+
+class _ThreadLog:
+    def __init__(self, max_entries: int):
+        self.entries = deque(maxlen=max_entries)
+        self.seq = 0
+        # Changes whenever the log of the thread starts over (new process,
+        # evicted thread), cursors of another epoch are stale
+        self.epoch = uuid.uuid4().hex[:12]
+
+
+class LogStream:
+    """
+    Append-only log of the workflow, one log per thread with monotonically
+    increasing sequence numbers. Only the last `max_entries` entries of the
+    last `max_threads` threads are kept, readers ask for the entries after
+    the last sequence number (and epoch) they have seen.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_threads: int = 256):
+        self.max_entries = max_entries
+        self.max_threads = max_threads
+        self._threads: "OrderedDict[str, _ThreadLog]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _thread(self, thread_id: str) -> _ThreadLog:
+        log = self._threads.get(thread_id)
+        if log is None:
+            log = self._threads[thread_id] = _ThreadLog(self.max_entries)
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+        self._threads.move_to_end(thread_id)
+        return log
+
+    def cursor(self, thread_id: str) -> Dict[str, Any]:
+        """Sequence number of the last entry of the thread and its epoch."""
+        with self._lock:
+            log = self._thread(thread_id)
+            return {"cursor": log.seq, "epoch": log.epoch}
+
+    def append(self, thread_id: str, **entry: Any) -> Dict[str, Any]:
+        with self._lock:
+            log = self._thread(thread_id)
+            log.seq += 1
+            entry = {
+                "seq": log.seq,
+                "thread_id": thread_id,
+                "time": datetime.now().isoformat(),
+                **entry,
+            }
+            log.entries.append(entry)
+            return entry
+
+    def read(
+        self,
+        thread_id: str,
+        cursor: int = 0,
+        epoch: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Return the entries of the thread after `cursor`, the cursor and epoch
+        to use for the next read and the number of entries after `cursor`
+        already dropped from the buffer. A cursor of another epoch, or past
+        the last entry, is stale: the thread is read from the start and
+        `reset` tells the reader to drop the entries it has.
+        """
+        with self._lock:
+            log = self._threads.get(thread_id)
+            if log is None:
+                return {
+                    "entries": [],
+                    "cursor": 0,
+                    "epoch": None,
+                    "dropped": 0,
+                    "reset": cursor > 0,
+                }
+            reset = (epoch is not None and epoch != log.epoch) or cursor > log.seq
+            if reset:
+                cursor = 0
+            entries = [entry for entry in log.entries if entry["seq"] > cursor]
+            oldest = log.entries[0]["seq"] if log.entries else log.seq + 1
+            current_epoch = log.epoch
+        if limit is not None:
+            entries = entries[:limit]
+        return {
+            "entries": entries,
+            "cursor": entries[-1]["seq"] if entries else max(cursor, oldest - 1),
+            "epoch": current_epoch,
+            "dropped": max(0, oldest - cursor - 1),
+            "reset": reset,
+        }
+
+
+class StreamLogger:
+    """
+    Workflow logger writing to a LogStream. Entries go to the log of the
+    thread of the current graph run. State only carries the cursor of the
+    thread's log, the UI reads the entries themselves from the stream.
+    """
+
+    def __init__(self, stream: LogStream):
+        self.stream = stream
+
+    def log(self, message: str, level: Any = "info", section: str = "general"):
+        level_name = str(getattr(level, "value", level)).lower()
+        numeric_level = logging.getLevelName(level_name.upper())
+        std_logger.log(
+            numeric_level if isinstance(numeric_level, int) else logging.INFO,
+            "[%s] %s",
+            section,
+            message,
+        )
+        return self.stream.append(
+            current_thread_id(),
+            type="log",
+            message=message,
+            level=level_name,
+            section=section,
+            done=False,
+        )
+
+    def mark_all_done(self, section: str):
+        """Record that every entry of `section` so far is done."""
+        return self.stream.append(
+            current_thread_id(), type="done", section=section, done=True
+        )
+
+    def cursor_state(self) -> Dict[str, Any]:
+        cursor = self.stream.cursor(current_thread_id())
+        return {"log_cursor": cursor["cursor"], "log_epoch": cursor["epoch"]}
@@ -0,0 +1,262 @@
+# Incremental extraction of generated files from a streamed markdown response
+import os
+import re
+from typing import List, NamedTuple, Optional
+
+from sub_graphs.swe.project_data_state import FileInfo
+
+# Fence lines: ```python, ~~~~ or ```python:/src/app.py
+FENCE = re.compile(r"^(`{3,}|~{3,})\s*(.*?)\s*$")
+# Path given in the info string of a fence: python:/src/app.py, title="app.py"
+INFO_PATH = re.compile(r'^[\w+#.-]*:(\S+)$|(?:title|file|filename|path)="?([^"\s]+)')
+# Label before a path: File: /src/app.py
+PATH_LABEL = re.compile(r"^(?:file(?:name)?|path)\s*:\s*", re.IGNORECASE)
+PATH_TOKEN = re.compile(r"^(?:\.{0,2}/)?[\w@+.-]+(?:/[\w@+.-]+)*$")
+NUMBERING = re.compile(r"^\d+[.)]\s*")
+
+
+def message_text(message) -> str:
+    """Return the text of a message or chunk, whatever the provider content format."""
+    content = getattr(message, "content", message)
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in content or []
+    )
+
+
+def make_file_info(file_path: str, code_content: str, current_module: str) -> FileInfo:
+    """Build the FileInfo of an extracted file, cleaning up the heading path."""
+    file_path = file_path.strip()
+
+    # Make sure we get the actual path by removing any extra characters
+    # Path will be like /frontend/README.md
+    if file_path.startswith("/"):
+        clean_path = file_path
+    elif PATH_TOKEN.match(file_path):
+        # Relative path from a heading like ## src/app.py
+        clean_path = "/" + re.sub(r"^\./", "", file_path)
+    else:
+        # In case there are extra characters before the path
+        path_match = re.search(r"(/[\w/.-]+)", file_path)
+        if path_match:
+            clean_path = path_match.group(1)
+        else:
+            # Fallback if no path format is found
+            clean_path = file_path
+
+    # Ensure the path isn't too long
+    if len(clean_path) > 100:
+        # Extract just the filename
+        filename = os.path.basename(clean_path)
+        directory = os.path.dirname(clean_path)
+
+        # If the directory path is too long, shorten it
+        if len(directory) > 50:
+            shortened_dir = directory[:20] + "..." + directory[-20:]
+            clean_path = os.path.join(shortened_dir, filename)
+
+    # Create the module-prefixed path but ensure it's not too long
+    module_path = f"{clean_path}"
+    if len(module_path) > 200:
+        # Keep the important parts - beginning of path and filename
+        module_path = f"/{os.path.basename(clean_path)}"
+
+    return FileInfo(
+        path=module_path,
+        module=current_module,
+        description=f"{current_module} - {os.path.basename(clean_path)}",
+        content=code_content,
+        complete=True,
+    )
+
+
+def heading_path(line: str) -> Optional[str]:
+    """
+    Return the file path named by a heading line, or None.
+
+    Handles the styles models use for file headings: `### 2. **/src/app.py**`,
+    `## src/app.py`, `#### File: `app.py``, `**/src/app.py**`, `File: app.py`,
+    optionally followed by a short description (`- entry point`, `(entry)`).
+    """
+    text = line.strip()
+    is_heading = text.startswith("#")
+    if is_heading:
+        text = text.lstrip("#").strip()
+    elif not text.startswith(("**", "`")) and not PATH_LABEL.match(text):
+        # Only headings, bold or code spans and labels name files, not prose
+        return None
+
+    text = NUMBERING.sub("", text).strip("*` ")
+    text = PATH_LABEL.sub("", text).strip("*` ")
+    if not text:
+        return None
+    path, _, rest = text.partition(" ")
+    path = path.strip("*`:")
+    rest = rest.strip("*`: ")
+    if rest and not (is_heading and rest[0] in "-–—(:"):
+        return None
+    if not PATH_TOKEN.match(path) or not re.search(r"[A-Za-z]", path):
+        return None
+    if "/" not in path and not re.search(r"\.[A-Za-z]\w*$", path):
+        # Bare words need an extension to be a file name
+        return None
+    return path
+
+
+class CodeBlock(NamedTuple):
+    path: Optional[str]
+    language: str
+    code: str
+
+
+class FenceParser:
+    """
+    Single pass markdown fence parser, fed the whole text or chunks of it.
+
+    Lines go through a small state machine (outside a block, in a block), so
+    parsing is linear in the input whatever the fences look like:
+    - ``` and ~~~ fences, a block is closed by a bare fence of the same
+      character at least as long as its opening fence, so ```` blocks can
+      contain ``` blocks;
+    - a fence with a language inside a block of the same fence opens a nested
+      block (a README with shell snippets), closed by the next bare fence;
+    - a block is named by the path of the last file heading before it, or by
+      a path in its info string (```python:/src/app.py).
+    Completed blocks are returned by `feed` as soon as their closing fence is
+    received, unclosed blocks are dropped.
+    """
+
+    def __init__(self):
+        self.blocks: List[CodeBlock] = []
+        self._parts: List[str] = []
+        self._path: Optional[str] = None
+        self._fence: Optional[str] = None
+        self._language = ""
+        self._code: List[str] = []
+        self._depth = 0
+
+    def feed(self, chunk: str) -> List[CodeBlock]:
+        """Consume a chunk and return the blocks completed by it."""
+        if "\n" not in chunk:
+            # Partial line, joined once its end arrives
+            self._parts.append(chunk)
+            return []
+        self._parts.append(chunk)
+        *lines, rest = "".join(self._parts).split("\n")
+        self._parts = [rest] if rest else []
+        completed = []
+        for line in lines:
+            block = self._process_line(line)
+            if block is not None:
+                completed.append(block)
+        self.blocks.extend(completed)
+        return completed
+
+    def finish(self) -> List[CodeBlock]:
+        """Flush the last line once the input is done."""
+        line = "".join(self._parts)
+        self._parts = []
+        if not line:
+            return []
+        block = self._process_line(line)
+        if block is None:
+            return []
+        self.blocks.append(block)
+        return [block]
+
+    def _process_line(self, line: str) -> Optional[CodeBlock]:
+        line = line.rstrip("\r")
+        if self._fence is not None:
+            return self._process_code_line(line)
+
+        fence = FENCE.match(line.lstrip())
+        if fence and not (fence.group(1)[0] == "`" and "`" in fence.group(2)):
+            info = fence.group(2)
+            info_path = INFO_PATH.search(info)
+            if info_path:
+                self._path = info_path.group(1) or info_path.group(2)
+            self._fence = fence.group(1)
+            self._language = re.split(r"[\s:{]", info, maxsplit=1)[0]
+            self._code = []
+            self._depth = 0
+            return None
+
+        if line.lstrip().startswith("#"):
+            # Any heading replaces the pending path, a section heading clears it
+            self._path = heading_path(line)
+            return None
+        path = heading_path(line)
+        if path is not None:
+            self._path = path
+        return None
+
+    def _process_code_line(self, line: str) -> Optional[CodeBlock]:
+        fence = FENCE.match(line.lstrip())
+        if (
+            fence
+            and fence.group(1)[0] == self._fence[0]
+            and len(fence.group(1)) >= len(self._fence)
+        ):
+            if fence.group(2):
+                self._depth += 1
+            elif self._depth:
+                self._depth -= 1
+            else:
+                block = CodeBlock(
+                    self._path,
+                    self._language,
+                    "".join(f"{code}\n" for code in self._code),
+                )
+                self._path, self._fence, self._code = None, None, []
+                return block
+        self._code.append(line)
+        return None
+
+
+def parse_code_blocks(content: str) -> List[CodeBlock]:
+    """Return every closed code block of a markdown text."""
+    parser = FenceParser()
+    parser.feed(content)
+    parser.finish()
+    return parser.blocks
+
+
+def extract_files(content: str, current_module: str) -> List[FileInfo]:
+    """Return the FileInfo of every code block named by a file path."""
+    return [
+        make_file_info(block.path, block.code, current_module)
+        for block in parse_code_blocks(content)
+        if block.path
+    ]
+
+
+class StreamingFileExtractor:
+    """
+    FenceParser fed with response chunks as they arrive, a code block named by
+    a file path is returned by `feed` as a FileInfo once its closing fence is
+    received.
+    """
+
+    def __init__(self, current_module: str):
+        self.current_module = current_module
+        self.files: List[FileInfo] = []
+        self._parser = FenceParser()
+
+    def feed(self, chunk: str) -> List[FileInfo]:
+        """Consume a chunk and return the files completed by it."""
+        return self._files(self._parser.feed(chunk))
+
+    def finish(self) -> List[FileInfo]:
+        """Flush the last line once the stream is done, unclosed blocks are dropped."""
+        return self._files(self._parser.finish())
+
+    def _files(self, blocks: List[CodeBlock]) -> List[FileInfo]:
+        files = [
+            make_file_info(block.path, block.code, self.current_module)
+            for block in blocks
+            if block.path
+        ]
+        self.files.extend(files)
+        return files
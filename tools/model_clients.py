@@ -0,0 +1,245 @@
+# Shared chat models on keep-alive connection pools, one pool per provider
+import sys
+import time
+import importlib
+import threading
+from typing import Any, Dict, Tuple
+
+# Provider: (SDK module, chat model module, chat model class)
+PROVIDERS = {
+    "openai": ("openai", "langchain_openai", "ChatOpenAI"),
+    "anthropic": ("anthropic", "langchain_anthropic", "ChatAnthropic"),
+}
+
+
+def sdk_httpx(sdk):
+    """
+    The httpx package of a provider SDK (the base class of its default client),
+    limits and timeouts must come from the same package as the client.
+    """
+    return sys.modules[sdk.DefaultAsyncHttpxClient.__mro__[1].__module__.split(".")[0]]
+
+
+class ProviderPool:
+    """
+    Sync and async HTTP clients of one provider, shared by all its models so
+    connections and TLS sessions are reused across calls. Counts requests and
+    the connections opened for them through the httpcore trace extension.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        sdk,
+        max_connections: int,
+        max_keepalive: int,
+        keepalive_expiry: float,
+        timeout: float,
+        connect_timeout: float,
+        metrics=None,
+    ):
+        self.provider = provider
+        self.metrics = metrics
+        self.requests = 0
+        self.connections_opened = 0
+        self.connect_seconds = 0.0
+        http = sdk_httpx(sdk)
+        self.timeout = http.Timeout(timeout, connect=connect_timeout)
+        options = {
+            "limits": http.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            "timeout": self.timeout,
+        }
+        self.async_client = sdk.DefaultAsyncHttpxClient(
+            event_hooks={"request": [self._on_async_request]}, **options
+        )
+        self.client = sdk.DefaultHttpxClient(
+            event_hooks={"request": [self._on_request]}, **options
+        )
+
+    def _count_request(self):
+        self.requests += 1
+        if self.metrics is not None:
+            self.metrics.inc(
+                "swe_http_requests_total",
+                1,
+                {"provider": self.provider},
+                help="Requests sent to the model providers",
+            )
+
+    def _on_connect(self, event: str, started: Dict[str, float]):
+        # connect_tcp then start_tls (https) when a new connection is needed
+        if event == "connection.connect_tcp.started":
+            started["at"] = time.perf_counter()
+        elif event == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+            if self.metrics is not None:
+                self.metrics.inc(
+                    "swe_http_connections_opened_total",
+                    1,
+                    {"provider": self.provider},
+                    help="Connections opened to the model providers",
+                )
+        if event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            phase = event.split(".")[1]
+            seconds = time.perf_counter() - started.pop("at", time.perf_counter())
+            started["at"] = time.perf_counter()
+            self.connect_seconds += seconds
+            if self.metrics is not None:
+                self.metrics.observe(
+                    "swe_http_connect_seconds",
+                    seconds,
+                    {"provider": self.provider, "phase": phase},
+                    help="Connection setup time of new provider connections",
+                )
+
+    async def _on_async_request(self, request):
+        self._count_request()
+        started = {}
+
+        async def trace(event, info):
+            self._on_connect(event, started)
+
+        request.extensions["trace"] = trace
+
+    def _on_request(self, request):
+        self._count_request()
+        started = {}
+        request.extensions["trace"] = lambda event, info: self._on_connect(
+            event, started
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        connections = [
+            connection
+            for client in (self.async_client, self.client)
+            for connection in pool_connections(client)
+        ]
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connect_seconds": round(self.connect_seconds, 4),
+            "open_connections": len(connections),
+            "idle_connections": sum(1 for c in connections if c.is_idle()),
+        }
+
+    async def aclose(self):
+        await self.async_client.aclose()
+        self.client.close()
+
+
+def pool_connections(client):
+    """Connections of the default transport of an httpx client, if it has a pool."""
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    return list(getattr(pool, "connections", None) or [])
+
+
+class ModelClientRegistry:
+    """
+    Hands out one chat model per (provider, model, parameters), every model
+    of a provider sends its requests through the provider's ProviderPool.
+    Provider SDKs are imported when their first model is requested.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        keepalive_expiry: float = 60,
+        timeout: float = 120,
+        connect_timeout: float = 10,
+        metrics=None,
+    ):
+        self.pool_options = {
+            "max_connections": max_connections,
+            "max_keepalive": max_keepalive,
+            "keepalive_expiry": keepalive_expiry,
+            "timeout": timeout,
+            "connect_timeout": connect_timeout,
+        }
+        self.metrics = metrics
+        self._pools: Dict[str, ProviderPool] = {}
+        self._models: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+        if metrics is not None:
+            metrics.add_collector(self.collect)
+
+    def pool(self, provider: str) -> ProviderPool:
+        pool = self._pools.get(provider)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(provider)
+                if pool is None:
+                    if provider not in PROVIDERS:
+                        raise ValueError(f"Unknown model provider {provider}")
+                    sdk = importlib.import_module(PROVIDERS[provider][0])
+                    pool = self._pools[provider] = ProviderPool(
+                        provider, sdk, metrics=self.metrics, **self.pool_options
+                    )
+        return pool
+
+    def chat_model(self, provider: str, model: str, **params):
+        """The shared chat model `model` of `provider`, created on first use."""
+        key = (provider, model, tuple(sorted((k, repr(v)) for k, v in params.items())))
+        chat = self._models.get(key)
+        if chat is None:
+            pool = self.pool(provider)
+            with self._lock:
+                chat = self._models.get(key)
+                if chat is None:
+                    chat = self._models[key] = self._create(provider, pool, model, params)
+        return chat
+
+    def _create(self, provider: str, pool: ProviderPool, model: str, params):
+        sdk_name, module_name, class_name = PROVIDERS[provider]
+        chat_class = getattr(importlib.import_module(module_name), class_name)
+        if provider == "openai":
+            params.setdefault("timeout", pool.timeout)
+            return chat_class(
+                model=model,
+                http_client=pool.client,
+                http_async_client=pool.async_client,
+                **params,
+            )
+        # ChatAnthropic takes no HTTP client, its cached SDK clients are
+        # replaced with clients on the shared pool before the first call
+        chat = chat_class(model=model, **params)
+        sdk = importlib.import_module(sdk_name)
+        client_params = dict(chat._client_params)
+        if client_params.get("timeout") is None:
+            client_params["timeout"] = pool.timeout
+        chat.__dict__["_client"] = sdk.Client(**client_params, http_client=pool.client)
+        chat.__dict__["_async_client"] = sdk.AsyncClient(
+            **client_params, http_client=pool.async_client
+        )
+        return chat
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {provider: pool.stats() for provider, pool in self._pools.items()}
+
+    def collect(self, metrics):
+        """Set the connection gauges of every pool, called on each metrics render."""
+        for provider, stats in self.stats().items():
+            labels = {"provider": provider}
+            metrics.set(
+                "swe_http_open_connections",
+                stats["open_connections"],
+                labels,
+                help="Connections held by the provider pools",
+            )
+            metrics.set(
+                "swe_http_idle_connections",
+                stats["idle_connections"],
+                labels,
+                help="Idle keep-alive connections of the provider pools",
+            )
+
+    async def aclose(self):
+        for pool in list(self._pools.values()):
+            await pool.aclose()
+        with self._lock:
+            self._pools.clear()
+            self._models.clear()
@@ -0,0 +1,184 @@
+# Dependency-aware scheduling of module generation
+import re
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from utils.logger import LogLevel
+
+
+class DuplicateModuleError(ValueError):
+    """Several modules of a batch have the same name."""
+
+
+def _plain_name(name: str) -> str:
+    """Module name without markdown emphasis, lowercased."""
+    key = re.sub(r"[*`_]", "", name or "").strip().lower()
+    return re.sub(r"\s+", " ", key)
+
+
+def module_key(name: str) -> str:
+    """
+    Normalize a module name so plan headers and dependency references match.
+    "1. Frontend Components" and "**frontend components**" both become
+    "frontend components".
+    """
+    key = re.sub(r"^(?:module\s+)?\d+(?:\.\d+)*\.?\s*", "", _plain_name(name))
+    key = re.sub(r"\s*\(.*?\)\s*", " ", key)
+    return re.sub(r"\s+", " ", key).strip()
+
+
+def _module_number(name: str) -> str:
+    """
+    Number of a numbered name ("2. Backend") or reference ("Module 2"), names
+    merely starting with a digit ("3D Renderer") have none.
+    """
+    match = re.match(
+        r"^\s*(?:module\s+(\d+)\b|(\d+)\.\s)", name or "", re.IGNORECASE
+    )
+    return (match.group(1) or match.group(2)) if match else ""
+
+
+def _dependency_names(module: Dict[str, Any]) -> List[str]:
+    dependencies = module.get("dependencies") or []
+    if isinstance(dependencies, str):
+        dependencies = re.split(r"[,;\n]", dependencies)
+    return [d.strip() for d in dependencies if d and d.strip()]
+
+
+def check_unique_names(modules: List[Dict[str, Any]]):
+    """Raise DuplicateModuleError when two modules have the same name."""
+    seen, duplicates = set(), set()
+    for module in modules:
+        if module["name"] in seen:
+            duplicates.add(module["name"])
+        seen.add(module["name"])
+    if duplicates:
+        raise DuplicateModuleError(
+            f"Duplicate module names: {', '.join(sorted(duplicates))}"
+        )
+
+
+def _index(modules: List[Dict[str, Any]], key: Callable[[str], str]) -> Dict[str, str]:
+    """Module names by `key` of the name, keys shared by several modules are left out."""
+    names: Dict[str, Set[str]] = {}
+    for module in modules:
+        value = key(module["name"])
+        if value:
+            names.setdefault(value, set()).add(module["name"])
+    return {value: next(iter(n)) for value, n in names.items() if len(n) == 1}
+
+
+def resolve_dependencies(modules: List[Dict[str, Any]]) -> Dict[str, Set[str]]:
+    """
+    Map every module name to the names of the modules it depends on.
+
+    Dependencies are matched against the other modules by exact name (without
+    markdown), by name without its numbering or by module number ("Module 2",
+    "2. Backend"). References to modules that are not part of the batch are
+    ignored, they were either generated earlier or not selected by the user.
+    """
+    from sub_graphs.swe.config import logger
+
+    check_unique_names(modules)
+    indexes = [
+        (_plain_name, _index(modules, _plain_name)),
+        (module_key, _index(modules, module_key)),
+        (_module_number, _index(modules, _module_number)),
+    ]
+
+    graph = {}
+    for module in modules:
+        resolved = set()
+        for dependency in _dependency_names(module):
+            name = next(
+                (
+                    index[key(dependency)]
+                    for key, index in indexes
+                    if key(dependency) in index
+                ),
+                None,
+            )
+            if name is None:
+                logger.log(
+                    f"Unresolved dependency {dependency!r} of {module['name']}",
+                    level=LogLevel.WARNING,
+                    section="module",
+                )
+            elif name != module["name"]:
+                resolved.add(name)
+        graph[module["name"]] = resolved
+    return graph
+
+
+def topological_waves(
+    modules: List[Dict[str, Any]], graph: Optional[Dict[str, Set[str]]] = None
+) -> List[List[Dict[str, Any]]]:
+    """
+    Group modules into waves where every module only depends on modules of
+    earlier waves. Modules of the same wave can be generated concurrently.
+
+    Modules that are part of a dependency cycle are put together in a final
+    wave so that a malformed plan never blocks generation. Raises
+    DuplicateModuleError when module names are not unique. `graph` is the
+    result of resolve_dependencies when the caller already has it.
+    """
+    if graph is None:
+        graph = resolve_dependencies(modules)
+    by_name = {m["name"]: m for m in modules}
+    remaining = {name: set(deps) for name, deps in graph.items()}
+
+    waves = []
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            ready = list(remaining)
+        waves.append([by_name[name] for name in ready])
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return waves
+
+
+async def run_in_waves(
+    modules: List[Dict[str, Any]],
+    worker: Callable[[Dict[str, Any]], Awaitable[Any]],
+    concurrency: int = 4,
+) -> Tuple[List[Tuple[Dict[str, Any], Any]], List[Tuple[Dict[str, Any], Exception]], List[Dict[str, Any]]]:
+    """
+    Run `worker` over every module, wave by wave, with at most `concurrency`
+    modules in flight.
+
+    Returns (completed, failed, deferred): completed holds (module, result)
+    pairs, failed holds (module, exception) pairs and deferred lists the
+    modules that were skipped because one of their dependencies failed.
+    """
+    graph = resolve_dependencies(modules)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def bounded(module):
+        async with semaphore:
+            return await worker(module)
+
+    completed, failed, deferred = [], [], []
+    broken = set()
+    for wave in topological_waves(modules, graph):
+        runnable = []
+        for module in wave:
+            if graph[module["name"]] & broken:
+                broken.add(module["name"])
+                deferred.append(module)
+            else:
+                runnable.append(module)
+
+        results = await asyncio.gather(
+            *(bounded(module) for module in runnable), return_exceptions=True
+        )
+        for module, result in zip(runnable, results):
+            if isinstance(result, Exception):
+                broken.add(module["name"])
+                failed.append((module, result))
+            else:
+                completed.append((module, result))
+
+    return completed, failed, deferred
@@ -0,0 +1,260 @@
+# Adaptive rate limiting and retry/backoff for provider calls
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+RETRYABLE_ERROR_NAMES = (
+    "RateLimit",
+    "Timeout",
+    "Connection",
+    "Overloaded",
+    "InternalServer",
+    "ServiceUnavailable",
+)
+
+
+def status_code(exc: Exception) -> Optional[int]:
+    """Return the HTTP status code carried by a provider SDK exception."""
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_rate_limited(exc: Exception) -> bool:
+    return status_code(exc) == 429 or "RateLimit" in type(exc).__name__
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Rate limits, overloads, timeouts and connection errors are retried."""
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+    return any(name in type(exc).__name__ for name in RETRYABLE_ERROR_NAMES)
+
+
+def retry_after(exc: Exception) -> Optional[float]:
+    """Return the delay requested by the provider in seconds, if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+class TokenBucket:
+    """Bucket refilled continuously at `per_minute` units per minute."""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.capacity = per_minute
+        self.available = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, rate: float):
+        now = time.monotonic()
+        capacity = self.per_minute * rate
+        self.available = min(
+            capacity, self.available + (now - self.updated) * capacity / 60
+        )
+        self.updated = now
+
+    def wait_time(self, amount: float, rate: float) -> float:
+        """Seconds until `amount` units are available at the current rate."""
+        self._refill(rate)
+        # Requests larger than the bucket only wait for a full bucket
+        amount = min(amount, self.per_minute * rate)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) * 60 / (self.per_minute * rate)
+
+    def take(self, amount: float):
+        self.available -= amount
+
+
+class AdaptiveRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limiter with bounded concurrency.
+
+    The effective rate backs off multiplicatively when the provider throttles
+    and recovers additively on successful calls, so sustained load settles just
+    below the real provider limit instead of failing runs.
+    """
+
+    def __init__(
+        self,
+        rpm: float,
+        tpm: float,
+        max_concurrency: int = 8,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        min_rate: float = 0.1,
+    ):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_rate = min_rate
+        self.rate = 1.0
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "waited": 0.0}
+
+    async def _acquire_budget(self, tokens: float):
+        async with self._lock:
+            while True:
+                wait = max(
+                    self.paused_until - time.monotonic(),
+                    self.requests.wait_time(1, self.rate),
+                    self.tokens.wait_time(tokens, self.rate),
+                )
+                if wait <= 0:
+                    break
+                self.stats["waited"] += wait
+                await asyncio.sleep(wait)
+            self.requests.take(1)
+            self.tokens.take(min(tokens, self.tokens.per_minute * self.rate))
+
+    def record_tokens(self, difference: float):
+        """Correct the token budget once the real usage of a call is known."""
+        self.tokens.take(difference)
+
+    def on_success(self):
+        self.rate = min(1.0, self.rate + 0.05)
+
+    def on_throttle(self, delay: Optional[float]):
+        self.stats["throttled"] += 1
+        self.rate = max(self.min_rate, self.rate / 2)
+        if delay:
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+    def backoff(self, attempt: int, exc: Exception) -> float:
+        """Jittered exponential backoff that never undercuts retry-after."""
+        delay = min(self.max_delay, self.base_delay * 2**attempt)
+        delay = random.uniform(delay / 2, delay)
+        requested = retry_after(exc)
+        return max(delay, requested) if requested is not None else delay
+
+    async def _retry_delay(self, attempt: int, e: Exception, on_retry) -> None:
+        """Wait before the next attempt, or re-raise when `e` is final."""
+        if not is_retryable(e) or attempt >= self.max_retries:
+            raise e
+        delay = self.backoff(attempt, e)
+        if is_rate_limited(e):
+            self.on_throttle(retry_after(e))
+        self.stats["retries"] += 1
+        if on_retry:
+            on_retry(attempt + 1, e, delay)
+        await asyncio.sleep(delay)
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[Any]],
+        tokens: float = 0,
+        on_retry: Optional[Callable[[int, Exception, float], None]] = None,
+    ) -> Any:
+        """Run `call` within the limits, retrying retryable provider errors."""
+        attempt = 0
+        while True:
+            await self._acquire_budget(tokens)
+            try:
+                async with self.semaphore:
+                    self.stats["calls"] += 1
+                    result = await call()
+                self.on_success()
+                return result
+            except Exception as e:
+                await self._retry_delay(attempt, e, on_retry)
+                attempt += 1
+
+    async def stream(
+        self,
+        open_stream: Callable[[], AsyncIterator[Any]],
+        tokens: float = 0,
+        on_retry: Optional[Callable[[int, Exception, float], None]] = None,
+    ) -> AsyncIterator[Any]:
+        """
+        Stream the chunks of `open_stream()` within the limits. Errors are
+        retried until the first chunk arrives, the concurrency slot is held
+        until the stream is exhausted.
+        """
+        attempt = 0
+        while True:
+            await self._acquire_budget(tokens)
+            await self.semaphore.acquire()
+            try:
+                self.stats["calls"] += 1
+                stream = open_stream().__aiter__()
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                self.semaphore.release()
+                return
+            except Exception as e:
+                self.semaphore.release()
+                await self._retry_delay(attempt, e, on_retry)
+                attempt += 1
+                continue
+
+            try:
+                self.on_success()
+                yield first
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                self.semaphore.release()
+            return
+
+
+class RateLimiterRegistry:
+    """Shares one limiter per provider/model key."""
+
+    def __init__(self, limits: Dict[str, Dict[str, float]], **defaults):
+        self.limits = limits
+        self.defaults = defaults
+        self._limiters: Dict[str, AdaptiveRateLimiter] = {}
+
+    def get(self, provider: str, model: str) -> AdaptiveRateLimiter:
+        key = f"{provider}:{model}"
+        if key not in self._limiters:
+            limits = self.limits.get(key) or self.limits.get(provider) or {}
+            self._limiters[key] = AdaptiveRateLimiter(
+                rpm=limits.get("rpm", 60),
+                tpm=limits.get("tpm", 100_000),
+                **self.defaults,
+            )
+        return self._limiters[key]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            key: {**limiter.stats, "rate": limiter.rate}
+            for key, limiter in self._limiters.items()
+        }
+
+    def collect(self, metrics):
+        """Set the counters and rate of every limiter, called on each metrics render."""
+        descriptions = {
+            "calls": "Calls started through the rate limiter",
+            "retries": "Calls retried after a throttled or transient error",
+            "throttled": "Calls throttled by the provider",
+            "waited": "Seconds waited for the rate budget",
+            "rate": "Current fraction of the configured rate (AIMD)",
+        }
+        for key, stats in self.stats().items():
+            for name, help in descriptions.items():
+                metrics.set(
+                    f"swe_rate_limiter_{name}", stats[name], {"limiter": key}, help=help
+                )
@@ -0,0 +1,350 @@
+# Pool of pre-started swe-rex sandboxes leased to build and run generated projects
+import os
+import time
+import uuid
+import shlex
+import asyncio
+import tempfile
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, NamedTuple, Optional
+
+SESSION = "default"
+# The local runtime drives bash with blocking pexpect calls that fail when
+# run from several threads at once, its calls are made one at a time
+_local_runtime = threading.Lock()
+# Time left for the reset of a sandbox, the bash startup and cleanup commands
+SETUP_TIMEOUT = 30
+
+
+class SandboxLimits(NamedTuple):
+    """
+    Per-sandbox limits. `timeout` is the wall time of a whole lease. Docker
+    sandboxes get `cpus` and `memory_mb` as container limits, local ones run
+    their session under `ulimit -t` (CPU seconds of the lease at `cpus`).
+    """
+
+    cpus: float = 1
+    memory_mb: int = 2048
+    timeout: float = 300
+
+
+class SandboxTimeout(Exception):
+    """The lease of a sandbox ran out of time."""
+
+
+def deployment_config(
+    backend: str, image: str, limits: SandboxLimits, volumes: Dict[str, str]
+):
+    from swerex.deployment.config import DockerDeploymentConfig, LocalDeploymentConfig
+
+    if backend == "local":
+        return LocalDeploymentConfig()
+    if backend == "docker":
+        return DockerDeploymentConfig(
+            image=image,
+            docker_args=[
+                f"--cpus={limits.cpus:g}",
+                f"--memory={limits.memory_mb}m",
+                f"--memory-swap={limits.memory_mb}m",
+                *(
+                    f"--volume={os.path.abspath(host)}:{path}"
+                    for host, path in volumes.items()
+                ),
+            ],
+        )
+    raise ValueError(f"Unknown sandbox backend {backend}")
+
+
+class Sandbox:
+    """
+    A started deployment with a bash session in `workdir`, leased to one
+    project at a time and reset between leases.
+    """
+
+    def __init__(
+        self,
+        backend: str,
+        image: str,
+        limits: SandboxLimits,
+        root: str,
+        volumes: Optional[Dict[str, str]] = None,
+    ):
+        self.id = uuid.uuid4().hex[:8]
+        self.backend = backend
+        self.limits = limits
+        self.deployment = deployment_config(
+            backend, image, limits, volumes or {}
+        ).get_deployment()
+        if backend == "local":
+            self.workdir = os.path.abspath(os.path.join(root, self.id))
+        else:
+            self.workdir = "/workspace"
+        self.uses = 0
+        self.deadline: Optional[float] = None
+
+    @property
+    def runtime(self):
+        return self.deployment.runtime
+
+    async def _call(self, method: str, request):
+        """
+        Call a runtime method. Local runtime calls block, they run in a
+        worker thread to keep the event loop free.
+        """
+        call = getattr(self.runtime, method)
+        if self.backend == "local":
+            return await asyncio.to_thread(_call_local, call, request)
+        return await call(request)
+
+    async def start(self):
+        await self.deployment.start()
+        await self._open_session()
+
+    async def _open_session(self):
+        from swerex.runtime.abstract import CreateBashSessionRequest
+
+        await self._call(
+            "create_session",
+            CreateBashSessionRequest(session=SESSION, startup_timeout=SETUP_TIMEOUT),
+        )
+        workdir = shlex.quote(self.workdir)
+        setup = f"mkdir -p {workdir} && cd {workdir}"
+        if self.backend == "local":
+            cpu_seconds = int(self.limits.timeout * self.limits.cpus) + 1
+            setup += f" && ulimit -t {cpu_seconds}"
+        await self._run(setup, SETUP_TIMEOUT, check="raise")
+
+    async def _run(self, command: str, timeout: float, check: str = "silent"):
+        from swerex.runtime.abstract import BashAction
+
+        return await self._call(
+            "run_in_session",
+            BashAction(command=command, session=SESSION, timeout=timeout, check=check),
+        )
+
+    def remaining(self) -> float:
+        if self.deadline is None:
+            return self.limits.timeout
+        return self.deadline - time.monotonic()
+
+    async def run(self, command: str, timeout: Optional[float] = None):
+        """
+        Run `command` in the session, returns the BashObservation (output,
+        exit_code). Commands share the time limit of the lease.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise SandboxTimeout(f"Sandbox {self.id} is out of time")
+        try:
+            return await self._run(command, min(timeout or remaining, remaining))
+        except Exception as e:
+            if "Timeout" in type(e).__name__:
+                raise SandboxTimeout(f"{command} timed out in sandbox {self.id}") from e
+            raise
+
+    async def upload(self, source_path: str, target: Optional[str] = None) -> str:
+        """
+        Copy a local file or directory to `target` (its name by default) in
+        the working directory, returns the path in the sandbox.
+        """
+        from swerex.runtime.abstract import UploadRequest
+
+        source_path = os.path.abspath(source_path)
+        target_path = os.path.join(self.workdir, target or os.path.basename(source_path))
+        await self._call(
+            "upload", UploadRequest(source_path=source_path, target_path=target_path)
+        )
+        return target_path
+
+    async def reset(self):
+        """
+        Kill what the last lease left running and start a new session on an
+        empty working directory. The deployment itself is kept.
+        """
+        from swerex.runtime.abstract import CloseBashSessionRequest
+
+        try:
+            await self._run('kill -9 $(jobs -p) 2>/dev/null; cd /', 5)
+        except Exception:
+            # A timed out command may still hold the session, it is closed anyway
+            pass
+        await self._call("close_session", CloseBashSessionRequest(session=SESSION))
+        workdir = shlex.quote(self.workdir)
+        await self._call("execute", _command(f"rm -rf {workdir} && mkdir -p {workdir}"))
+        await self._open_session()
+
+    async def stop(self):
+        if self.backend != "local":
+            await self.deployment.stop()
+            return
+        try:
+            await asyncio.to_thread(_call_local, self.deployment.stop)
+        finally:
+            await asyncio.to_thread(_remove_tree, self.workdir)
+
+
+def _call_local(call, *args):
+    with _local_runtime:
+        return asyncio.run(call(*args))
+
+
+def _command(command: str):
+    from swerex.runtime.abstract import Command
+
+    return Command(command=command, shell=True, timeout=SETUP_TIMEOUT, check=True)
+
+
+def _remove_tree(path: str):
+    import shutil
+
+    shutil.rmtree(path, ignore_errors=True)
+
+
+class SandboxPool:
+    """
+    Keeps `size` sandboxes started and ready. `lease()` hands one out, resets
+    it when it comes back and replaces it when the reset fails or it reached
+    `max_uses`, so callers never wait for a deployment to start unless all
+    sandboxes are leased. Sandboxes are started on the first lease.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        backend: str = "local",
+        image: str = "node:20",
+        limits: SandboxLimits = SandboxLimits(),
+        max_uses: int = 20,
+        root: Optional[str] = None,
+        volumes: Optional[Dict[str, str]] = None,
+        metrics=None,
+    ):
+        self.size = max(1, size)
+        self.backend = backend
+        self.image = image
+        self.limits = limits
+        self.max_uses = max_uses
+        self.root = root or os.path.join(tempfile.gettempdir(), "swe-sandboxes")
+        # Host directories mounted in docker sandboxes, {host path: sandbox path}
+        self.volumes = volumes or {}
+        self.metrics = metrics
+        self._ready: Optional[asyncio.Queue] = None
+        self._sandboxes: Dict[str, Sandbox] = {}
+        self._tasks = set()
+        self._starting = 0
+        self._lock: Optional[asyncio.Lock] = None
+        self.leases = 0
+        self.replaced = 0
+
+    async def start(self):
+        """Start the sandboxes of the pool, called by the first lease."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._ready is not None:
+                return
+            self._ready = asyncio.Queue()
+            self._starting += self.size
+            errors = await asyncio.gather(*(self._add() for _ in range(self.size)))
+            if not self._sandboxes:
+                self._ready = None
+                raise errors[0]
+
+    async def _add(self) -> Optional[Exception]:
+        """Start a sandbox and make it ready, returns the error if it failed."""
+        # _starting is counted by the caller, before the task runs
+        sandbox = Sandbox(
+            self.backend, self.image, self.limits, self.root, self.volumes
+        )
+        try:
+            await sandbox.start()
+        except Exception as e:
+            # Started again by the next lease
+            print(f"Error starting sandbox {sandbox.id}: {e}")
+            await self._discard(sandbox)
+            return e
+        finally:
+            self._starting -= 1
+        self._sandboxes[sandbox.id] = sandbox
+        self._ready.put_nowait(sandbox)
+        return None
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _replace(self):
+        self._starting += 1
+        self._spawn(self._add())
+        self.replaced += 1
+
+    async def _discard(self, sandbox: Sandbox):
+        self._sandboxes.pop(sandbox.id, None)
+        try:
+            await sandbox.stop()
+        except Exception as e:
+            print(f"Error stopping sandbox {sandbox.id}: {e}")
+
+    @asynccontextmanager
+    async def lease(self):
+        """Lease a ready sandbox for one project, e.g. `async with pool.lease() as sandbox`."""
+        if self._ready is None:
+            await self.start()
+        while len(self._sandboxes) + self._starting < self.size:
+            self._replace()
+        started = time.perf_counter()
+        try:
+            sandbox = await asyncio.wait_for(self._ready.get(), self.limits.timeout)
+        except asyncio.TimeoutError:
+            raise SandboxTimeout(f"No sandbox ready after {self.limits.timeout}s")
+        waited = time.perf_counter() - started
+        self.leases += 1
+        if self.metrics is not None:
+            self.metrics.observe(
+                "swe_sandbox_lease_wait_seconds",
+                waited,
+                {"backend": self.backend},
+                help="Time waited for a ready sandbox",
+            )
+        sandbox.uses += 1
+        sandbox.deadline = time.monotonic() + self.limits.timeout
+        try:
+            yield sandbox
+        finally:
+            # Reset in the background, the sandbox is ready again after it
+            sandbox.deadline = None
+            self._spawn(self._release(sandbox))
+
+    async def _release(self, sandbox: Sandbox):
+        if sandbox.uses < self.max_uses:
+            try:
+                await sandbox.reset()
+            except Exception as e:
+                print(f"Error resetting sandbox {sandbox.id}: {e}")
+            else:
+                self._ready.put_nowait(sandbox)
+                return
+        # Replaced first so a lease meanwhile does not start another one
+        self._replace()
+        await self._discard(sandbox)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "ready": self._ready.qsize() if self._ready is not None else 0,
+            "started": len(self._sandboxes),
+            "starting": self._starting,
+            "leases": self.leases,
+            "replaced": self.replaced,
+        }
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        sandboxes: List[Sandbox] = list(self._sandboxes.values())
+        await asyncio.gather(
+            *(self._discard(sandbox) for sandbox in sandboxes), return_exceptions=True
+        )
+        self._ready = None
@@ -0,0 +1,171 @@
+# Delta-encoded, coalesced state emission to the frontend
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+def to_jsonable(value: Any) -> Any:
+    """Convert state values (pydantic models, messages, ...) to plain JSON data."""
+
+    def default(obj):
+        if hasattr(obj, "model_dump"):
+            return obj.model_dump()
+        if hasattr(obj, "dict"):
+            return obj.dict()
+        return str(obj)
+
+    return json.loads(json.dumps(value, default=default))
+
+
+def _pointer(path: str, key: Any) -> str:
+    return f"{path}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+
+def json_diff(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """
+    Return the JSON-patch (RFC 6902) operations turning `old` into `new`.
+    Lists are diffed item by item plus "add" operations for appended items,
+    unless most items changed (e.g. an insert at the front) or the list shrank,
+    then the list is replaced.
+    """
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": _pointer(path, key)})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": _pointer(path, key), "value": value})
+            else:
+                ops.extend(json_diff(old[key], value, _pointer(path, key)))
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and len(new) >= len(old):
+        changed = [i for i in range(len(old)) if old[i] != new[i]]
+        if len(changed) * 2 <= len(old):
+            ops = []
+            for i in changed:
+                ops.extend(json_diff(old[i], new[i], _pointer(path, i)))
+            for i in range(len(old), len(new)):
+                ops.append({"op": "add", "path": _pointer(path, i), "value": new[i]})
+            return ops
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+class _ThreadEmission:
+    def __init__(self):
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self.pending: Dict[str, Any] = {}
+        self.config = None
+        self.seq = 0
+        self.last_sent = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+
+class StateEmitter:
+    """
+    Sends state to the frontend as JSON-patch deltas against the last frame
+    emitted for the thread. Emits arriving within `window` seconds of the last
+    frame are merged into a single trailing frame.
+
+    Frames are emitted as {"state_patch": {"seq": n, "ops": [...]}}, the first
+    frame of a thread replaces the whole state ("path": ""), it only holds the
+    full state when the thread was reset with it.
+    """
+
+    def __init__(
+        self,
+        emit: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        window: float = 0.05,
+        max_threads: int = 1024,
+    ):
+        self._emit = emit
+        self.window = window
+        self.max_threads = max_threads
+        self._threads: "OrderedDict[str, _ThreadEmission]" = OrderedDict()
+        self.stats = {"emits": 0, "frames": 0, "bytes": 0}
+
+    @staticmethod
+    def _thread_id(config) -> str:
+        return str((config or {}).get("configurable", {}).get("thread_id", "default"))
+
+    def _thread(self, config) -> _ThreadEmission:
+        thread_id = self._thread_id(config)
+        thread = self._threads.get(thread_id)
+        if thread is None:
+            thread = self._threads[thread_id] = _ThreadEmission()
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+        self._threads.move_to_end(thread_id)
+        return thread
+
+    async def emit(self, config, state: Dict[str, Any]):
+        """Queue `state` (a partial state update) for the thread of `config`."""
+        self.stats["emits"] += 1
+        thread = self._thread(config)
+        thread.pending.update(to_jsonable(state))
+        thread.config = config
+        if thread.task is not None:
+            return
+        delay = thread.last_sent + self.window - time.monotonic()
+        if delay <= 0:
+            await self._flush(thread)
+        else:
+            thread.task = asyncio.create_task(self._flush_later(thread, delay))
+
+    async def flush(self, config):
+        """
+        Send the pending updates of the thread of `config` right away, called
+        when a node returns so its last frame goes out before the next node
+        (or an interrupt) and is not left to a detached task.
+        """
+        thread = self._threads.get(self._thread_id(config))
+        if thread is None:
+            return
+        if thread.task is not None:
+            thread.task.cancel()
+            thread.task = None
+        await self._flush(thread)
+
+    def reset(self, config, state: Optional[Dict[str, Any]] = None):
+        """
+        Forget the last frame, the next frame replaces the whole state of the
+        client. Called with the full graph `state` when a run starts or a
+        client resumes the thread, the frame carries it with the updates
+        emitted after the reset.
+        """
+        thread = self._threads.pop(self._thread_id(config), None)
+        if thread is not None and thread.task is not None:
+            thread.task.cancel()
+        if state is not None:
+            thread = self._thread(config)
+            thread.pending = to_jsonable(dict(state))
+            thread.config = config
+
+    async def _flush_later(self, thread: _ThreadEmission, delay: float):
+        await asyncio.sleep(delay)
+        thread.task = None
+        await self._flush(thread)
+
+    async def _flush(self, thread: _ThreadEmission):
+        if not thread.pending:
+            return
+        if thread.snapshot is None:
+            target = dict(thread.pending)
+            ops = [{"op": "replace", "path": "", "value": target}]
+        else:
+            target = {**thread.snapshot, **thread.pending}
+            ops = json_diff(thread.snapshot, target)
+        thread.pending = {}
+        thread.last_sent = time.monotonic()
+        if not ops:
+            return
+        thread.snapshot = target
+        thread.seq += 1
+        frame = {"state_patch": {"seq": thread.seq, "ops": ops}}
+        self.stats["frames"] += 1
+        self.stats["bytes"] += len(json.dumps(frame))
+        await self._emit(thread.config, frame)
@@ -1,28 +1,72 @@
+# Build and run a generated project in a sandbox leased from the pool
+import sys
+import shlex
 import asyncio
-from swerex.deployment.local import LocalDeployment
-from swerex.runtime.abstract import CreateBashSessionRequest, BashAction
+from typing import Dict, List, Optional
 
+from sub_graphs.swe.tools.dependency_cache import DependencyCache
+from sub_graphs.swe.tools.sandbox_pool import SandboxPool, SandboxTimeout
 
-async def run_express_app():
-    deployment = LocalDeployment()
-    await deployment.start()
-    runtime = deployment.runtime
+# Exit status of `timeout` when the command was still running
+STILL_RUNNING = 124
 
-    # Create a bash session
-    await runtime.create_session(CreateBashSessionRequest())
 
-    # Navigate to the directory containing app.js
-    await runtime.run_in_session(
-        BashAction(
-            command="cd /Users/macbook/machine-learning/projects/swe/agent/sub_graphs/swe/app"
-        )
+async def run_express_app(
+    project_dir: str,
+    pool: Optional[SandboxPool] = None,
+    dependencies: Optional[DependencyCache] = None,
+    start: str = "node app.js",
+    startup_seconds: float = 10,
+) -> Dict:
+    """
+    Install the dependencies of `project_dir` (from the dependency cache when
+    its manifest did not change) and start the app in a leased sandbox. The
+    app passes when it is still running after `startup_seconds` (a server) or
+    exits with status 0.
+    """
+    if pool is None:
+        from sub_graphs.swe.config import sandbox_pool as pool
+    if dependencies is None:
+        from sub_graphs.swe.config import get_dependency_cache
+
+        dependencies = get_dependency_cache()
+
+    steps: List[Dict] = []
+    async with pool.lease() as sandbox:
+        path = await sandbox.upload(project_dir)
+        try:
+            steps.append(await dependencies.install(sandbox, project_dir, path))
+        except SandboxTimeout as e:
+            steps.append({"command": "install", "exit_code": None, "output": str(e)})
+        if steps[-1]["exit_code"] != 0:
+            return {"success": False, "steps": steps}
+        command = f"cd {shlex.quote(path)} && timeout {startup_seconds:g} {start}"
+        try:
+            observation = await sandbox.run(command)
+        except SandboxTimeout as e:
+            steps.append({"command": command, "exit_code": None, "output": str(e)})
+            return {"success": False, "steps": steps}
+    steps.append(
+        {
+            "command": command,
+            "exit_code": observation.exit_code,
+            "output": observation.output,
+        }
     )
+    return {"success": observation.exit_code in (0, STILL_RUNNING), "steps": steps}
+
 
-    # Install npm packages
-    await runtime.run_in_session(BashAction(command="npm install"))
+async def main(project_dir: str):
+    from sub_graphs.swe.config import sandbox_pool
 
-    # Run the Express.js application
-    await runtime.run_in_session(BashAction(command="node app.js"))
+    try:
+        result = await run_express_app(project_dir, sandbox_pool)
+        for step in result["steps"]:
+            print(f"$ {step['command']} -> {step['exit_code']}\n{step['output']}")
+        print("success" if result["success"] else "failed")
+    finally:
+        await sandbox_pool.close()
 
 
-asyncio.run(run_express_app())
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "app"))
@@ -0,0 +1,351 @@
+# Spans and metrics for graph nodes and LLM calls
+import os
+import json
+import time
+import uuid
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.runnables.config import ensure_config
+from langgraph.errors import GraphBubbleUp
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("swe_span", default=None)
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def thread_id_of(config) -> Optional[str]:
+    thread_id = (config or {}).get("configurable", {}).get("thread_id")
+    return None if thread_id is None else str(thread_id)
+
+
+class Span:
+    """A timed operation, `kind` is "node" or "llm"."""
+
+    def __init__(self, name: str, kind: str, parent: Optional["Span"], attributes):
+        self.name = name
+        self.kind = kind
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent else None
+        self.attributes: Dict[str, Any] = {}
+        if parent and "thread_id" in parent.attributes:
+            self.attributes["thread_id"] = parent.attributes["thread_id"]
+        self.attributes.update(
+            {key: value for key, value in attributes.items() if value is not None}
+        )
+        self.status = "ok"
+        self.start = time.time()
+        self._start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.time_to_first_token: Optional[float] = None
+        self.otel_span = None
+
+    def set(self, **attributes):
+        self.attributes.update(
+            {key: value for key, value in attributes.items() if value is not None}
+        )
+
+    def mark_first_token(self):
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self._start
+
+    def record_usage(self, response):
+        """Record the token usage reported with an LLM response."""
+        usage = getattr(response, "usage_metadata", None) or {}
+        self.set(
+            input_tokens=usage.get("input_tokens"),
+            output_tokens=usage.get("output_tokens"),
+        )
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.duration = time.perf_counter() - self._start
+        if isinstance(error, GraphBubbleUp):
+            # Interrupts and parent commands are control flow, not failures
+            self.status = "interrupted"
+        elif error is not None:
+            self.status = "error"
+            self.set(error=f"{type(error).__name__}: {str(error)[:200]}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": self.duration,
+            "time_to_first_token": self.time_to_first_token,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Metrics:
+    """Counters, gauges and histograms rendered in the Prometheus text format."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        self._gauges: Dict[Tuple[str, tuple], float] = {}
+        self._histograms: Dict[Tuple[str, tuple], List[float]] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._collectors: List = []
+        self._lock = threading.Lock()
+
+    def add_collector(self, collect):
+        """Call `collect(metrics)` before every render, e.g. to set gauges."""
+        self._collectors.append(collect)
+
+    def inc(self, name: str, value: float = 1, labels=None, help: str = ""):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._help.setdefault(name, ("counter", help))
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, labels=None, help: str = ""):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._help.setdefault(name, ("gauge", help))
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, labels=None, help: str = ""):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._help.setdefault(name, ("histogram", help))
+            # Bucket counts followed by the sum and the count
+            series = self._histograms.setdefault(key, [0] * (len(self.buckets) + 2))
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> str:
+        def labels_text(labels, extra=()):
+            items = [*labels, *extra]
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+        for collect in list(self._collectors):
+            try:
+                collect(self)
+            except Exception as e:
+                print(f"Metrics collector error: {e}")
+
+        lines = []
+        with self._lock:
+            for name, (kind, help) in sorted(self._help.items()):
+                if help:
+                    lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind in ("counter", "gauge"):
+                    values = self._counters if kind == "counter" else self._gauges
+                    for (metric, labels), value in sorted(values.items()):
+                        if metric == name:
+                            lines.append(f"{name}{labels_text(labels)} {value:g}")
+                    continue
+                for (metric, labels), series in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, series):
+                        cumulative += count
+                        lines.append(
+                            f"{name}_bucket{labels_text(labels, [('le', f'{bound:g}')])} {cumulative}"
+                        )
+                    lines.append(
+                        f"{name}_bucket{labels_text(labels, [('le', '+Inf')])} {series[-1]}"
+                    )
+                    lines.append(f"{name}_sum{labels_text(labels)} {series[-2]:g}")
+                    lines.append(f"{name}_count{labels_text(labels)} {series[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class JSONLSink:
+    """Appends every finished span as a JSON line to `path`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def on_start(self, span: Span):
+        pass
+
+    def on_end(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class OTelSink:
+    """
+    Mirrors spans to OpenTelemetry. The exporter is configured with the
+    standard OTEL_* environment variables (e.g. OTEL_EXPORTER_OTLP_ENDPOINT).
+    """
+
+    def __init__(self, service_name: str = "swe-agent"):
+        from opentelemetry import trace
+
+        self._trace = trace
+        self._status = trace.Status
+        self._status_code = trace.StatusCode
+        if not hasattr(trace.get_tracer_provider(), "add_span_processor"):
+            # No SDK provider configured by the application, set up OTLP export
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+                OTLPSpanExporter,
+            )
+
+            provider = TracerProvider(
+                resource=Resource.create({"service.name": service_name})
+            )
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            trace.set_tracer_provider(provider)
+        self._tracer = trace.get_tracer("swe")
+
+    def on_start(self, span: Span):
+        parent = _current_span.get()
+        context = None
+        if parent is not None and parent.otel_span is not None:
+            context = self._trace.set_span_in_context(parent.otel_span)
+        span.otel_span = self._tracer.start_span(
+            f"{span.kind} {span.name}",
+            context=context,
+            start_time=int(span.start * 1e9),
+        )
+
+    def on_end(self, span: Span):
+        otel_span = span.otel_span
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            otel_span.set_attribute(f"swe.{key}", value)
+        if span.time_to_first_token is not None:
+            otel_span.set_attribute("swe.time_to_first_token", span.time_to_first_token)
+        if span.status == "error":
+            otel_span.set_status(
+                self._status(self._status_code.ERROR, span.attributes.get("error"))
+            )
+        otel_span.end(end_time=int((span.start + span.duration) * 1e9))
+
+
+class Tracer:
+    """
+    Creates node and LLM spans, forwards them to the sinks and aggregates
+    them into `metrics`. Spans opened inside a span become its children.
+    """
+
+    def __init__(self, sinks=(), metrics: Optional[Metrics] = None):
+        self.sinks = list(sinks)
+        self.metrics = metrics or Metrics()
+
+    def start_span(self, name: str, kind: str = "internal", **attributes) -> Span:
+        """Start a span without making it the parent of the spans opened after it."""
+        span = Span(name, kind, _current_span.get(), attributes)
+        for sink in self.sinks:
+            self._call(sink.on_start, span)
+        return span
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None):
+        span.finish(error)
+        self._call(self._record_metrics, span)
+        for sink in self.sinks:
+            self._call(sink.on_end, span)
+
+    def annotate(self, **attributes):
+        """Set attributes on the current span, if any."""
+        span = _current_span.get()
+        if span is not None:
+            span.set(**attributes)
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", **attributes):
+        span = self.start_span(name, kind, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            _current_span.reset(token)
+            self.end_span(span, e)
+            raise
+        _current_span.reset(token)
+        self.end_span(span)
+
+    def trace_node(self, name: str, node):
+        """Wrap an async graph node in a "node" span."""
+
+        @functools.wraps(node)
+        async def traced(state, *args, **kwargs):
+            config = kwargs.get("config") or (args[0] if args else ensure_config())
+            with self.span(name, "node", thread_id=thread_id_of(config)) as span:
+                result = await node(state, *args, **kwargs)
+                goto = getattr(result, "goto", None)
+                if goto:
+                    span.set(goto=str(goto))
+                return result
+
+        return traced
+
+    def _call(self, method, span: Span):
+        try:
+            method(span)
+        except Exception as e:
+            # Tracing must never break the workflow
+            print(f"Tracing sink error: {e}")
+
+    def _record_metrics(self, span: Span):
+        metrics = self.metrics
+        labels = {"kind": span.kind, "name": span.name, "status": span.status}
+        if span.kind == "llm":
+            labels["name"] = span.attributes.get("model", span.name)
+        metrics.observe(
+            "swe_span_duration_seconds",
+            span.duration,
+            labels,
+            help="Wall time of graph nodes and LLM calls",
+        )
+        if span.kind != "llm":
+            return
+
+        model = span.attributes.get("model", "")
+        cache = "hit" if span.attributes.get("cache_hit") else "miss"
+        metrics.inc(
+            "swe_llm_calls_total",
+            1,
+            {"model": model, "cache": cache, "status": span.status},
+            help="LLM calls by model, cache result and status",
+        )
+        if cache == "hit":
+            return
+        if span.time_to_first_token is not None:
+            metrics.observe(
+                "swe_llm_time_to_first_token_seconds",
+                span.time_to_first_token,
+                {"model": model},
+                help="Time from the LLM call to its first token",
+            )
+        for direction in ("input", "output"):
+            tokens = span.attributes.get(f"{direction}_tokens")
+            if tokens:
+                metrics.inc(
+                    "swe_llm_tokens_total",
+                    tokens,
+                    {"model": model, "direction": direction},
+                    help="Tokens sent to and generated by the LLMs",
+                )
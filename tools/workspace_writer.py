@@ -0,0 +1,195 @@
+# Batched, concurrent writes of generated files to the project workspace
+import os
+import uuid
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sub_graphs.swe.tools.blob_store import content_hash
+
+
+class WriteResult(NamedTuple):
+    written: List[str]
+    unchanged: List[str]
+
+
+class WorkspaceWriter:
+    """
+    Writes batches of (path, content) under `root` through a bounded thread
+    pool. Every file is written to a temporary file in its directory and
+    renamed over the target, so a crash never leaves a partial file, and
+    files whose content hash matches the one on disk are not written again.
+    """
+
+    def __init__(self, root: str = ".", max_workers: int = 8, fsync: bool = False):
+        self.root = os.path.abspath(root)
+        self.fsync = fsync
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix="swe-writer"
+        )
+        # path -> (mtime_ns, size, sha256) of the files seen on disk
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, path: str) -> str:
+        """Absolute path of `path` under the root, paths escaping it are refused."""
+        full_path = os.path.normpath(os.path.join(self.root, path.lstrip("/")))
+        if os.path.commonpath([self.root, full_path]) != self.root:
+            raise ValueError(f"Path outside of the workspace: {path}")
+        return full_path
+
+    async def write_batch(
+        self,
+        files: Iterable[Tuple[str, str]],
+        project_structure: Optional[dict] = None,
+    ) -> WriteResult:
+        """
+        Write `files` concurrently and add them to `project_structure` (updated
+        in place, once for the whole batch). Raises OSError after the batch
+        when some files could not be written.
+        """
+        batch = {self.resolve(path): content or "" for path, content in files}
+        loop = asyncio.get_running_loop()
+        outcomes = await asyncio.gather(
+            *(
+                loop.run_in_executor(self._executor, self._write, path, content)
+                for path, content in batch.items()
+            ),
+            return_exceptions=True,
+        )
+
+        written, unchanged, failed = [], [], []
+        entries = {}
+        for path, outcome in zip(batch, outcomes):
+            if isinstance(outcome, BaseException):
+                failed.append(f"{os.path.relpath(path, self.root)}: {outcome}")
+                continue
+            changed, digest = outcome
+            (written if changed else unchanged).append(path)
+            entries[os.path.relpath(path, self.root)] = digest
+
+        if project_structure is not None:
+            add_to_structure(project_structure, entries)
+        if failed:
+            raise OSError(f"Could not write {len(failed)} files: " + "; ".join(failed))
+        return WriteResult(written, unchanged)
+
+    async def remove_batch(
+        self, paths: Iterable[str], project_structure: Optional[dict] = None
+    ) -> List[str]:
+        """
+        Delete the files at `paths` and remove them from `project_structure`,
+        returns the paths deleted. Missing files are skipped.
+        """
+        batch = [self.resolve(path) for path in paths]
+        loop = asyncio.get_running_loop()
+        outcomes = await asyncio.gather(
+            *(loop.run_in_executor(self._executor, self._remove, path) for path in batch)
+        )
+        if project_structure is not None:
+            remove_from_structure(
+                project_structure, [os.path.relpath(path, self.root) for path in batch]
+            )
+        return [path for path, removed in zip(batch, outcomes) if removed]
+
+    def _remove(self, path: str) -> bool:
+        with self._lock:
+            self._hashes.pop(path, None)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _write(self, path: str, content: str) -> Tuple[bool, str]:
+        """Write a file unless its content is unchanged, returns (written, hash)."""
+        data = content.encode("utf-8")
+        digest = content_hash(content)
+        if self._disk_hash(path, len(data)) == digest:
+            return False, digest
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(
+            directory, f".{os.path.basename(path)}.{uuid.uuid4().hex[:8]}.tmp"
+        )
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        stat = os.stat(path)
+        with self._lock:
+            self._hashes[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return True, digest
+
+    def _disk_hash(self, path: str, size: int) -> Optional[str]:
+        """Hash of the file on disk, None when missing or of another size."""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if stat.st_size != size:
+            return None
+        with self._lock:
+            cached = self._hashes.get(path)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        with open(path, "rb") as f:
+            digest = content_hash(f.read().decode("utf-8", errors="replace"))
+        with self._lock:
+            self._hashes[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+def add_to_structure(project_structure: dict, entries: Dict[str, str]):
+    """
+    Add files to a project structure: nested dicts of directories, files map
+    to their content hash. `entries` maps relative paths to hashes.
+    """
+    for path, digest in entries.items():
+        *directories, name = path.replace(os.sep, "/").split("/")
+        node = project_structure
+        for directory in directories:
+            child = node.get(directory)
+            if not isinstance(child, dict):
+                child = node[directory] = {}
+            node = child
+        node[name] = digest
+
+
+def remove_from_structure(project_structure: dict, paths: Iterable[str]):
+    """Remove files from a project structure, directories left empty too."""
+    for path in paths:
+        *directories, name = path.replace(os.sep, "/").split("/")
+        nodes = [project_structure]
+        for directory in directories:
+            child = nodes[-1].get(directory)
+            if not isinstance(child, dict):
+                break
+            nodes.append(child)
+        else:
+            nodes[-1].pop(name, None)
+            for directory, node in zip(reversed(directories), reversed(nodes[:-1])):
+                if node[directory]:
+                    break
+                del node[directory]
+
+
+def state_structure(state) -> dict:
+    """The project structure of a graph state, shared by the batches of a node run."""
+    structure = state.get("project_structure_json")
+    if structure is None:
+        structure = state["project_structure_json"] = {}
+    return structure
@@ -0,0 +1,47 @@
+# Custom HTTP routes served next to the graph by the LangGraph server
+import re
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from sub_graphs.swe.config import blob_store, log_stream, tracer
+
+app = FastAPI()
+
+
+@app.get("/logs")
+async def read_logs(
+    thread_id: str,
+    cursor: int = 0,
+    epoch: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    """
+    Workflow log entries of `thread_id` after `cursor`, state carries the
+    latest cursor and epoch. A stale cursor is answered with `reset` and the
+    entries from the start.
+    """
+    return log_stream.read(thread_id, cursor, epoch, limit)
+
+
+@app.get("/blobs/{digest}", response_class=PlainTextResponse)
+async def read_blob(digest: str):
+    """
+    Body of a generated file by its content hash, state only carries the
+    `content_hash` of each file. Blobs never change, they are cached for good.
+    """
+    if not re.fullmatch(r"[0-9a-f]{64}", digest):
+        raise HTTPException(status_code=400, detail="Invalid content hash")
+    content = blob_store.get(digest)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    return PlainTextResponse(
+        content, headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Node and LLM call metrics in the Prometheus text format."""
+    return tracer.metrics.render()